@@ -0,0 +1,111 @@
+from typing import Dict, List, Literal
+
+from candle_engine import (
+    CLOSE,
+    HIGH,
+    LOW,
+    NOTIONAL,
+    OPEN,
+    TIMESTAMP_MS,
+    TRADE_COUNT,
+    VOLUME,
+    WINDOW_END,
+    WINDOW_START,
+    init_candle,
+    update_candle,
+)
+from quixstreams import State
+
+BarType = Literal['tick', 'volume', 'dollar']
+
+# what each bar type adds up until it closes, as a position in the candle
+BAR_MEASURES: Dict[str, int] = {
+    'tick': TRADE_COUNT,
+    'volume': VOLUME,
+    'dollar': NOTIONAL,
+}
+
+
+class InformationBars:
+    """
+    Bars that close on market activity instead of time, from one pass over the
+    trades of a pair:
+
+    - 'tick': every `size` trades
+    - 'volume': every `size` units of the base currency traded
+    - 'dollar': every `size` of notional (price * volume) traded
+
+    A bar closes with the trade that takes it to its size, so the volume and
+    dollar bars can go a bit over it. Its window goes from its first trade to
+    its last one, and `candle_interval_seconds` is 0. Only the closed bars are
+    emitted, as the size of an open bar tells nothing on its own.
+
+    The state of a pair is the list of its open bars, one per bar type and in
+    the order of `bar_sizes`, under the `bars` key, so it does not grow with
+    the trades.
+    """
+
+    def __init__(self, bar_sizes: Dict[BarType, float]):
+        """
+        Args:
+            bar_sizes: The size of the bars of every bar type to build
+        """
+        for bar_type, size in bar_sizes.items():
+            if bar_type not in BAR_MEASURES:
+                raise ValueError(f'Unknown bar type {bar_type}')
+            if size <= 0:
+                raise ValueError(f'The size of the {bar_type} bars must be positive')
+        self.bar_types = list(bar_sizes)
+        self.sizes = list(bar_sizes.values())
+        self.measures = [BAR_MEASURES[bar_type] for bar_type in self.bar_types]
+
+    def process_trade(self, trade: dict, state: State) -> List[dict]:
+        """
+        Adds the trade to the open bars of its pair
+
+        Returns:
+            List[dict]: The bars closed by the trade, in the output schema
+        """
+        if trade.get('heartbeat', False):
+            return []
+
+        bars = state.get('bars', default=None)
+        if bars is None or len(bars) != len(self.bar_types):
+            # first trade of the pair, or the bar types changed since the last run
+            bars = [None] * len(self.bar_types)
+
+        timestamp_ms = trade['timestamp_ms']
+        closed = []
+        for i, bar in enumerate(bars):
+            if bar is None:
+                bar = init_candle(trade, timestamp_ms, timestamp_ms)
+                bars[i] = bar
+            else:
+                update_candle(bar, trade)
+                if timestamp_ms > bar[WINDOW_END]:
+                    bar[WINDOW_END] = timestamp_ms
+
+            if bar[self.measures[i]] >= self.sizes[i]:
+                closed.append(self._to_message(bar, self.bar_types[i], trade['pair']))
+                bars[i] = None
+
+        state.set('bars', bars)
+        return closed
+
+    @staticmethod
+    def _to_message(bar: list, bar_type: str, pair: str) -> dict:
+        return {
+            'pair': pair,
+            'timestamp_ms': bar[TIMESTAMP_MS],
+            'open': bar[OPEN],
+            'high': bar[HIGH],
+            'low': bar[LOW],
+            'close': bar[CLOSE],
+            'volume': bar[VOLUME],
+            'window_start': bar[WINDOW_START],
+            'window_end': bar[WINDOW_END],
+            'candle_interval_seconds': 0,
+            'trade_count': bar[TRADE_COUNT],
+            'vwap': bar[NOTIONAL] / bar[VOLUME] if bar[VOLUME] else bar[CLOSE],
+            'bar_type': bar_type,
+        }
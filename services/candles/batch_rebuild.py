@@ -0,0 +1,223 @@
+import time
+from typing import Dict, List, Literal, Optional, Tuple
+
+import numpy as np
+from candle_batch import CandleBatch
+from candle_engine import sorted_intervals
+from confluent_kafka import OFFSET_BEGINNING, Consumer, TopicPartition
+from loguru import logger
+from pipeline_shared.serializers import get_deserializer, get_serializer
+from quixstreams import Application
+from quixstreams.models import SerializationContext, TopicConfig
+
+
+class BatchCandleBuilder:
+    """
+    Candles of several intervals from chunks of trades, with vectorized
+    group-bys instead of one reduce per trade, to rebuild the candles of a
+    historical trades topic.
+
+    Like the streaming engine, only the finest candles are computed from the
+    trades, and the closed candles are rolled up into the coarser intervals.
+    The last candle of every pair and interval stays open until the next chunk,
+    as its window may continue there, or until `flush` at the end of the topic.
+    With `fill_empty_candles`, the windows without trades get a flat candle.
+    """
+
+    def __init__(self, intervals_seconds: List[int], fill_empty_candles: bool = False):
+        self.intervals_seconds = sorted_intervals(intervals_seconds)
+        self.fill_empty_candles = fill_empty_candles
+        self.intervals_ms = [interval * 1000 for interval in self.intervals_seconds]
+        self._open: List[Optional[CandleBatch]] = [None] * len(self.intervals_ms)
+        self.num_late_trades = 0
+
+    def add_trades(self, trades: CandleBatch) -> List[Tuple[int, CandleBatch]]:
+        """
+        Adds a chunk of trades, in time order per pair
+
+        Returns:
+            List[Tuple[int, CandleBatch]]: The closed candles, with their interval
+        """
+        open_candles = self._open[0]
+        if open_candles is not None and len(open_candles) > 0:
+            # same as the streaming engine, drop the trades of closed candles
+            open_start = np.full(len(trades.pairs), np.iinfo(np.int64).min)
+            open_start[open_candles.pair_index] = open_candles.window_start
+            late = trades.window_start < open_start[trades.pair_index]
+            if late.any():
+                self.num_late_trades += int(late.sum())
+                trades = trades.take(~late)
+
+        closed: List[Tuple[int, CandleBatch]] = []
+        self._add(0, trades, closed)
+        return closed
+
+    def flush(self) -> List[Tuple[int, CandleBatch]]:
+        """
+        Closes all the open candles, at the end of the trades
+        """
+        closed: List[Tuple[int, CandleBatch]] = []
+        for level, candles in enumerate(self._open):
+            self._open[level] = None
+            if candles is None or len(candles) == 0:
+                continue
+            closed.append((self.intervals_seconds[level], candles))
+            if level + 1 < len(self._open):
+                coarser = self._open[level + 1]
+                if coarser is not None:
+                    candles = CandleBatch.concat([coarser, candles])
+                self._open[level + 1] = candles.aggregate(self.intervals_ms[level + 1])
+        return closed
+
+    def _add(
+        self, level: int, candles: CandleBatch, closed: List[Tuple[int, CandleBatch]]
+    ) -> None:
+        if self._open[level] is not None:
+            # the open candles go first, they are older than the new ones
+            candles = CandleBatch.concat([self._open[level], candles])
+        candles = candles.aggregate(self.intervals_ms[level])
+        if level == 0 and self.fill_empty_candles:
+            candles = candles.fill_gaps(self.intervals_ms[0])
+
+        last = candles.is_last_of_pair()
+        self._open[level] = candles.take(last)
+        candles = candles.take(~last)
+        if len(candles) == 0:
+            return
+
+        closed.append((self.intervals_seconds[level], candles))
+        if level + 1 < len(self.intervals_ms):
+            self._add(level + 1, candles, closed)
+
+
+def rebuild_candles(
+    kafka_broker_address: str,
+    kafka_input_topic: str,
+    kafka_output_topic: str,
+    kafka_consumer_group: str,
+    intervals_seconds: List[int],
+    kafka_input_serialization: Literal['json', 'msgpack'] = 'json',
+    kafka_output_serialization: Literal['json', 'msgpack'] = 'json',
+    batch_size: int = 100_000,
+    idle_timeout_seconds: float = 30.0,
+    fill_empty_candles: bool = False,
+    kafka_output_topic_partitions: int = 1,
+) -> None:
+    """
+    Rebuilds the candles of a historical trades topic, reading it from the
+    beginning in chunks of `batch_size` trades and writing the candles in bulk,
+    in the same schema as the streaming engine.
+
+    Stops once no new trade arrives for `idle_timeout_seconds`, so it can run
+    while the trades service is still backfilling the topic.
+
+    Args:
+        kafka_broker_address: The address of the Kafka broker
+        kafka_input_topic: The historical trades topic
+        kafka_output_topic: The candles topic
+        kafka_consumer_group: The consumer group, only used for the metadata
+        intervals_seconds: The candle intervals to build
+        kafka_input_serialization: Wire format of the trades topic
+        kafka_output_serialization: Wire format of the candles topic
+        batch_size: Max number of trades per chunk
+        idle_timeout_seconds: Time without new trades before stopping
+        fill_empty_candles: Whether to write flat candles for the windows
+            without trades
+        kafka_output_topic_partitions: Partitions of the candles topic, if it
+            does not exist yet
+    """
+    app = Application(broker_address=kafka_broker_address)
+    output_topic = app.topic(
+        name=kafka_output_topic,
+        config=TopicConfig(
+            num_partitions=kafka_output_topic_partitions, replication_factor=1
+        ),
+    )
+
+    deserialize = get_deserializer(kafka_input_serialization, 'trade')
+    serialize = get_serializer(kafka_output_serialization, 'candle')
+    input_ctx = SerializationContext(topic=kafka_input_topic, field='value')
+    output_ctx = SerializationContext(topic=kafka_output_topic, field='value')
+
+    consumer = Consumer(
+        {
+            'bootstrap.servers': kafka_broker_address,
+            'group.id': kafka_consumer_group,
+            'enable.auto.commit': False,
+        }
+    )
+    metadata = consumer.list_topics(kafka_input_topic, timeout=10)
+    consumer.assign(
+        [
+            TopicPartition(kafka_input_topic, partition, OFFSET_BEGINNING)
+            for partition in metadata.topics[kafka_input_topic].partitions
+        ]
+    )
+
+    builder = BatchCandleBuilder(intervals_seconds, fill_empty_candles)
+    pairs: List[str] = []
+    pair_ids: Dict[str, int] = {}
+    num_trades = 0
+    num_candles = 0
+    start = time.monotonic()
+    last_message = time.monotonic()
+
+    try:
+        with app.get_producer() as producer:
+
+            def produce(closed: List[Tuple[int, CandleBatch]]) -> int:
+                num_messages = 0
+                for interval_seconds, candles in closed:
+                    for message in candles.to_messages(interval_seconds):
+                        producer.produce(
+                            topic=output_topic.name,
+                            key=message['pair'].encode(),
+                            value=serialize(message, output_ctx),
+                            timestamp=message['timestamp_ms'],
+                        )
+                        num_messages += 1
+                return num_messages
+
+            while time.monotonic() - last_message < idle_timeout_seconds:
+                messages = consumer.consume(num_messages=batch_size, timeout=1.0)
+                if not messages:
+                    continue
+                last_message = time.monotonic()
+
+                pair_index, price, volume, timestamp_ms = [], [], [], []
+                for message in messages:
+                    if message.error():
+                        logger.error(f'Failed to read trades: {message.error()}')
+                        continue
+                    trade = deserialize(message.value(), input_ctx)
+                    if trade.get('heartbeat'):
+                        # only the streaming mode needs the clock of the live trades
+                        continue
+                    pair = trade['pair']
+                    if pair not in pair_ids:
+                        pair_ids[pair] = len(pairs)
+                        pairs.append(pair)
+                    pair_index.append(pair_ids[pair])
+                    price.append(trade['price'])
+                    volume.append(trade['volume'])
+                    timestamp_ms.append(trade['timestamp_ms'])
+
+                trades = CandleBatch.from_trades(
+                    pairs, pair_index, price, volume, timestamp_ms
+                )
+                num_trades += len(trades)
+                num_candles += produce(builder.add_trades(trades))
+                logger.info(
+                    f'Read {num_trades} trades, wrote {num_candles} candles, '
+                    f'{num_trades / (time.monotonic() - start):.0f} trades/s'
+                )
+
+            num_candles += produce(builder.flush())
+    finally:
+        consumer.close()
+
+    logger.info(
+        f'Rebuilt {num_candles} candles from {num_trades} trades in '
+        f'{time.monotonic() - start:.1f}s, skipped {builder.num_late_trades} '
+        f'late trades'
+    )
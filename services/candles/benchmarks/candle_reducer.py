@@ -0,0 +1,112 @@
+"""
+Benchmark of the candle reducers, in reductions (trades) per second on one
+core, and bytes per candle in the state store:
+
+- dict: the previous reducer, a new 7 keys dict per trade
+- compact: the in place reducer of `candle_engine.py`, a flat list per candle
+
+Each reducer runs alone and with a round trip to the state per trade, with the
+same json (de)serialization as the quixstreams state store.
+
+Usage:
+    uv run python benchmarks/candle_reducer.py
+"""
+
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from candle_engine import init_candle, update_candle  # noqa: E402
+from quixstreams.utils.json import dumps, loads  # noqa: E402
+
+NUM_TRADES = 500_000
+
+
+def dict_init_candle(trade: dict) -> dict:
+    return {
+        'open': trade['price'],
+        'high': trade['price'],
+        'low': trade['price'],
+        'close': trade['price'],
+        'volume': trade['volume'],
+        'timestamp_ms': trade['timestamp_ms'],
+        'pair': trade['pair'],
+    }
+
+
+def dict_update_candle(candle: dict, trade: dict) -> dict:
+    return {
+        'open': candle['open'],
+        'high': max(candle['high'], trade['price']),
+        'low': min(candle['low'], trade['price']),
+        'close': trade['price'],
+        'volume': candle['volume'] + trade['volume'],
+        'timestamp_ms': trade['timestamp_ms'],
+        'pair': trade['pair'],
+    }
+
+
+def make_trades() -> list:
+    rng = random.Random(0)
+    return [
+        {
+            'pair': 'BTC/USD',
+            'price': 76000 + rng.random() * 1000,
+            'volume': rng.random(),
+            'timestamp_ms': 1731155565415 + i,
+        }
+        for i in range(NUM_TRADES)
+    ]
+
+
+def bench_dict(trades: list, with_state: bool) -> float:
+    start = time.perf_counter()
+    candle = dict_init_candle(trades[0])
+    if with_state:
+        stored = dumps(candle)
+        for trade in trades:
+            stored = dumps(dict_update_candle(loads(stored), trade))
+    else:
+        for trade in trades:
+            candle = dict_update_candle(candle, trade)
+    return len(trades) / (time.perf_counter() - start)
+
+
+def bench_compact(trades: list, with_state: bool) -> float:
+    start = time.perf_counter()
+    candle = init_candle(trades[0], 1731155520000, 1731155580000)
+    if with_state:
+        stored = dumps(candle)
+        for trade in trades:
+            candle = loads(stored)
+            update_candle(candle, trade)
+            stored = dumps(candle)
+    else:
+        for trade in trades:
+            update_candle(candle, trade)
+    return len(trades) / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    trades = make_trades()
+
+    dict_candle = dict_init_candle(trades[0])
+    compact_candle = init_candle(trades[0], 1731155520000, 1731155580000)
+    for trade in trades[1:1000]:
+        dict_candle = dict_update_candle(dict_candle, trade)
+        update_candle(compact_candle, trade)
+    print(
+        f'state bytes per candle: dict={len(dumps(dict_candle))}B '
+        f'compact={len(dumps(compact_candle))}B '
+        '(compact also has the window, trade count and notional)'
+    )
+
+    for with_state in [False, True]:
+        label = 'with state' if with_state else 'reducer only'
+        print(
+            f'{label:<13} dict reductions/s={bench_dict(trades, with_state):12,.0f} '
+            f'compact reductions/s={bench_compact(trades, with_state):12,.0f}'
+        )
@@ -0,0 +1,110 @@
+"""
+Benchmark of the rebuild of historical candles: the vectorized batch mode
+against the per trade streaming engine, both without Kafka, on one core.
+
+The trades cover `--days` days of `--num-pairs` pairs. The batch mode builds
+the 1m/5m/15m/1h/1d candles of all of them, in chunks of `--batch-size`
+trades. The streaming engine runs on the first `--stream-trades` trades, with
+an in memory state, and its time for all the trades is extrapolated.
+
+Usage:
+    uv run python benchmarks/historical_rebuild.py --days 30
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from batch_rebuild import BatchCandleBuilder  # noqa: E402
+from candle_batch import CandleBatch  # noqa: E402
+from candle_engine import MultiIntervalCandles  # noqa: E402
+
+INTERVALS_SECONDS = [60, 300, 900, 3600, 86400]
+
+
+class DictState(dict):
+    """
+    In memory stand-in for the quixstreams state of one key
+    """
+
+    def get(self, key, default=None):
+        return super().get(key, default)
+
+    def set(self, key, value):
+        self[key] = value
+
+
+def make_trades(args: argparse.Namespace) -> CandleBatch:
+    rng = np.random.default_rng(0)
+    num_trades = int(args.days * 86400 * args.trades_per_second)
+    timestamp_ms = 1730000000000 + np.sort(
+        rng.integers(0, int(args.days * 86400 * 1000), num_trades)
+    )
+    pair_index = rng.integers(0, args.num_pairs, num_trades).astype(np.int32)
+    price = 100 * np.exp(np.cumsum(rng.standard_normal(num_trades) * 1e-4))
+    volume = rng.random(num_trades)
+    pairs = [f'PAIR{i}/USD' for i in range(args.num_pairs)]
+    return CandleBatch.from_trades(pairs, pair_index, price, volume, timestamp_ms)
+
+
+def bench_batch(trades: CandleBatch, batch_size: int) -> tuple:
+    builder = BatchCandleBuilder(INTERVALS_SECONDS)
+    num_candles = 0
+    start = time.perf_counter()
+    for i in range(0, len(trades), batch_size):
+        chunk = trades.take(slice(i, i + batch_size))
+        for _, candles in builder.add_trades(chunk):
+            num_candles += len(candles)
+    for _, candles in builder.flush():
+        num_candles += len(candles)
+    return time.perf_counter() - start, num_candles
+
+
+def bench_stream(trades: CandleBatch, num_trades: int) -> float:
+    engine = MultiIntervalCandles(INTERVALS_SECONDS, emit_incomplete_candles=False)
+    states = {pair: DictState() for pair in trades.pairs}
+    messages = [
+        {'pair': trades.pairs[i], 'price': p, 'volume': v, 'timestamp_ms': t}
+        for i, p, v, t in zip(
+            trades.pair_index[:num_trades].tolist(),
+            trades.open[:num_trades].tolist(),
+            trades.volume[:num_trades].tolist(),
+            trades.timestamp_ms[:num_trades].tolist(),
+            strict=True,
+        )
+    ]
+    start = time.perf_counter()
+    for message in messages:
+        engine.process_trade(message, states[message['pair']])
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--days', type=float, default=30)
+    parser.add_argument('--num-pairs', type=int, default=8)
+    parser.add_argument('--trades-per-second', type=float, default=2)
+    parser.add_argument('--batch-size', type=int, default=100_000)
+    parser.add_argument('--stream-trades', type=int, default=200_000)
+    args = parser.parse_args()
+
+    trades = make_trades(args)
+    print(f'{len(trades):,} trades, {args.num_pairs} pairs, {args.days} days')
+
+    elapsed, num_candles = bench_batch(trades, args.batch_size)
+    print(
+        f'batch  {elapsed:8.2f}s  trades/s={len(trades) / elapsed:12,.0f}  '
+        f'candles={num_candles:,}'
+    )
+
+    num_trades = min(args.stream_trades, len(trades))
+    elapsed = bench_stream(trades, num_trades) * len(trades) / num_trades
+    print(
+        f'stream {elapsed:8.2f}s  trades/s={len(trades) / elapsed:12,.0f}  '
+        '(extrapolated, without the state store and Kafka)'
+    )
@@ -0,0 +1,164 @@
+"""
+Benchmark of the throughput cost of the exactly-once processing guarantee of
+the candles service against at-least-once, on a local broker.
+
+The harness fills a trades topic once, then runs one candles process per
+processing guarantee and commit interval on it from the beginning, with a new
+consumer group and output topic, and times it until the committed offsets of
+the group reach the end of the topic.
+
+With exactly-once, every commit is a Kafka transaction over the candles, the
+state changelogs and the consumer offsets, so shorter commit intervals cost
+more. The downstream services read committed messages only, so the candles
+also reach them up to one commit interval later.
+
+Start the broker first:
+
+    docker compose -f docker-compose/redpanda.yml up -d
+
+Usage:
+    uv run python benchmarks/processing_guarantee.py --commit-intervals 1,5
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from confluent_kafka import Consumer, Producer, TopicPartition
+from confluent_kafka.admin import AdminClient, NewTopic
+
+SERVICE_DIR = Path(__file__).parent.parent
+GUARANTEES = ['at-least-once', 'exactly-once']
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--broker', default='localhost:19092')
+    parser.add_argument('--commit-intervals', default='1,5')
+    parser.add_argument('--partitions', type=int, default=1)
+    parser.add_argument('--num-pairs', type=int, default=8)
+    parser.add_argument('--num-trades', type=int, default=1_000_000)
+    parser.add_argument('--emit-incomplete-candles', action='store_true')
+    parser.add_argument('--timeout-seconds', type=float, default=1800)
+    return parser.parse_args()
+
+
+def fill_trades_topic(args: argparse.Namespace, topic: str) -> None:
+    """
+    One trade every 10ms, round robin over the pairs
+    """
+    admin = AdminClient({'bootstrap.servers': args.broker})
+    admin.create_topics([NewTopic(topic, args.partitions, 1)])[topic].result()
+
+    rng = np.random.default_rng(0)
+    price = 100 * np.exp(np.cumsum(rng.standard_normal(args.num_trades) * 1e-4))
+    volume = rng.random(args.num_trades)
+    pairs = [f'PAIR{i}/USD' for i in range(args.num_pairs)]
+
+    producer = Producer(
+        {'bootstrap.servers': args.broker, 'linger.ms': 100, 'compression.type': 'lz4'}
+    )
+    start_ms = 1730000000000
+    for i, (p, v) in enumerate(zip(price.tolist(), volume.tolist(), strict=True)):
+        pair = pairs[i % args.num_pairs]
+        value = json.dumps(
+            {'pair': pair, 'price': p, 'volume': v, 'timestamp_ms': start_ms + 10 * i}
+        )
+        while True:
+            try:
+                producer.produce(topic, key=pair.encode(), value=value.encode())
+                break
+            except BufferError:
+                producer.poll(0.1)
+    producer.flush()
+
+
+def remaining_messages(consumer: Consumer, partitions: List[TopicPartition]) -> int:
+    """
+    Messages of the topic not yet committed by the consumer group
+    """
+    remaining = 0
+    for committed in consumer.committed(partitions, timeout=10):
+        _, high = consumer.get_watermark_offsets(committed, timeout=10)
+        remaining += high - max(committed.offset, 0)
+    return remaining
+
+
+def run(
+    args: argparse.Namespace,
+    trades_topic: str,
+    processing_guarantee: str,
+    commit_interval_seconds: float,
+    state_dir: str,
+) -> float:
+    """
+    Returns:
+        float: The time the candles service took to process the whole topic
+    """
+    run_id = uuid.uuid4().hex[:8]
+    env = {
+        **os.environ,
+        'KAFKA_BROKER_ADDRESS': args.broker,
+        'KAFKA_INPUT_TOPIC': trades_topic,
+        'KAFKA_OUTPUT_TOPIC': f'candles_guarantee_{run_id}',
+        'KAFKA_CONSUMER_GROUP': f'candles_guarantee_{run_id}',
+        'CANDLE_INTERVAL_SECONDS': '60',
+        'CANDLE_ROLLUP_INTERVALS_SECONDS': '[300, 900, 3600]',
+        'EMIT_INCOMPLETE_CANDLES': str(args.emit_incomplete_candles),
+        'DATA_SOURCE': 'historical',
+        'STATE_DIR': state_dir,
+        'PROCESSING_GUARANTEE': processing_guarantee,
+        'COMMIT_INTERVAL_SECONDS': str(commit_interval_seconds),
+    }
+    consumer = Consumer(
+        {'bootstrap.servers': args.broker, 'group.id': env['KAFKA_CONSUMER_GROUP']}
+    )
+    partitions = [TopicPartition(trades_topic, p) for p in range(args.partitions)]
+
+    process = subprocess.Popen(
+        [sys.executable, 'run.py'],
+        cwd=SERVICE_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    start = time.monotonic()
+    try:
+        while remaining_messages(consumer, partitions) > 0:
+            if time.monotonic() - start > args.timeout_seconds:
+                raise TimeoutError('The candles service did not finish in time')
+            time.sleep(0.5)
+        return time.monotonic() - start
+    finally:
+        process.terminate()
+        process.wait()
+        consumer.close()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    trades_topic = f'trades_guarantee_{uuid.uuid4().hex[:8]}'
+    print(f'Filling {trades_topic} with {args.num_trades} trades...')
+    fill_trades_topic(args, trades_topic)
+
+    for commit_interval in [float(c) for c in args.commit_intervals.split(',')]:
+        throughput = {}
+        for guarantee in GUARANTEES:
+            with tempfile.TemporaryDirectory() as state_dir:
+                elapsed = run(args, trades_topic, guarantee, commit_interval, state_dir)
+            throughput[guarantee] = args.num_trades / elapsed
+            print(
+                f'commit_interval={commit_interval:g}s {guarantee:<13} '
+                f'elapsed={elapsed:.1f}s throughput={throughput[guarantee]:,.0f} '
+                'trades/s'
+            )
+        cost = 1 - throughput['exactly-once'] / throughput['at-least-once']
+        print(f'commit_interval={commit_interval:g}s exactly-once cost={cost:.1%}')
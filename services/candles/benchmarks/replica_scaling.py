@@ -0,0 +1,224 @@
+"""
+Benchmark of the horizontal scaling of the candles service: throughput of 1 to
+8 replicas in one consumer group, on a local broker.
+
+The harness fills a trades topic of `--partitions` partitions once, keyed by
+pair, then for every number of replicas starts them on the topic from the
+beginning, with a new consumer group, output topic and state dirs, and times
+them until the committed offsets of the group reach the end of the topic.
+quixstreams commits every 5s, so the topic should take the single replica a
+few minutes for the timings to be meaningful.
+
+With `--kill-one`, one replica is stopped half way, so the others take its
+partitions and restore their state from the changelog topics, and the run
+checks that no window of a pair is emitted twice with different values.
+
+Start the broker first:
+
+    docker compose -f docker-compose/redpanda.yml up -d
+
+Usage:
+    uv run python benchmarks/replica_scaling.py --replicas 1,2,4,8
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+from confluent_kafka import Consumer, Producer, TopicPartition
+from confluent_kafka.admin import AdminClient, NewTopic
+
+SERVICE_DIR = Path(__file__).parent.parent
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--broker', default='localhost:19092')
+    parser.add_argument('--replicas', default='1,2,4,8')
+    parser.add_argument('--partitions', type=int, default=8)
+    parser.add_argument('--num-pairs', type=int, default=64)
+    parser.add_argument('--num-trades', type=int, default=2_000_000)
+    parser.add_argument('--timeout-seconds', type=float, default=1800)
+    parser.add_argument('--kill-one', action='store_true')
+    return parser.parse_args()
+
+
+def fill_trades_topic(args: argparse.Namespace, topic: str) -> None:
+    """
+    One trade every 10ms, round robin over the pairs, so every partition gets
+    the same share of the trades
+    """
+    admin = AdminClient({'bootstrap.servers': args.broker})
+    admin.create_topics([NewTopic(topic, args.partitions, 1)])[topic].result()
+
+    rng = np.random.default_rng(0)
+    price = 100 * np.exp(np.cumsum(rng.standard_normal(args.num_trades) * 1e-4))
+    volume = rng.random(args.num_trades)
+    pairs = [f'PAIR{i}/USD' for i in range(args.num_pairs)]
+
+    producer = Producer(
+        {'bootstrap.servers': args.broker, 'linger.ms': 100, 'compression.type': 'lz4'}
+    )
+    start_ms = 1730000000000
+    for i, (p, v) in enumerate(zip(price.tolist(), volume.tolist(), strict=True)):
+        pair = pairs[i % args.num_pairs]
+        value = json.dumps(
+            {'pair': pair, 'price': p, 'volume': v, 'timestamp_ms': start_ms + 10 * i}
+        )
+        while True:
+            try:
+                producer.produce(topic, key=pair.encode(), value=value.encode())
+                break
+            except BufferError:
+                producer.poll(0.1)
+    producer.flush()
+
+
+def start_replica(
+    args: argparse.Namespace, trades_topic: str, run_id: str, state_dir: str
+) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        'KAFKA_BROKER_ADDRESS': args.broker,
+        'KAFKA_INPUT_TOPIC': trades_topic,
+        'KAFKA_OUTPUT_TOPIC': f'candles_scaling_{run_id}',
+        'KAFKA_CONSUMER_GROUP': f'candles_scaling_{run_id}',
+        'KAFKA_INPUT_TOPIC_PARTITIONS': str(args.partitions),
+        'KAFKA_OUTPUT_TOPIC_PARTITIONS': str(args.partitions),
+        'CANDLE_INTERVAL_SECONDS': '60',
+        'CANDLE_ROLLUP_INTERVALS_SECONDS': '[300, 900, 3600]',
+        'EMIT_INCOMPLETE_CANDLES': 'false',
+        'DATA_SOURCE': 'historical',
+        'STATE_DIR': state_dir,
+    }
+    return subprocess.Popen(
+        [sys.executable, 'run.py'],
+        cwd=SERVICE_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def remaining_messages(consumer: Consumer, partitions: List[TopicPartition]) -> int:
+    """
+    Messages of the topic not yet committed by the consumer group
+    """
+    remaining = 0
+    for committed in consumer.committed(partitions, timeout=10):
+        _, high = consumer.get_watermark_offsets(committed, timeout=10)
+        remaining += high - max(committed.offset, 0)
+    return remaining
+
+
+def check_no_conflicting_candles(args: argparse.Namespace, run_id: str) -> int:
+    """
+    Reads the candles of the run, and fails if a window of a pair was emitted
+    twice with different values
+
+    Returns:
+        int: The number of candles emitted twice with the same values, after
+            the replay of the messages not committed by the stopped replica
+    """
+    consumer = Consumer(
+        {
+            'bootstrap.servers': args.broker,
+            'group.id': f'check_{run_id}',
+            'auto.offset.reset': 'earliest',
+        }
+    )
+    consumer.subscribe([f'candles_scaling_{run_id}'])
+    seen: Dict[tuple, dict] = {}
+    duplicates = 0
+    last_message = time.monotonic()
+    while time.monotonic() - last_message < 10:
+        message = consumer.poll(1.0)
+        if message is None or message.error():
+            continue
+        last_message = time.monotonic()
+        candle = json.loads(message.value())
+        key = (
+            candle['pair'],
+            candle['candle_interval_seconds'],
+            candle['window_start'],
+        )
+        if key in seen:
+            if seen[key] != candle:
+                raise AssertionError(f'Conflicting candles for {key}')
+            duplicates += 1
+        seen[key] = candle
+    consumer.close()
+    return duplicates
+
+
+def run(args: argparse.Namespace, trades_topic: str, num_replicas: int) -> float:
+    """
+    Returns:
+        float: The time the replicas took to process the whole topic
+    """
+    run_id = uuid.uuid4().hex[:8]
+    consumer = Consumer(
+        {'bootstrap.servers': args.broker, 'group.id': f'candles_scaling_{run_id}'}
+    )
+    partitions = [TopicPartition(trades_topic, p) for p in range(args.partitions)]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        replicas = [
+            start_replica(args, trades_topic, run_id, f'{tmp_dir}/state_{i}')
+            for i in range(num_replicas)
+        ]
+        start = time.monotonic()
+        killed = False
+        try:
+            while True:
+                time.sleep(1)
+                remaining = remaining_messages(consumer, partitions)
+                if remaining == 0:
+                    break
+                if time.monotonic() - start > args.timeout_seconds:
+                    raise TimeoutError(f'{remaining} trades left after the timeout')
+                if (
+                    args.kill_one
+                    and num_replicas > 1
+                    and not killed
+                    and remaining < args.num_trades / 2
+                ):
+                    replicas[0].terminate()
+                    killed = True
+            elapsed = time.monotonic() - start
+        finally:
+            for replica in replicas:
+                replica.terminate()
+            for replica in replicas:
+                replica.wait()
+            consumer.close()
+
+    if args.kill_one and num_replicas > 1:
+        duplicates = check_no_conflicting_candles(args, run_id)
+        print(f'  stopped one replica: {duplicates} candles replayed, no conflict')
+    return elapsed
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    trades_topic = f'trades_scaling_{uuid.uuid4().hex[:8]}'
+    print(f'Filling {trades_topic} with {args.num_trades} trades...')
+    fill_trades_topic(args, trades_topic)
+
+    baseline = None
+    for num_replicas in [int(n) for n in args.replicas.split(',')]:
+        elapsed = run(args, trades_topic, num_replicas)
+        baseline = baseline or elapsed
+        print(
+            f'replicas={num_replicas} elapsed={elapsed:.1f}s '
+            f'throughput={args.num_trades / elapsed:,.0f} trades/s '
+            f'speedup={baseline / elapsed:.2f}x (against the first run)'
+        )
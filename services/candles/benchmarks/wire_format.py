@@ -0,0 +1,104 @@
+"""
+Benchmark of the (de)serialization of the trades and candles topics, in
+messages per second on one core: stdlib `json`, the quixstreams 'json'
+(de)serializers (orjson) and the 'msgpack' typed structs of
+`pipeline_shared.serializers`.
+
+Usage:
+    uv run python benchmarks/wire_format.py
+"""
+
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from pipeline_shared.serializers import get_deserializer, get_serializer  # noqa: E402
+from quixstreams.models import SerializationContext  # noqa: E402
+
+NUM_MESSAGES = 200_000
+CTX = SerializationContext(topic='benchmark', field='value')
+
+
+def make_trades() -> list:
+    rng = random.Random(0)
+    return [
+        {
+            'pair': 'BTC/USD',
+            'price': 76000 + rng.random() * 1000,
+            'volume': rng.random(),
+            'timestamp_ms': 1731155565415 + i,
+        }
+        for i in range(NUM_MESSAGES)
+    ]
+
+
+def make_candles() -> list:
+    rng = random.Random(0)
+    return [
+        {
+            'pair': 'BTC/USD',
+            'timestamp_ms': 1731155565415 + i,
+            'open': 76000 + rng.random() * 1000,
+            'high': 77000 + rng.random() * 1000,
+            'low': 75000 + rng.random() * 1000,
+            'close': 76000 + rng.random() * 1000,
+            'volume': rng.random() * 10,
+            'window_start': 1731155520000,
+            'window_end': 1731155580000,
+            'candle_interval_seconds': 60,
+        }
+        for i in range(NUM_MESSAGES)
+    ]
+
+
+def run(name: str, func, values: list) -> None:
+    start = time.perf_counter()
+    for value in values:
+        func(value)
+    elapsed = time.perf_counter() - start
+    print(f'{name:<28} msg/s={len(values) / elapsed:12,.0f}')
+
+
+def bench_decode(schema: str, values: list) -> None:
+    json_messages = [json.dumps(value).encode() for value in values]
+    msgpack_serializer = get_serializer('msgpack', schema)
+    msgpack_messages = [msgpack_serializer(value, CTX) for value in values]
+    print(
+        f'{schema} size: json={len(json_messages[0])}B '
+        f'msgpack={len(msgpack_messages[0])}B'
+    )
+
+    json_deserializer = get_deserializer('json')
+    msgpack_deserializer = get_deserializer('msgpack', schema)
+    run(f'decode {schema} stdlib json', json.loads, json_messages)
+    run(
+        f'decode {schema} json (orjson)',
+        lambda m: json_deserializer(m, CTX),
+        json_messages,
+    )
+    run(
+        f'decode {schema} msgpack',
+        lambda m: msgpack_deserializer(m, CTX),
+        msgpack_messages,
+    )
+
+
+def bench_encode(schema: str, values: list) -> None:
+    json_serializer = get_serializer('json')
+    msgpack_serializer = get_serializer('msgpack', schema)
+    run(f'encode {schema} stdlib json', lambda v: json.dumps(v).encode(), values)
+    run(f'encode {schema} json (orjson)', lambda v: json_serializer(v, CTX), values)
+    run(f'encode {schema} msgpack', lambda v: msgpack_serializer(v, CTX), values)
+
+
+if __name__ == '__main__':
+    trades = make_trades()
+    candles = make_candles()
+
+    bench_decode('trade', trades)
+    bench_decode('candle', candles)
+    bench_encode('candle', candles)
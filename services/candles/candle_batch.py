@@ -0,0 +1,249 @@
+from typing import List
+
+import numpy as np
+
+
+class CandleBatch:
+    """
+    Columnar batch of candles, one NumPy array per field plus a list of pairs,
+    to build candles with vectorized group-bys instead of one reduce per trade.
+
+    `pair_index[i]` is the position of the pair of the i-th candle in `pairs`.
+    A trade is a candle of its own, with the window starting and ending at
+    its timestamp, so trades and candles are aggregated the same way.
+    """
+
+    COLUMNS = (
+        'pair_index',
+        'window_start',
+        'window_end',
+        'open',
+        'high',
+        'low',
+        'close',
+        'volume',
+        'notional',
+        'trade_count',
+        'timestamp_ms',
+    )
+
+    def __init__(
+        self,
+        pairs: List[str],
+        pair_index: np.ndarray,
+        window_start: np.ndarray,
+        window_end: np.ndarray,
+        open: np.ndarray,
+        high: np.ndarray,
+        low: np.ndarray,
+        close: np.ndarray,
+        volume: np.ndarray,
+        notional: np.ndarray,
+        trade_count: np.ndarray,
+        timestamp_ms: np.ndarray,
+    ):
+        self.pairs = pairs
+        self.pair_index = pair_index
+        self.window_start = window_start
+        self.window_end = window_end
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.notional = notional
+        self.trade_count = trade_count
+        self.timestamp_ms = timestamp_ms
+
+    def __len__(self) -> int:
+        return len(self.window_start)
+
+    @classmethod
+    def from_trades(
+        cls,
+        pairs: List[str],
+        pair_index: np.ndarray,
+        price: np.ndarray,
+        volume: np.ndarray,
+        timestamp_ms: np.ndarray,
+    ) -> 'CandleBatch':
+        price = np.asarray(price, dtype=np.float64)
+        volume = np.asarray(volume, dtype=np.float64)
+        timestamp_ms = np.asarray(timestamp_ms, dtype=np.int64)
+        return cls(
+            pairs=pairs,
+            pair_index=np.asarray(pair_index, dtype=np.int32),
+            window_start=timestamp_ms,
+            window_end=timestamp_ms,
+            open=price,
+            high=price,
+            low=price,
+            close=price,
+            volume=volume,
+            notional=price * volume,
+            trade_count=np.ones(len(price), dtype=np.int64),
+            timestamp_ms=timestamp_ms,
+        )
+
+    @classmethod
+    def concat(cls, batches: List['CandleBatch']) -> 'CandleBatch':
+        """
+        Concatenates batches that share the same list of pairs
+        """
+        return cls(
+            pairs=batches[0].pairs,
+            **{
+                column: np.concatenate([getattr(batch, column) for batch in batches])
+                for column in cls.COLUMNS
+            },
+        )
+
+    def take(self, indices: np.ndarray) -> 'CandleBatch':
+        """
+        Selects candles by position or boolean mask
+        """
+        return CandleBatch(
+            pairs=self.pairs,
+            **{column: getattr(self, column)[indices] for column in self.COLUMNS},
+        )
+
+    def aggregate(self, interval_ms: int) -> 'CandleBatch':
+        """
+        Groups the candles by pair and window of `interval_ms`, in one pass.
+        The candles of the same pair must be in time order, ties are kept in
+        the order of the batch.
+
+        Returns:
+            CandleBatch: One candle per pair and window, sorted by pair and time
+        """
+        if len(self) == 0:
+            return self
+
+        # lexsort is stable, so open and close follow the order of the batch
+        batch = self.take(np.lexsort((self.window_start, self.pair_index)))
+        window_start = batch.window_start - batch.window_start % interval_ms
+
+        new_group = np.empty(len(batch), dtype=bool)
+        new_group[0] = True
+        new_group[1:] = (batch.pair_index[1:] != batch.pair_index[:-1]) | (
+            window_start[1:] != window_start[:-1]
+        )
+        starts = np.flatnonzero(new_group)
+        ends = np.append(starts[1:], len(batch)) - 1
+
+        return CandleBatch(
+            pairs=self.pairs,
+            pair_index=batch.pair_index[starts],
+            window_start=window_start[starts],
+            window_end=window_start[starts] + interval_ms,
+            open=batch.open[starts],
+            high=np.maximum.reduceat(batch.high, starts),
+            low=np.minimum.reduceat(batch.low, starts),
+            close=batch.close[ends],
+            volume=np.add.reduceat(batch.volume, starts),
+            notional=np.add.reduceat(batch.notional, starts),
+            trade_count=np.add.reduceat(batch.trade_count, starts),
+            timestamp_ms=batch.timestamp_ms[ends],
+        )
+
+    def fill_gaps(self, interval_ms: int) -> 'CandleBatch':
+        """
+        Adds a flat candle, at the previous close and with no volume, for every
+        window without trades between two candles of the same pair. The batch
+        must be sorted by pair and time, like the output of `aggregate`.
+        """
+        num_missing = np.zeros(len(self), dtype=np.int64)
+        num_missing[:-1] = np.where(
+            self.pair_index[1:] == self.pair_index[:-1],
+            (self.window_start[1:] - self.window_end[:-1]) // interval_ms,
+            0,
+        )
+        total = int(num_missing.sum())
+        if total == 0:
+            return self
+
+        # the candle before every missing window, and the position of the window
+        previous = np.repeat(np.arange(len(self)), num_missing)
+        offset = np.arange(total) - np.repeat(
+            np.cumsum(num_missing) - num_missing, num_missing
+        )
+        window_start = self.window_end[previous] + offset * interval_ms
+        close = self.close[previous]
+        flat = CandleBatch(
+            pairs=self.pairs,
+            pair_index=self.pair_index[previous],
+            window_start=window_start,
+            window_end=window_start + interval_ms,
+            open=close,
+            high=close,
+            low=close,
+            close=close,
+            volume=np.zeros(total),
+            notional=np.zeros(total),
+            trade_count=np.zeros(total, dtype=np.int64),
+            timestamp_ms=window_start,
+        )
+        batch = CandleBatch.concat([self, flat])
+        return batch.take(np.lexsort((batch.window_start, batch.pair_index)))
+
+    def is_last_of_pair(self) -> np.ndarray:
+        """
+        Mask of the last candle of every pair, for a batch sorted by pair
+        """
+        last = np.ones(len(self), dtype=bool)
+        last[:-1] = self.pair_index[1:] != self.pair_index[:-1]
+        return last
+
+    def to_messages(self, candle_interval_seconds: int) -> List[dict]:
+        """
+        The candles in the output schema of the candles topic
+        """
+        vwap = np.divide(
+            self.notional,
+            self.volume,
+            out=self.close.copy(),
+            where=self.volume != 0,
+        )
+        return [
+            {
+                'pair': self.pairs[pair_index],
+                'timestamp_ms': timestamp_ms,
+                'open': open,
+                'high': high,
+                'low': low,
+                'close': close,
+                'volume': volume,
+                'window_start': window_start,
+                'window_end': window_end,
+                'candle_interval_seconds': candle_interval_seconds,
+                'trade_count': trade_count,
+                'vwap': vwap,
+                'bar_type': 'time',
+            }
+            for (
+                pair_index,
+                timestamp_ms,
+                open,
+                high,
+                low,
+                close,
+                volume,
+                window_start,
+                window_end,
+                trade_count,
+                vwap,
+            ) in zip(
+                self.pair_index.tolist(),
+                self.timestamp_ms.tolist(),
+                self.open.tolist(),
+                self.high.tolist(),
+                self.low.tolist(),
+                self.close.tolist(),
+                self.volume.tolist(),
+                self.window_start.tolist(),
+                self.window_end.tolist(),
+                self.trade_count.tolist(),
+                vwap.tolist(),
+                strict=True,
+            )
+        ]
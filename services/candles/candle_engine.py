@@ -0,0 +1,421 @@
+from typing import List, Literal, Optional
+
+from loguru import logger
+from quixstreams import State
+
+# Layout of the candles in the state. A candle is a flat list, so a trade
+# updates it in place instead of building a new dict, and it is stored as a
+# json array, without the field names. The pair is the key of the state.
+# NOTIONAL is the sum of price * volume, for the VWAP.
+(
+    WINDOW_START,
+    WINDOW_END,
+    OPEN,
+    HIGH,
+    LOW,
+    CLOSE,
+    VOLUME,
+    NOTIONAL,
+    TRADE_COUNT,
+    TIMESTAMP_MS,
+) = range(10)
+
+# Layout of the state of a pair, see `MultiIntervalCandles`
+MAX_TIMESTAMP_MS, LAST_CLOSED, FINEST = range(3)
+
+
+def init_candle(trade: dict, window_start: int, window_end: int) -> list:
+    """
+    Initialize a candle with the first trade
+    """
+    price = trade['price']
+    volume = trade['volume']
+    return [
+        window_start,
+        window_end,
+        price,
+        price,
+        price,
+        price,
+        volume,
+        price * volume,
+        1,
+        trade['timestamp_ms'],
+    ]
+
+
+def update_candle(candle: list, trade: dict) -> None:
+    """
+    Update the candle with the new trade, in place
+    """
+    price = trade['price']
+    volume = trade['volume']
+    if price > candle[HIGH]:
+        candle[HIGH] = price
+    elif price < candle[LOW]:
+        candle[LOW] = price
+    candle[CLOSE] = price
+    candle[VOLUME] += volume
+    candle[NOTIONAL] += price * volume
+    candle[TRADE_COUNT] += 1
+    candle[TIMESTAMP_MS] = trade['timestamp_ms']
+
+
+def merge_candle(candle: list, later: list) -> None:
+    """
+    Merges a later candle into `candle`, in place, e.g a closed 1 minute candle
+    into the 5 minutes candle it belongs to. Keeps the window of `candle`.
+    """
+    if later[HIGH] > candle[HIGH]:
+        candle[HIGH] = later[HIGH]
+    if later[LOW] < candle[LOW]:
+        candle[LOW] = later[LOW]
+    candle[CLOSE] = later[CLOSE]
+    candle[VOLUME] += later[VOLUME]
+    candle[NOTIONAL] += later[NOTIONAL]
+    candle[TRADE_COUNT] += later[TRADE_COUNT]
+    candle[TIMESTAMP_MS] = later[TIMESTAMP_MS]
+
+
+def rewindow_candle(candle: list, window_start: int, window_end: int) -> list:
+    """
+    Copy of the candle with another window
+    """
+    candle = candle.copy()
+    candle[WINDOW_START] = window_start
+    candle[WINDOW_END] = window_end
+    return candle
+
+
+def sorted_intervals(intervals_seconds: List[int]) -> List[int]:
+    """
+    Sorts the candle intervals, finest first, and checks that each one is a
+    multiple of the previous one, so the finer windows fit exactly in the
+    coarser ones
+    """
+    intervals_seconds = sorted(set(intervals_seconds))
+    for finer, coarser in zip(intervals_seconds, intervals_seconds[1:]):
+        if coarser % finer != 0:
+            raise ValueError(
+                f'Candle interval {coarser}s is not a multiple of {finer}s'
+            )
+    return intervals_seconds
+
+
+class IncompleteCandlesPolicy:
+    """
+    When to emit the incomplete candles of a pair, as emitting them on every
+    trade makes the downstream services recompute everything for each trade:
+
+    - 'every_trade': on every trade
+    - 'throttle': at most once every `throttle_ms` of event time
+    - 'price_change': when the close moved by `min_price_change` (relative)
+      since the last emission
+    - 'tick': on the first trade of every `tick_ms` sub-interval
+
+    The final candles are emitted whatever the policy.
+    """
+
+    def __init__(
+        self,
+        policy: Literal['every_trade', 'throttle', 'price_change', 'tick'],
+        throttle_ms: int = 1000,
+        min_price_change: float = 0.001,
+        tick_ms: int = 10_000,
+    ):
+        self.policy = policy
+        self.throttle_ms = throttle_ms
+        self.min_price_change = min_price_change
+        self.tick_ms = tick_ms
+
+    def is_due(self, timestamp_ms: int, close: float, state: State) -> bool:
+        """
+        Whether to emit the incomplete candles now, and if so remembers it in
+        the state of the pair, under the `last_emitted` key
+        """
+        if self.policy == 'every_trade':
+            return True
+
+        last_emitted = state.get('last_emitted', default=None)
+        if last_emitted is not None:
+            last_timestamp_ms, last_close = last_emitted
+            if self.policy == 'throttle':
+                due = timestamp_ms - last_timestamp_ms >= self.throttle_ms
+            elif self.policy == 'price_change':
+                due = abs(close - last_close) >= self.min_price_change * abs(last_close)
+            else:
+                due = timestamp_ms // self.tick_ms != last_timestamp_ms // self.tick_ms
+            if not due:
+                return False
+
+        state.set('last_emitted', [timestamp_ms, close])
+        return True
+
+
+class MultiIntervalCandles:
+    """
+    Candles of several intervals (e.g 1m, 5m, 15m, 1h, 1d) from one pass over
+    the trades.
+
+    Only the candles of the finest interval are reduced from the trades. When a
+    candle closes it is rolled up into the candle of the next coarser interval,
+    and so on, so each trade is reduced once no matter how many intervals we
+    run. Each interval must be a multiple of the previous one, so the finer
+    windows fit exactly in the coarser ones.
+
+    A candle closes when the watermark of its pair, the latest trade or
+    heartbeat timestamp minus `grace_ms`, passes the end of its window. Until
+    then it still takes the trades that arrive out of order, later ones are
+    dropped. The heartbeats of the trades service move the watermark of the
+    quiet pairs, so their candles close on time without new trades. While a
+    window is within the grace period, only its candle is emitted as incomplete,
+    the newer windows are held until it closes: the candles of an interval are
+    emitted in window order, and downstream a candle older than the latest one
+    is late. With
+    `fill_empty_candles`, the windows without trades get a flat candle at the
+    previous close, with no volume.
+
+    The state of a pair is a list, under the `candles` key:
+    [max_timestamp_ms, last_closed, finest, coarser_1, ..., coarser_n]
+
+    - max_timestamp_ms: latest trade or heartbeat of the pair
+    - last_closed: [window_end, close] of the last finest candle closed, to fill
+      the gaps after it
+    - finest: the open candles of the finest interval, oldest first. There is
+      more than one when the previous windows are still within the grace period
+    - coarser_i: the open candle of every coarser interval, or None
+    """
+
+    def __init__(
+        self,
+        intervals_seconds: List[int],
+        emit_incomplete_candles: bool,
+        incomplete_candles_policy: Optional[IncompleteCandlesPolicy] = None,
+        grace_ms: int = 0,
+        fill_empty_candles: bool = False,
+    ):
+        """
+        Args:
+            intervals_seconds: The candle intervals, in any order
+            emit_incomplete_candles: Whether to emit the open candles of all the
+                intervals as they change, or only the candles that close
+            incomplete_candles_policy: When to emit the open candles, on every
+                trade by default
+            grace_ms: How long after the end of a window its candle still takes
+                the trades that arrive out of order
+            fill_empty_candles: Whether to emit flat candles for the windows
+                without trades
+        """
+        self.intervals_seconds = sorted_intervals(intervals_seconds)
+        self.intervals_ms = [interval * 1000 for interval in self.intervals_seconds]
+        self.emit_incomplete_candles = emit_incomplete_candles
+        self.incomplete_candles_policy = (
+            incomplete_candles_policy or IncompleteCandlesPolicy('every_trade')
+        )
+        self.grace_ms = grace_ms
+        self.fill_empty_candles = fill_empty_candles
+
+    def process_trade(self, trade: dict, state: State) -> List[dict]:
+        """
+        Adds the trade to the candles of its pair, or only moves the watermark
+        of the pair for a heartbeat
+
+        Returns:
+            List[dict]: The candles to emit, in the output schema
+        """
+        pair = trade['pair']
+        timestamp_ms = trade['timestamp_ms']
+        pair_state: Optional[list] = state.get('candles', default=None)
+        if pair_state is None or len(pair_state) != len(self.intervals_ms) + 2:
+            # first message of the pair, or the intervals changed since the last run
+            pair_state = [timestamp_ms, None, []] + [None] * (
+                len(self.intervals_ms) - 1
+            )
+
+        is_heartbeat = trade.get('heartbeat', False)
+        if not is_heartbeat and not self._add_trade(pair_state, trade):
+            logger.debug(
+                f'Skipping late trade of {pair} at {timestamp_ms}, its candle '
+                f'is already closed'
+            )
+            return []
+
+        closed: List[dict] = []
+        if timestamp_ms > pair_state[MAX_TIMESTAMP_MS]:
+            pair_state[MAX_TIMESTAMP_MS] = timestamp_ms
+            self._close_until(pair_state, timestamp_ms - self.grace_ms, pair, closed)
+
+        state.set('candles', pair_state)
+
+        if not self.emit_incomplete_candles or is_heartbeat:
+            return closed
+        if self.incomplete_candles_policy.is_due(timestamp_ms, trade['price'], state):
+            return closed + self._current(pair_state, pair)
+        return closed
+
+    def _add_trade(self, pair_state: list, trade: dict) -> bool:
+        """
+        Adds the trade to its finest candle, unless the candle is closed
+
+        Returns:
+            bool: Whether the trade was added
+        """
+        timestamp_ms = trade['timestamp_ms']
+        interval_ms = self.intervals_ms[0]
+        window_start = timestamp_ms - timestamp_ms % interval_ms
+        if window_start + interval_ms <= pair_state[MAX_TIMESTAMP_MS] - self.grace_ms:
+            return False
+
+        # most trades fall in the latest open candle
+        finest = pair_state[FINEST]
+        i = len(finest)
+        while i > 0 and finest[i - 1][WINDOW_START] > window_start:
+            i -= 1
+        if i > 0 and finest[i - 1][WINDOW_START] == window_start:
+            update_candle(finest[i - 1], trade)
+        else:
+            finest.insert(
+                i, init_candle(trade, window_start, window_start + interval_ms)
+            )
+        return True
+
+    def _close_until(
+        self, pair_state: list, watermark_ms: int, pair: str, closed: list
+    ) -> None:
+        """
+        Closes the candles of all the intervals that end before the watermark,
+        and fills the empty windows before it if enabled
+        """
+        finest = pair_state[FINEST]
+        while finest and finest[0][WINDOW_END] <= watermark_ms:
+            candle = finest.pop(0)
+            self._fill_gap(pair_state, candle[WINDOW_START], watermark_ms, pair, closed)
+            self._close_finest(pair_state, candle, pair, closed)
+        until_ms = finest[0][WINDOW_START] if finest else watermark_ms
+        self._fill_gap(pair_state, until_ms, watermark_ms, pair, closed)
+
+        for level in range(1, len(self.intervals_ms)):
+            candle = pair_state[FINEST + level]
+            if candle is not None and candle[WINDOW_END] <= watermark_ms:
+                self._close(pair_state, level, pair, closed)
+
+    def _fill_gap(
+        self,
+        pair_state: list,
+        until_ms: int,
+        watermark_ms: int,
+        pair: str,
+        closed: list,
+    ) -> None:
+        """
+        Closes a flat candle for every window without trades between the last
+        closed candle and `until_ms`
+        """
+        last_closed = pair_state[LAST_CLOSED]
+        if not self.fill_empty_candles or last_closed is None:
+            return
+
+        interval_ms = self.intervals_ms[0]
+        window_start, close = last_closed
+        while window_start < until_ms and window_start + interval_ms <= watermark_ms:
+            candle = [
+                window_start,
+                window_start + interval_ms,
+                close,
+                close,
+                close,
+                close,
+                0.0,
+                0.0,
+                0,
+                window_start,
+            ]
+            self._close_finest(pair_state, candle, pair, closed)
+            window_start += interval_ms
+
+    def _close_finest(
+        self, pair_state: list, candle: list, pair: str, closed: list
+    ) -> None:
+        """
+        Emits a closed candle of the finest interval and rolls it up
+        """
+        pair_state[LAST_CLOSED] = [candle[WINDOW_END], candle[CLOSE]]
+        closed.append(self._to_message(candle, 0, pair))
+        if len(self.intervals_ms) > 1:
+            self._add(pair_state, 1, candle, pair, closed)
+
+    def _add(
+        self, pair_state: list, level: int, candle: list, pair: str, closed: list
+    ) -> None:
+        """
+        Adds a closed candle of the finer interval to the open candle of
+        `level`, closing it first if it belongs to a previous window
+        """
+        interval_ms = self.intervals_ms[level]
+        window_start = candle[WINDOW_START] - candle[WINDOW_START] % interval_ms
+
+        current = pair_state[FINEST + level]
+        if current is not None and current[WINDOW_START] != window_start:
+            self._close(pair_state, level, pair, closed)
+            current = None
+
+        if current is None:
+            pair_state[FINEST + level] = rewindow_candle(
+                candle, window_start, window_start + interval_ms
+            )
+        else:
+            merge_candle(current, candle)
+
+    def _close(self, pair_state: list, level: int, pair: str, closed: list) -> None:
+        """
+        Emits the open candle of a coarser `level` and rolls it up into the next
+        """
+        candle = pair_state[FINEST + level]
+        pair_state[FINEST + level] = None
+        closed.append(self._to_message(candle, level, pair))
+        if level + 1 < len(self.intervals_ms):
+            self._add(pair_state, level + 1, candle, pair, closed)
+
+    def _current(self, pair_state: list, pair: str) -> List[dict]:
+        """
+        Oldest open candle of every interval, including the trades of the finer
+        candles that are not rolled up yet. The newer windows are emitted once
+        the older ones are closed, so they don't overtake their final candle.
+        """
+        views = pair_state[FINEST]
+        messages = [self._to_message(views[0], 0, pair)] if views else []
+        for level in range(1, len(self.intervals_ms)):
+            interval_ms = self.intervals_ms[level]
+            candle = pair_state[FINEST + level]
+            coarser = [] if candle is None else [candle.copy()]
+            for finer in views:
+                window_start = finer[WINDOW_START] - finer[WINDOW_START] % interval_ms
+                if coarser and coarser[-1][WINDOW_START] == window_start:
+                    merge_candle(coarser[-1], finer)
+                else:
+                    coarser.append(
+                        rewindow_candle(finer, window_start, window_start + interval_ms)
+                    )
+            if coarser:
+                messages.append(self._to_message(coarser[0], level, pair))
+            views = coarser
+        return messages
+
+    def _to_message(self, candle: list, level: int, pair: str) -> dict:
+        return {
+            'pair': pair,
+            'timestamp_ms': candle[TIMESTAMP_MS],
+            'open': candle[OPEN],
+            'high': candle[HIGH],
+            'low': candle[LOW],
+            'close': candle[CLOSE],
+            'volume': candle[VOLUME],
+            'window_start': candle[WINDOW_START],
+            'window_end': candle[WINDOW_END],
+            'candle_interval_seconds': self.intervals_seconds[level],
+            'trade_count': candle[TRADE_COUNT],
+            'vwap': candle[NOTIONAL] / candle[VOLUME]
+            if candle[VOLUME]
+            else candle[CLOSE],
+            'bar_type': 'time',
+        }
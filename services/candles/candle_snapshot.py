@@ -0,0 +1,99 @@
+from typing import Dict, List
+
+from quixstreams import State
+
+# fields of the candles kept in the snapshots, one list per field
+SNAPSHOT_COLUMNS = (
+    'window_start',
+    'window_end',
+    'open',
+    'high',
+    'low',
+    'close',
+    'volume',
+    'trade_count',
+    'vwap',
+    'timestamp_ms',
+)
+
+
+def snapshot_key(snapshot: dict) -> str:
+    """
+    Key of a snapshot in the compacted topic, one per pair and interval
+    """
+    return f'{snapshot["pair"]}|{snapshot["candle_interval_seconds"]}'
+
+
+class CandleSnapshots:
+    """
+    Last `num_candles` closed time candles of every pair and interval, in
+    columns, so the downstream services fill their state from it at startup
+    instead of waiting for that many new candles.
+
+    A candle is final once a candle of a later window of the same interval
+    arrives, the snapshot is then published, so at most once per window. The
+    candles of a window already in the snapshot, e.g the final candle after an
+    incomplete candle of the next window within the grace period, replace it.
+
+    The state of a pair has 2 keys, so the big one is only read on a new window:
+    - `snapshot_open`: the latest candle of every interval, not final yet
+    - `snapshot`: the closed candles of every interval, as a dict of columns
+    """
+
+    def __init__(self, num_candles: int):
+        """
+        Args:
+            num_candles: Number of closed candles per pair and interval
+        """
+        self.num_candles = num_candles
+
+    def update(self, candle: dict, state: State) -> List[dict]:
+        """
+        Keeps the candle for the snapshot of its pair and interval
+
+        Returns:
+            List[dict]: The snapshot to publish, if the candle closed a window
+        """
+        if candle.get('bar_type', 'time') != 'time':
+            return []
+
+        interval = str(candle['candle_interval_seconds'])
+        open_candles: Dict[str, dict] = state.get('snapshot_open', default={})
+        previous = open_candles.get(interval)
+        open_candles[interval] = candle
+
+        if previous is None or candle['window_start'] == previous['window_start']:
+            state.set('snapshot_open', open_candles)
+            return []
+
+        snapshots: Dict[str, dict] = state.get('snapshot', default={})
+        columns = snapshots.get(interval)
+        if columns is None:
+            columns = {column: [] for column in SNAPSHOT_COLUMNS}
+            snapshots[interval] = columns
+
+        if candle['window_start'] > previous['window_start']:
+            # the previous candle is final
+            for column in SNAPSHOT_COLUMNS:
+                columns[column].append(previous[column])
+                del columns[column][: -self.num_candles]
+        else:
+            # a late update of a closed window, keep the open candle as it was
+            open_candles[interval] = previous
+            starts = columns['window_start']
+            if candle['window_start'] not in starts:
+                state.set('snapshot_open', open_candles)
+                return []
+            position = len(starts) - 1 - starts[::-1].index(candle['window_start'])
+            for column in SNAPSHOT_COLUMNS:
+                columns[column][position] = candle[column]
+
+        state.set('snapshot_open', open_candles)
+        state.set('snapshot', snapshots)
+        return [
+            {
+                'pair': candle['pair'],
+                'candle_interval_seconds': candle['candle_interval_seconds'],
+                **columns,
+            }
+        ]
@@ -1,4 +1,4 @@
-from typing import Literal
+from typing import List, Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -10,8 +10,58 @@ class Config(BaseSettings):
     kafka_output_topic: str
     kafka_consumer_group: str
     candle_interval_seconds: int
+    # coarser intervals rolled up from the candles of candle_interval_seconds,
+    # each one a multiple of the previous one
+    candle_rollup_intervals_seconds: List[int] = []
     emit_incomplete_candles: bool
+    # when to emit the incomplete candles: 'every_trade', 'throttle' (at most
+    # every incomplete_candles_throttle_ms per pair), 'price_change' (the close
+    # moved by incomplete_candles_min_price_change, relative) or 'tick' (once per
+    # incomplete_candles_tick_ms sub-interval). Final candles are always emitted.
+    incomplete_candles_policy: Literal[
+        'every_trade', 'throttle', 'price_change', 'tick'
+    ] = 'every_trade'
+    incomplete_candles_throttle_ms: int = 1000
+    incomplete_candles_min_price_change: float = 0.001
+    incomplete_candles_tick_ms: int = 10_000
     data_source: Literal['live', 'historical']
+    # wire format of the input and output topics, 'json' or 'msgpack'
+    kafka_input_serialization: Literal['json', 'msgpack'] = 'json'
+    kafka_output_serialization: Literal['json', 'msgpack'] = 'json'
+    # 'batch' rebuilds the candles of a historical topic in chunks of batch_size
+    # trades, and stops after batch_idle_timeout_seconds without new trades
+    processing_mode: Literal['stream', 'batch'] = 'stream'
+    batch_size: int = 100_000
+    batch_idle_timeout_seconds: float = 30.0
+    # event time watermark: a window closes once the latest trade or heartbeat of
+    # the pair is grace_ms past its end, later trades are dropped
+    grace_ms: int = 0
+    # emit a flat candle, at the previous close, for the windows without trades
+    fill_empty_candles: bool = False
+    # bars that close every tick_bar_size trades, volume_bar_size units of volume
+    # or dollar_bar_size of notional, emitted next to the time candles with their
+    # bar_type. The sizes are the same for all the pairs. Stream mode only
+    bar_types: List[Literal['tick', 'volume', 'dollar']] = []
+    tick_bar_size: int = 1000
+    volume_bar_size: float = 10.0
+    dollar_bar_size: float = 1_000_000.0
+    # port of the Prometheus metrics endpoint (/metrics), 0 turns the metrics off
+    metrics_port: int = 0
+    # partitions of the trades and candles topics when they are created. Both are
+    # keyed by pair, so up to that many replicas share the pairs, each one in the
+    # same consumer group and with its own state_dir
+    kafka_input_topic_partitions: int = 1
+    kafka_output_topic_partitions: int = 1
+    state_dir: str = 'state'
+    # compacted topic with the last snapshot_num_candles closed candles of every
+    # pair and interval, read by technical-indicators at startup. Empty disables it
+    kafka_snapshot_topic: str = ''
+    snapshot_num_candles: int = 60
+    # 'exactly-once' produces the outputs, the state changelogs and the consumer
+    # offsets in one kafka transaction per commit, so a crash or a rebalance does
+    # not duplicate messages downstream, at the cost of some throughput
+    processing_guarantee: Literal['at-least-once', 'exactly-once'] = 'at-least-once'
+    commit_interval_seconds: float = 5.0
 
 
 config = Config()
@@ -1,9 +1,14 @@
-from datetime import timedelta
 from typing import Any, List, Literal, Optional, Tuple
 
+from bar_engine import InformationBars
+from batch_rebuild import rebuild_candles
+from candle_engine import IncompleteCandlesPolicy, MultiIntervalCandles
+from candle_snapshot import CandleSnapshots, snapshot_key
 from loguru import logger
-from quixstreams import Application
-from quixstreams.models import TimestampType
+from pipeline_shared.instrumentation import Metrics
+from pipeline_shared.serializers import get_deserializer, get_serializer
+from quixstreams import Application, State
+from quixstreams.models import TimestampType, TopicConfig
 
 # Custom timestamp extractor for the input topic (to ensure the timestamp is in milliseconds)
 
@@ -27,50 +32,47 @@ def custom_ts_extractor(
     return value['timestamp_ms']
 
 
-def init_candle(trade: dict) -> dict:
-    """
-    Initialize a candle with the first trade
-    """
-    return {
-        'open': trade['price'],  # open is the same as the price for the first trade
-        'high': trade['price'],  # high is the same as the price for the first trade
-        'low': trade['price'],  # low is the same as the price for the first trade
-        'close': trade['price'],  # close is the same as the open for the first trade
-        'volume': trade['volume'],  # volume is the same as the size for the first trade
-        'timestamp_ms': trade['timestamp_ms'],
-        'pair': trade['pair'],
-    }
-
-
-def update_candle(candle: dict, trade: dict) -> dict:
-    """
-    Update the candle with the new trade
-    """
-    return {
-        'open': candle['open'],
-        'high': max(candle['high'], trade['price']),
-        'low': min(candle['low'], trade['price']),
-        'close': trade['price'],
-        'volume': candle['volume'] + trade['volume'],
-        'timestamp_ms': trade['timestamp_ms'],
-        'pair': trade['pair'],
-    }
-
-
 def main(
     kafka_broker_address: str,
     kafka_input_topic: str,
     kafka_output_topic: str,
     kafka_consumer_group: str,
-    candle_interval_seconds: int,  # TODO add many other services for other intervals (1hour, 15minutes, 1 day...)
+    candle_interval_seconds: int,
     emit_incomplete_candles: bool,
     data_source: Literal['live', 'historical'],
+    candle_rollup_intervals_seconds: Optional[List[int]] = None,
+    kafka_input_serialization: Literal['json', 'msgpack'] = 'json',
+    kafka_output_serialization: Literal['json', 'msgpack'] = 'json',
+    processing_mode: Literal['stream', 'batch'] = 'stream',
+    batch_size: int = 100_000,
+    batch_idle_timeout_seconds: float = 30.0,
+    incomplete_candles_policy: Literal[
+        'every_trade', 'throttle', 'price_change', 'tick'
+    ] = 'every_trade',
+    incomplete_candles_throttle_ms: int = 1000,
+    incomplete_candles_min_price_change: float = 0.001,
+    incomplete_candles_tick_ms: int = 10_000,
+    grace_ms: int = 0,
+    fill_empty_candles: bool = False,
+    bar_types: Optional[List[Literal['tick', 'volume', 'dollar']]] = None,
+    tick_bar_size: int = 1000,
+    volume_bar_size: float = 10.0,
+    dollar_bar_size: float = 1_000_000.0,
+    metrics_port: int = 0,
+    kafka_input_topic_partitions: int = 1,
+    kafka_output_topic_partitions: int = 1,
+    state_dir: str = 'state',
+    kafka_snapshot_topic: str = '',
+    snapshot_num_candles: int = 60,
+    processing_guarantee: Literal['at-least-once', 'exactly-once'] = 'at-least-once',
+    commit_interval_seconds: float = 5.0,
 ):
     """
     Main function to run the candles service.
     3 steeps
     1. ingest data from kafka topic
-    2. calculate candles, generate them with tumbling window (candle_interval_seconds)
+    2. calculate candles of candle_interval_seconds and roll them up into the
+       candles of candle_rollup_intervals_seconds, in one pass over the trades
     3. Output candles to kafka topic
 
     Args:
@@ -81,6 +83,45 @@ def main(
         candle_interval_seconds (_type_, optional): Defaults to config.candle_interval_seconds.
         emit_incomplete_candles (_type_, optional): Defaults to config.emit_incomplete_candles.
         data_source (_type_, optional): Defaults to config.data_source.
+        candle_rollup_intervals_seconds: Coarser intervals computed from the
+            candles of candle_interval_seconds, e.g [300, 900, 3600, 86400]
+        kafka_input_serialization: Wire format of the trades topic
+        kafka_output_serialization: Wire format of the candles topic
+        processing_mode: 'stream' reduces the trades one by one, 'batch' rebuilds
+            the candles of a historical topic with vectorized group-bys
+        batch_size: Max number of trades per chunk, in batch mode
+        batch_idle_timeout_seconds: Time without new trades before the batch
+            mode stops
+        incomplete_candles_policy: When to emit the incomplete candles, the
+            final candles are always emitted
+        incomplete_candles_throttle_ms: Min time between two emissions of a
+            pair, with the 'throttle' policy
+        incomplete_candles_min_price_change: Min relative change of the close,
+            with the 'price_change' policy
+        incomplete_candles_tick_ms: Sub-interval of the 'tick' policy
+        grace_ms: How long a window stays open after its end, for the trades
+            that arrive out of order. Later trades are dropped
+        fill_empty_candles: Whether to emit flat candles for the windows
+            without trades
+        bar_types: Bars to emit next to the time candles, e.g ['tick', 'dollar']
+        tick_bar_size: Number of trades of a tick bar
+        volume_bar_size: Volume of a volume bar
+        dollar_bar_size: Notional of a dollar bar
+        metrics_port: Port of the Prometheus metrics endpoint, 0 turns the
+            metrics off
+        kafka_input_topic_partitions: Partitions of the trades topic, if it
+            does not exist yet
+        kafka_output_topic_partitions: Partitions of the candles topic, if it
+            does not exist yet
+        state_dir: Directory of the state store of this replica
+        kafka_snapshot_topic: Compacted topic of the last closed candles of every
+            pair and interval, for the warm start of the downstream services.
+            Empty to disable it
+        snapshot_num_candles: Number of closed candles per pair and interval in
+            the snapshots
+        processing_guarantee: 'at-least-once', or 'exactly-once' to produce the
+            outputs and commit the offsets in Kafka transactions
+        commit_interval_seconds: Time between two commits, or transactions
     Returns:
         None
     """
@@ -88,78 +129,135 @@ def main(
         f'Hello from candles service! {kafka_broker_address} {kafka_input_topic} {kafka_output_topic} {kafka_consumer_group} {candle_interval_seconds} {data_source}'
     )
 
+    intervals_seconds = [candle_interval_seconds] + (
+        candle_rollup_intervals_seconds or []
+    )
+
+    if processing_mode == 'batch':
+        if data_source != 'historical':
+            raise ValueError('The batch processing mode only rebuilds historical data')
+        if bar_types:
+            raise ValueError('The batch processing mode only builds time candles')
+        rebuild_candles(
+            kafka_broker_address=kafka_broker_address,
+            kafka_input_topic=kafka_input_topic,
+            kafka_output_topic=kafka_output_topic,
+            kafka_consumer_group=kafka_consumer_group,
+            intervals_seconds=intervals_seconds,
+            kafka_input_serialization=kafka_input_serialization,
+            kafka_output_serialization=kafka_output_serialization,
+            batch_size=batch_size,
+            idle_timeout_seconds=batch_idle_timeout_seconds,
+            fill_empty_candles=fill_empty_candles,
+            kafka_output_topic_partitions=kafka_output_topic_partitions,
+        )
+        return
+
+    metrics = Metrics('candles', port=metrics_port)
+
     # Initialize application
     app = Application(
         broker_address=kafka_broker_address,
         consumer_group=kafka_consumer_group,
         auto_offset_reset='earliest' if data_source == 'historical' else 'latest',
+        consumer_extra_config=metrics.consumer_config(),
+        processing_guarantee=processing_guarantee,
+        commit_interval=commit_interval_seconds,
+        # the state of the pairs of a partition is restored from its changelog
+        # topic when the partition moves to another replica
+        state_dir=state_dir,
     )
+    metrics.watch_state_dir(app.config.state_dir)
 
     # Define input topic
     input_topic = app.topic(
         name=kafka_input_topic,
-        value_deserializer='json',
+        value_deserializer=get_deserializer(kafka_input_serialization, 'trade'),
         timestamp_extractor=custom_ts_extractor,
+        config=TopicConfig(
+            num_partitions=kafka_input_topic_partitions, replication_factor=1
+        ),
     )
 
     # Define output topic
     output_topic = app.topic(
         name=kafka_output_topic,
-        value_serializer='json',
+        value_serializer=get_serializer(kafka_output_serialization, 'candle'),
+        config=TopicConfig(
+            num_partitions=kafka_output_topic_partitions, replication_factor=1
+        ),
     )
 
     # create dataframe from the input topic
     sdf = app.dataframe(topic=input_topic)
+    sdf = metrics.track_input(sdf)
+
+    # Agregation of the trades into the candles of all the intervals
+    # the trades are keyed by pair, so the open candles are kept per pair
+    candles = MultiIntervalCandles(
+        intervals_seconds=intervals_seconds,
+        emit_incomplete_candles=emit_incomplete_candles,
+        incomplete_candles_policy=IncompleteCandlesPolicy(
+            policy=incomplete_candles_policy,
+            throttle_ms=incomplete_candles_throttle_ms,
+            min_price_change=incomplete_candles_min_price_change,
+            tick_ms=incomplete_candles_tick_ms,
+        ),
+        grace_ms=grace_ms,
+        fill_empty_candles=fill_empty_candles,
+    )
+    bar_sizes = {
+        'tick': tick_bar_size,
+        'volume': volume_bar_size,
+        'dollar': dollar_bar_size,
+    }
+    bars = (
+        InformationBars({bar_type: bar_sizes[bar_type] for bar_type in bar_types})
+        if bar_types
+        else None
+    )
+
+    def process_trade(trade: dict, state: State) -> List[dict]:
+        # the candles and the bars keep their own keys in the state of the pair
+        messages = candles.process_trade(trade, state)
+        if bars is not None:
+            messages = messages + bars.process_trade(trade, state)
+        return messages
+
+    sdf = sdf.apply(metrics.timed('candles', process_trade), stateful=True, expand=True)
 
-    # Agregation Trades into candles using tumbling windows
-    # 1. define tumbling window
-    sdf = sdf.tumbling_window(timedelta(seconds=candle_interval_seconds))
-    # 2. define the reduce operation or initial value with the first trade
-    sdf = sdf.reduce(reducer=update_candle, initializer=init_candle)
-    # 3. emit all the intermediate results to have more granularity
-    if emit_incomplete_candles:
-        sdf = sdf.current()
-
-    else:
-        sdf = sdf.final()
-
-    # extract open, high, low, close, volume, timestamp_ms, pair from the dataframe
-    sdf['open'] = sdf['value']['open']
-    sdf['high'] = sdf['value']['high']
-    sdf['low'] = sdf['value']['low']
-    sdf['close'] = sdf['value']['close']
-    sdf['volume'] = sdf['value']['volume']
-    sdf['timestamp_ms'] = sdf['value']['timestamp_ms']
-    sdf['pair'] = sdf['value']['pair']
-
-    sdf['window_start'] = sdf['start']
-    sdf['window_end'] = sdf['end']
-
-    sdf = sdf[
-        [
-            'pair',
-            'timestamp_ms',
-            'open',
-            'high',
-            'low',
-            'close',
-            'volume',
-            'window_start',
-            'window_end',
-        ]
-    ]
-
-    sdf['candle_interval_seconds'] = candle_interval_seconds
+    if kafka_snapshot_topic:
+        # branch of the candles, the snapshots are keyed by pair and interval in a
+        # compacted topic, so it only keeps the latest one of each
+        snapshot_topic = app.topic(
+            name=kafka_snapshot_topic,
+            key_serializer='str',
+            value_serializer=get_serializer(kafka_output_serialization),
+            config=TopicConfig(
+                num_partitions=kafka_output_topic_partitions,
+                replication_factor=1,
+                extra_config={'cleanup.policy': 'compact'},
+            ),
+        )
+        snapshots = CandleSnapshots(num_candles=snapshot_num_candles)
+        sdf.apply(
+            metrics.timed('snapshots', snapshots.update), stateful=True, expand=True
+        ).to_topic(snapshot_topic, key=snapshot_key)
 
     # print the value
     sdf = sdf.update(
-        lambda value: logger.info(f'candle {candle_interval_seconds} seconds: {value}')
+        lambda value: logger.debug(
+            f'{value["bar_type"]} candle {value["candle_interval_seconds"]} seconds: '
+            f'{value}'
+        )
     )
 
     # push the candle to the output topic
+    sdf = metrics.track_output(sdf)
     sdf = sdf.to_topic(output_topic)
 
     # run the application
+    metrics.start()
     app.run()
 
 
@@ -174,4 +272,28 @@ if __name__ == '__main__':
         candle_interval_seconds=config.candle_interval_seconds,
         emit_incomplete_candles=config.emit_incomplete_candles,
         data_source=config.data_source,
+        candle_rollup_intervals_seconds=config.candle_rollup_intervals_seconds,
+        kafka_input_serialization=config.kafka_input_serialization,
+        kafka_output_serialization=config.kafka_output_serialization,
+        processing_mode=config.processing_mode,
+        batch_size=config.batch_size,
+        batch_idle_timeout_seconds=config.batch_idle_timeout_seconds,
+        incomplete_candles_policy=config.incomplete_candles_policy,
+        incomplete_candles_throttle_ms=config.incomplete_candles_throttle_ms,
+        incomplete_candles_min_price_change=config.incomplete_candles_min_price_change,
+        incomplete_candles_tick_ms=config.incomplete_candles_tick_ms,
+        grace_ms=config.grace_ms,
+        fill_empty_candles=config.fill_empty_candles,
+        bar_types=config.bar_types,
+        tick_bar_size=config.tick_bar_size,
+        volume_bar_size=config.volume_bar_size,
+        dollar_bar_size=config.dollar_bar_size,
+        metrics_port=config.metrics_port,
+        kafka_input_topic_partitions=config.kafka_input_topic_partitions,
+        kafka_output_topic_partitions=config.kafka_output_topic_partitions,
+        state_dir=config.state_dir,
+        kafka_snapshot_topic=config.kafka_snapshot_topic,
+        snapshot_num_candles=config.snapshot_num_candles,
+        processing_guarantee=config.processing_guarantee,
+        commit_interval_seconds=config.commit_interval_seconds,
     )
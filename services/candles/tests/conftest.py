@@ -0,0 +1,27 @@
+import pytest
+
+
+class DictState:
+    """
+    In-memory stand-in for the quixstreams `State` of one message key
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def set(self, key, value):
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def exists(self, key) -> bool:
+        return key in self.data
+
+
+@pytest.fixture
+def state() -> DictState:
+    return DictState()
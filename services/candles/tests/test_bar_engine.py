@@ -0,0 +1,69 @@
+import pytest
+from bar_engine import InformationBars
+
+PAIR = 'BTC/USD'
+
+
+def trade(timestamp_ms: int, price: float, volume: float) -> dict:
+    return {
+        'pair': PAIR,
+        'price': price,
+        'volume': volume,
+        'timestamp_ms': timestamp_ms,
+    }
+
+
+def test_tick_bars_close_every_n_trades(state):
+    bars = InformationBars({'tick': 3})
+
+    closed = []
+    for i, price in enumerate([100, 103, 99, 101, 102, 104, 105]):
+        closed += bars.process_trade(trade(i * 1000, price, 0.5), state)
+
+    assert len(closed) == 2
+    first, second = closed
+    assert (first['open'], first['high'], first['low'], first['close']) == (
+        100,
+        103,
+        99,
+        99,
+    )
+    assert (first['window_start'], first['window_end']) == (0, 2000)
+    assert (second['window_start'], second['window_end']) == (3000, 5000)
+    assert first['bar_type'] == 'tick'
+    assert first['candle_interval_seconds'] == 0
+    assert first['trade_count'] == second['trade_count'] == 3
+
+
+def test_volume_and_dollar_bars_close_on_the_trade_that_reaches_their_size(state):
+    bars = InformationBars({'volume': 1.0, 'dollar': 100.0})
+
+    closed = []
+    for i, volume in enumerate([0.4, 0.4, 0.4, 0.5, 0.7]):
+        closed += bars.process_trade(trade(i * 1000, 100.0, volume), state)
+
+    volume_bars = [bar for bar in closed if bar['bar_type'] == 'volume']
+    dollar_bars = [bar for bar in closed if bar['bar_type'] == 'dollar']
+    # the bar goes a bit over its size with the last trade
+    assert [bar['volume'] for bar in volume_bars] == pytest.approx([1.2, 1.2])
+    assert [bar['trade_count'] for bar in dollar_bars] == [3, 2]
+    assert [bar['vwap'] for bar in closed] == pytest.approx([100.0] * len(closed))
+
+
+def test_heartbeats_do_not_change_the_bars(state):
+    bars = InformationBars({'tick': 2})
+
+    bars.process_trade(trade(0, 100, 1.0), state)
+    heartbeat = {**trade(5000, 0.0, 0.0), 'heartbeat': True}
+    assert bars.process_trade(heartbeat, state) == []
+    closed = bars.process_trade(trade(6000, 101, 1.0), state)
+
+    assert closed[0]['window_end'] == 6000
+    assert closed[0]['low'] == 100
+
+
+def test_unknown_bar_types_and_sizes_are_rejected():
+    with pytest.raises(ValueError):
+        InformationBars({'imbalance': 10})
+    with pytest.raises(ValueError):
+        InformationBars({'tick': 0})
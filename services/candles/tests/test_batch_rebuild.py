@@ -0,0 +1,104 @@
+import numpy as np
+from batch_rebuild import BatchCandleBuilder
+from candle_batch import CandleBatch
+from candle_engine import MultiIntervalCandles
+from conftest import DictState
+
+PAIRS = ['BTC/USD', 'ETH/USD']
+INTERVALS = [60, 300]
+
+
+def random_trades(num_trades: int = 2000, seed: int = 0) -> CandleBatch:
+    rng = np.random.default_rng(seed)
+    # several trades per minute, and some minutes without trades
+    timestamp_ms = np.sort(rng.integers(0, 120 * 60_000, num_trades))
+    timestamp_ms = timestamp_ms[(timestamp_ms // 60_000) % 7 != 3]
+    return CandleBatch.from_trades(
+        pairs=PAIRS,
+        pair_index=rng.integers(0, len(PAIRS), len(timestamp_ms)),
+        price=rng.uniform(90, 110, len(timestamp_ms)).round(2),
+        volume=rng.uniform(0.01, 1, len(timestamp_ms)).round(4),
+        timestamp_ms=timestamp_ms,
+    )
+
+
+def stream_candles(trades: CandleBatch, fill_empty_candles: bool) -> list:
+    engine = MultiIntervalCandles(
+        INTERVALS,
+        emit_incomplete_candles=False,
+        fill_empty_candles=fill_empty_candles,
+    )
+    states = {pair: DictState() for pair in PAIRS}
+    candles = []
+    for pair_index, price, volume, timestamp_ms in zip(
+        trades.pair_index.tolist(),
+        trades.close.tolist(),
+        trades.volume.tolist(),
+        trades.timestamp_ms.tolist(),
+        strict=True,
+    ):
+        pair = PAIRS[pair_index]
+        trade = {
+            'pair': pair,
+            'price': price,
+            'volume': volume,
+            'timestamp_ms': timestamp_ms,
+        }
+        candles += engine.process_trade(trade, states[pair])
+    return candles
+
+
+def batch_candles(trades: CandleBatch, chunk_size: int, fill_empty_candles: bool):
+    builder = BatchCandleBuilder(INTERVALS, fill_empty_candles=fill_empty_candles)
+    candles = []
+    for start in range(0, len(trades), chunk_size):
+        chunk = trades.take(slice(start, start + chunk_size))
+        for interval, closed in builder.add_trades(chunk):
+            candles += closed.to_messages(interval)
+    return candles
+
+
+def key(candle: dict) -> tuple:
+    return candle['pair'], candle['candle_interval_seconds'], candle['window_start']
+
+
+def assert_same_candles(streamed: list, batched: list) -> None:
+    streamed = {key(candle): candle for candle in streamed}
+    batched = {key(candle): candle for candle in batched}
+    assert streamed.keys() == batched.keys()
+    for k, candle in streamed.items():
+        for field, value in candle.items():
+            if isinstance(value, float):
+                assert np.isclose(batched[k][field], value), (k, field)
+            else:
+                assert batched[k][field] == value, (k, field)
+
+
+def test_batch_rebuild_gives_the_candles_of_the_streaming_engine():
+    trades = random_trades()
+
+    assert_same_candles(
+        stream_candles(trades, fill_empty_candles=False),
+        batch_candles(trades, chunk_size=97, fill_empty_candles=False),
+    )
+
+
+def test_batch_rebuild_fills_the_empty_windows_like_the_streaming_engine():
+    trades = random_trades()
+
+    assert_same_candles(
+        stream_candles(trades, fill_empty_candles=True),
+        batch_candles(trades, chunk_size=250, fill_empty_candles=True),
+    )
+
+
+def test_batch_rebuild_drops_the_late_trades_of_closed_candles():
+    trades = random_trades(200)
+    late = CandleBatch.from_trades(
+        pairs=PAIRS, pair_index=[0], price=[1.0], volume=[1.0], timestamp_ms=[0]
+    )
+    builder = BatchCandleBuilder(INTERVALS)
+    builder.add_trades(trades)
+
+    assert builder.add_trades(late) == []
+    assert builder.num_late_trades == 1
@@ -0,0 +1,143 @@
+import random
+
+from candle_engine import IncompleteCandlesPolicy, MultiIntervalCandles
+
+PAIR = 'BTC/USD'
+MINUTE_MS = 60_000
+
+
+def trade(timestamp_ms: int, price: float = 100.0, volume: float = 1.0) -> dict:
+    return {
+        'pair': PAIR,
+        'price': price,
+        'volume': volume,
+        'timestamp_ms': timestamp_ms,
+    }
+
+
+def heartbeat(timestamp_ms: int) -> dict:
+    return {**trade(timestamp_ms, 0.0, 0.0), 'heartbeat': True}
+
+
+def windows(candles: list) -> list:
+    return [
+        (candle['candle_interval_seconds'], candle['window_start'])
+        for candle in candles
+    ]
+
+
+def test_candle_takes_the_out_of_order_trades_within_the_grace_period(state):
+    engine = MultiIntervalCandles([60], emit_incomplete_candles=False, grace_ms=5000)
+
+    assert engine.process_trade(trade(59_000, price=101), state) == []
+    assert engine.process_trade(trade(62_000, price=102), state) == []
+    # out of order, still in the grace period of the first window
+    assert engine.process_trade(trade(58_000, price=99), state) == []
+    closed = engine.process_trade(trade(66_000, price=103), state)
+
+    assert windows(closed) == [(60, 0)]
+    assert closed[0]['open'] == 101
+    assert closed[0]['low'] == 99
+    assert closed[0]['close'] == 99
+    assert closed[0]['trade_count'] == 2
+
+    # past the grace period, the trade is dropped
+    assert engine.process_trade(trade(30_000, price=1), state) == []
+    closed = engine.process_trade(heartbeat(2 * MINUTE_MS + 5000), state)
+    assert windows(closed) == [(60, MINUTE_MS)]
+    assert closed[0]['trade_count'] == 2
+
+
+def test_heartbeats_close_the_candles_of_a_quiet_pair(state):
+    engine = MultiIntervalCandles([60], emit_incomplete_candles=True)
+
+    assert windows(engine.process_trade(trade(10_000), state)) == [(60, 0)]
+    assert engine.process_trade(heartbeat(30_000), state) == []
+    closed = engine.process_trade(heartbeat(MINUTE_MS), state)
+
+    assert windows(closed) == [(60, 0)]
+    assert closed[0]['window_end'] == MINUTE_MS
+
+
+def test_empty_windows_get_a_flat_candle_at_the_previous_close(state):
+    engine = MultiIntervalCandles(
+        [60], emit_incomplete_candles=False, fill_empty_candles=True
+    )
+
+    engine.process_trade(trade(10_000, price=101), state)
+    closed = engine.process_trade(trade(3 * MINUTE_MS + 10_000, price=105), state)
+
+    assert windows(closed) == [(60, 0), (60, 60_000), (60, 120_000)]
+    for flat in closed[1:]:
+        assert flat['open'] == flat['close'] == 101
+        assert flat['volume'] == 0.0
+        assert flat['trade_count'] == 0
+
+
+def test_closed_candles_are_rolled_up_into_the_coarser_intervals(state):
+    engine = MultiIntervalCandles([300, 60], emit_incomplete_candles=False)
+
+    closed = []
+    for minute, price in enumerate([100, 104, 98, 101, 102, 110]):
+        closed += engine.process_trade(
+            trade(minute * MINUTE_MS + 1000, price=price, volume=minute + 1), state
+        )
+
+    five_minutes = [
+        candle for candle in closed if candle['candle_interval_seconds'] == 300
+    ]
+    assert len(five_minutes) == 1
+    candle = five_minutes[0]
+    assert (candle['window_start'], candle['window_end']) == (0, 300_000)
+    assert (candle['open'], candle['high'], candle['low'], candle['close']) == (
+        100,
+        104,
+        98,
+        102,
+    )
+    assert candle['volume'] == 15
+    assert candle['trade_count'] == 5
+    assert candle['vwap'] == (100 + 104 * 2 + 98 * 3 + 101 * 4 + 102 * 5) / 15
+
+
+def test_incomplete_candles_never_overtake_the_final_candle_of_a_window(state):
+    engine = MultiIntervalCandles(
+        [60, 300], emit_incomplete_candles=True, grace_ms=20_000
+    )
+    rng = random.Random(0)
+    timestamps = [i * 1000 for i in range(0, 20 * MINUTE_MS // 1000, 7)]
+    # shuffled within 15 seconds, less than the grace period
+    timestamps = sorted(timestamps, key=lambda t: t + rng.uniform(0, 15_000))
+
+    emitted = []
+    for timestamp_ms in timestamps:
+        emitted += engine.process_trade(trade(timestamp_ms, price=timestamp_ms), state)
+
+    for interval in (60, 300):
+        candles = [c for c in emitted if c['candle_interval_seconds'] == interval]
+        window_starts = [candle['window_start'] for candle in candles]
+        assert window_starts == sorted(window_starts)
+    # no trade was dropped, the last candle of every window is its final one
+    minutes = {}
+    for candle in emitted:
+        if candle['candle_interval_seconds'] == 60:
+            minutes[candle['window_start']] = candle
+    assert sum(candle['trade_count'] for candle in minutes.values()) == len(timestamps)
+
+
+def test_throttled_incomplete_candles_are_emitted_once_per_interval(state):
+    engine = MultiIntervalCandles(
+        [60],
+        emit_incomplete_candles=True,
+        incomplete_candles_policy=IncompleteCandlesPolicy(
+            'throttle', throttle_ms=10_000
+        ),
+    )
+
+    emitted = []
+    for timestamp_ms in range(0, MINUTE_MS, 1000):
+        emitted += engine.process_trade(trade(timestamp_ms), state)
+
+    assert [candle['timestamp_ms'] for candle in emitted] == list(
+        range(0, MINUTE_MS, 10_000)
+    )
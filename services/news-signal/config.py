@@ -10,8 +10,13 @@ class Config(BaseSettings):
     kafka_input_topic: str
     kafka_output_topic: str
     kafka_consumer_group: str
+    # wire format of the input and output topics, 'json' or 'msgpack'
+    kafka_input_serialization: Literal['json', 'msgpack'] = 'json'
+    kafka_output_serialization: Literal['json', 'msgpack'] = 'json'
 
     model_provider: Literal['anthropic', 'ollama']
+    # port of the Prometheus metrics endpoint (/metrics), 0 turns the metrics off
+    metrics_port: int = 0
 
 
 config = Config()
@@ -2,6 +2,8 @@ from typing import List
 
 from llms.base import BaseNewsSignalExtractor
 from loguru import logger
+from pipeline_shared.instrumentation import Metrics
+from pipeline_shared.serializers import get_deserializer, get_serializer
 from quixstreams import Application
 
 
@@ -45,9 +47,14 @@ def main(
     kafka_output_topic: str,
     kafka_consumer_group: str,
     llm: BaseNewsSignalExtractor,
+    kafka_input_serialization: str = 'json',
+    kafka_output_serialization: str = 'json',
+    metrics_port: int = 0,
 ):
     logger.info('Hello from news-signal!')
 
+    metrics = Metrics('news-signal', port=metrics_port)
+
     # create a unique id from current milliseconds
     # TODO: remove this once we are done debugging
     import time
@@ -59,27 +66,33 @@ def main(
         broker_address=kafka_broker_address,
         consumer_group=kafka_consumer_group,
         auto_offset_reset='earliest',
+        consumer_extra_config=metrics.consumer_config(),
     )
 
     input_topic = app.topic(
         name=kafka_input_topic,
-        value_deserializer='json',
+        value_deserializer=get_deserializer(kafka_input_serialization),
     )
 
     output_topic = app.topic(
         name=kafka_output_topic,
-        value_serializer='json',
+        value_serializer=get_serializer(kafka_output_serialization),
     )
 
     sdf = app.dataframe(input_topic)
+    sdf = metrics.track_input(sdf)
 
-    sdf = sdf.apply(add_signal_to_news, expand=True)
+    sdf = sdf.apply(
+        metrics.timed('add_signal_to_news', add_signal_to_news), expand=True
+    )
 
     sdf = sdf.update(lambda value: logger.debug(f'Final message: {value}'))
     # sdf = sdf.update(lambda value: breakpoint())
 
+    sdf = metrics.track_output(sdf)
     sdf = sdf.to_topic(output_topic)
 
+    metrics.start()
     app.run()
 
 
@@ -96,4 +109,7 @@ if __name__ == '__main__':
         kafka_output_topic=config.kafka_output_topic,
         kafka_consumer_group=config.kafka_consumer_group,
         llm=llm,
+        kafka_input_serialization=config.kafka_input_serialization,
+        kafka_output_serialization=config.kafka_output_serialization,
+        metrics_port=config.metrics_port,
     )
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -10,6 +12,10 @@ class Config(BaseSettings):
     kafka_broker_address: str
     kafka_topic: str
     polling_interval_sec: int
+    # wire format of the output topic, 'json' or 'msgpack'
+    kafka_output_serialization: Literal['json', 'msgpack'] = 'json'
+    # port of the Prometheus metrics endpoint (/metrics), 0 turns the metrics off
+    metrics_port: int = 0
 
 
 config = Config()
@@ -1,10 +1,18 @@
 from loguru import logger
 from news_data_source import NewsDataSource
 from news_downloader import NewsDownloader
+from pipeline_shared.instrumentation import Metrics
+from pipeline_shared.serializers import get_serializer
 from quixstreams import Application
 
 
-def main(kafka_broker_address: str, kafka_topic: str, news_source: NewsDataSource):
+def main(
+    kafka_broker_address: str,
+    kafka_topic: str,
+    news_source: NewsDataSource,
+    kafka_output_serialization: str = 'json',
+    metrics_port: int = 0,
+):
     """ "
     1. Gets news from cryptopanic api
     2. Send it to kafka topic
@@ -13,16 +21,22 @@ def main(kafka_broker_address: str, kafka_topic: str, news_source: NewsDataSourc
         f'Starting news service with kafka broker address: {kafka_broker_address} and kafka topic: {kafka_topic}'
     )
 
+    metrics = Metrics('news', port=metrics_port)
+
     app = Application(broker_address=kafka_broker_address)
 
-    output_topic = app.topic(name=kafka_topic, value_serializer='json')
+    output_topic = app.topic(
+        name=kafka_topic, value_serializer=get_serializer(kafka_output_serialization)
+    )
 
     # create a streaming dataframe
     sdf = app.dataframe(source=news_source)
 
     # send the streaming dataframe to the output topic
+    sdf = metrics.track_output(sdf)
     sdf = sdf.to_topic(output_topic)
 
+    metrics.start()
     app.run()
 
 
@@ -44,4 +58,6 @@ if __name__ == '__main__':
         kafka_broker_address=config.kafka_broker_address,
         kafka_topic=config.kafka_topic,
         news_source=news_source,
+        kafka_output_serialization=config.kafka_output_serialization,
+        metrics_port=config.metrics_port,
     )
@@ -0,0 +1,214 @@
+import functools
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable, Tuple
+
+from loguru import logger
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    start_http_server,
+)
+
+# seconds, from a fast in-memory step to a slow LLM call
+DEFAULT_BUCKETS = (
+    0.0001,
+    0.0005,
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.5,
+    1.0,
+    5.0,
+    10.0,
+    60.0,
+)
+
+
+class _NoopMetric:
+    """
+    Stands for every metric when the metrics are off, so the services call it
+    without checking, at the cost of an empty method call
+    """
+
+    def labels(self, *label_values: str) -> '_NoopMetric':
+        return self
+
+    def inc(self, amount: float = 1) -> None:
+        pass
+
+    def set(self, value: float) -> None:
+        pass
+
+    def observe(self, amount: float) -> None:
+        pass
+
+
+NOOP = _NoopMetric()
+
+
+def directory_size(path: Path) -> int:
+    """
+    Size in bytes of the files under `path`
+    """
+    total = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            try:
+                total += os.path.getsize(os.path.join(root, file))
+            except FileNotFoundError:
+                # rocksdb compactions remove files while we walk
+                pass
+    return total
+
+
+class Metrics:
+    """
+    Prometheus metrics of a service, served with `prometheus_client` on
+    http://0.0.0.0:<port>/metrics:
+
+    - messages_in_total, messages_out_total: messages read and emitted
+    - step_duration_seconds{step}: processing time of the instrumented steps
+    - event_to_emit_seconds: from the event timestamp of a message to its emission
+    - consumer_lag{topic, partition}: from the librdkafka statistics
+    - state_store_bytes: size of the state directory, computed on scrape
+
+    The metrics live in a registry of their own, with a `target_info{service}`
+    metric naming the service. With `port=0` the metrics are off: the
+    dataframe steps are not added, the functions are not wrapped and the
+    metrics are no-ops, so it costs nothing.
+    """
+
+    def __init__(self, service: str, port: int = 0):
+        """
+        Args:
+            service: Name of the service, in the `target_info` metric
+            port: Port of the metrics endpoint, 0 turns the metrics off
+        """
+        self.service = service
+        self.port = port
+        self.enabled = port > 0
+        self.registry = CollectorRegistry(target_info={'service': service})
+
+        self.messages_in = self.counter('messages_in_total', 'Messages read')
+        self.messages_out = self.counter('messages_out_total', 'Messages emitted')
+        self.step_duration = self.histogram(
+            'step_duration_seconds', 'Processing time of a step', ('step',)
+        )
+        self.event_to_emit = self.histogram(
+            'event_to_emit_seconds', 'From the event timestamp to the emission'
+        )
+
+    def counter(self, name: str, help: str, label_names: Tuple[str, ...] = ()):
+        if not self.enabled:
+            return NOOP
+        return Counter(name, help, label_names, registry=self.registry)
+
+    def gauge(self, name: str, help: str, label_names: Tuple[str, ...] = ()):
+        if not self.enabled:
+            return NOOP
+        return Gauge(name, help, label_names, registry=self.registry)
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        label_names: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        if not self.enabled:
+            return NOOP
+        return Histogram(
+            name, help, label_names, registry=self.registry, buckets=buckets
+        )
+
+    def timed(self, step: str, func: Callable) -> Callable:
+        """
+        Wraps a dataframe function to record its processing time under `step`
+        """
+        if not self.enabled:
+            return func
+
+        observe = self.step_duration.labels(step).observe
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(time.perf_counter() - start)
+
+        return wrapper
+
+    def track_input(self, sdf):
+        """
+        Counts the messages that enter the dataframe
+        """
+        if not self.enabled:
+            return sdf
+        inc = self.messages_in.inc
+        return sdf.update(lambda value: inc())
+
+    def track_output(self, sdf):
+        """
+        Counts the messages that leave the dataframe and the time since their
+        event timestamp
+        """
+        if not self.enabled:
+            return sdf
+        inc = self.messages_out.inc
+        observe = self.event_to_emit.observe
+
+        def track(value, key, timestamp_ms, headers):
+            inc()
+            observe(max(time.time() - timestamp_ms / 1000, 0.0))
+
+        return sdf.update(track, metadata=True)
+
+    def consumer_config(self, statistics_interval_ms: int = 5000) -> dict:
+        """
+        librdkafka settings to get the consumer lag per partition, to be passed
+        as `consumer_extra_config` to the `Application`
+        """
+        if not self.enabled:
+            return {}
+
+        lag = self.gauge('consumer_lag', 'Messages behind', ('topic', 'partition'))
+
+        def on_stats(stats_json: str) -> None:
+            stats = json.loads(stats_json)
+            for topic, topic_stats in stats.get('topics', {}).items():
+                for partition, partition_stats in topic_stats['partitions'].items():
+                    # -1 is the internal unassigned partition, and the lag is -1
+                    # until the first fetch
+                    if partition != '-1' and partition_stats['consumer_lag'] >= 0:
+                        lag.labels(topic, partition).set(
+                            partition_stats['consumer_lag']
+                        )
+
+        return {'statistics.interval.ms': statistics_interval_ms, 'stats_cb': on_stats}
+
+    def watch_state_dir(self, state_dir: Path) -> None:
+        """
+        Reports the size of the state directory, on every scrape
+        """
+        if not self.enabled:
+            return
+        size = self.gauge('state_store_bytes', 'Size of the state directory')
+        size.set_function(lambda: directory_size(state_dir))
+
+    def start(self) -> None:
+        """
+        Serves the metrics endpoint from a background thread
+        """
+        if not self.enabled:
+            return
+        start_http_server(self.port, registry=self.registry)
+        logger.info(f'Serving the metrics on http://0.0.0.0:{self.port}/metrics')
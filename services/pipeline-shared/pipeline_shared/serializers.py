@@ -0,0 +1,137 @@
+"""
+Pluggable Kafka value (de)serializers, shared by the services of the pipeline.
+
+- 'json': the quixstreams default, encoded and decoded with orjson.
+- 'msgpack': compact binary format. Trades and candles are typed structs
+  encoded as arrays, without the field names, and are validated on decode.
+  Other messages are encoded as msgpack maps.
+
+Every service that reads or writes these topics installs this package, so they
+all share the same message schemas.
+"""
+
+from typing import Any, Literal, Mapping, Optional
+
+import msgspec
+from quixstreams.models import (
+    Deserializer,
+    JSONDeserializer,
+    JSONSerializer,
+    SerializationContext,
+    Serializer,
+)
+from quixstreams.models.serializers import SerializationError
+
+SerializationFormat = Literal['json', 'msgpack']
+MessageSchema = Literal['trade', 'candle']
+
+
+class TradeMessage(msgspec.Struct, array_like=True):
+    """
+    Message of the `trades_*` topics, same fields as `Trade.to_dict`
+    """
+
+    pair: str
+    price: float
+    volume: float
+    timestamp_ms: int
+    # no trade, only moves the event time of the pair, see `TradesProducer`
+    heartbeat: bool = False
+
+
+class CandleMessage(msgspec.Struct, array_like=True):
+    """
+    Message of the `candles_*` topics
+    """
+
+    pair: str
+    timestamp_ms: int
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+    window_start: int
+    window_end: int
+    candle_interval_seconds: int
+    # defaults, so the candles written before these fields still decode
+    trade_count: int = 0
+    vwap: float = 0.0
+    # 'time' for the candles of candle_interval_seconds, or 'tick', 'volume' and
+    # 'dollar' for the bars, with candle_interval_seconds=0
+    bar_type: str = 'time'
+
+
+SCHEMAS = {'trade': TradeMessage, 'candle': CandleMessage}
+
+
+class MsgpackSerializer(Serializer):
+    def __init__(self, schema: Optional[MessageSchema] = None):
+        """
+        Encodes the dicts of the dataframe with msgpack
+
+        Args:
+            schema: Message schema, to encode the messages as arrays of values
+        """
+        self._struct = SCHEMAS[schema] if schema else None
+        self._encoder = msgspec.msgpack.Encoder()
+
+    def __call__(self, value: Mapping, ctx: SerializationContext) -> bytes:
+        try:
+            if self._struct is not None:
+                value = self._struct(**value)
+            return self._encoder.encode(value)
+        except (TypeError, ValueError) as exc:
+            raise SerializationError(str(exc)) from exc
+
+
+class MsgpackDeserializer(Deserializer):
+    def __init__(self, schema: Optional[MessageSchema] = None):
+        """
+        Decodes msgpack messages into dicts
+
+        Args:
+            schema: Message schema, to decode and validate arrays of values
+        """
+        super().__init__()
+        self._struct = SCHEMAS[schema] if schema else None
+        self._decoder = msgspec.msgpack.Decoder(self._struct or Any)
+
+    def __call__(self, value: bytes, ctx: SerializationContext) -> Any:
+        try:
+            value = self._decoder.decode(value)
+        except msgspec.DecodeError as exc:
+            raise SerializationError(str(exc)) from exc
+        if self._struct is not None:
+            return msgspec.structs.asdict(value)
+        return value
+
+
+def get_serializer(
+    serialization: SerializationFormat, schema: Optional[MessageSchema] = None
+) -> Serializer:
+    """
+    Value serializer for `app.topic`
+
+    Args:
+        serialization: Wire format of the topic
+        schema: Message schema of the topic, if it has a typed one
+    """
+    if serialization == 'msgpack':
+        return MsgpackSerializer(schema)
+    return JSONSerializer()
+
+
+def get_deserializer(
+    serialization: SerializationFormat, schema: Optional[MessageSchema] = None
+) -> Deserializer:
+    """
+    Value deserializer for `app.topic`
+
+    Args:
+        serialization: Wire format of the topic
+        schema: Message schema of the topic, if it has a typed one
+    """
+    if serialization == 'msgpack':
+        return MsgpackDeserializer(schema)
+    return JSONDeserializer()
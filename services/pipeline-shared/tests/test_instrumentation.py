@@ -0,0 +1,97 @@
+import json
+import socket
+import urllib.request
+
+from pipeline_shared.instrumentation import NOOP, Metrics
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def sample(metrics: Metrics, name: str, labels: dict = None) -> float:
+    return metrics.registry.get_sample_value(name, labels or {})
+
+
+def test_metrics_are_noops_when_off():
+    metrics = Metrics('candles')
+
+    def step(value):
+        return value
+
+    assert metrics.messages_in is NOOP
+    assert metrics.counter('failures_total', 'Failures') is NOOP
+    assert metrics.timed('step', step) is step
+    assert metrics.consumer_config() == {}
+    metrics.step_duration.labels('step').observe(1.0)
+    metrics.start()
+
+
+def test_timed_records_the_duration_of_the_step():
+    metrics = Metrics('candles', port=free_port())
+
+    def step(value):
+        return value + 1
+
+    timed = metrics.timed('step', step)
+    assert timed(1) == 2
+    assert timed(2) == 3
+
+    labels = {'step': 'step'}
+    assert sample(metrics, 'step_duration_seconds_count', labels) == 2
+    assert sample(metrics, 'step_duration_seconds_sum', labels) > 0
+    assert sample(metrics, 'target_info', {'service': 'candles'}) == 1
+
+
+def test_consumer_lag_is_read_from_the_librdkafka_statistics():
+    metrics = Metrics('candles', port=free_port())
+    on_stats = metrics.consumer_config()['stats_cb']
+
+    on_stats(
+        json.dumps(
+            {
+                'topics': {
+                    'trades': {
+                        'partitions': {
+                            '0': {'consumer_lag': 12},
+                            '1': {'consumer_lag': -1},
+                            '-1': {'consumer_lag': 5},
+                        }
+                    }
+                }
+            }
+        )
+    )
+
+    assert sample(metrics, 'consumer_lag', {'topic': 'trades', 'partition': '0'}) == 12
+    assert (
+        sample(metrics, 'consumer_lag', {'topic': 'trades', 'partition': '1'}) is None
+    )
+    assert (
+        sample(metrics, 'consumer_lag', {'topic': 'trades', 'partition': '-1'}) is None
+    )
+
+
+def test_state_dir_size_is_computed_on_scrape(tmp_path):
+    metrics = Metrics('candles', port=free_port())
+    metrics.watch_state_dir(tmp_path)
+
+    assert sample(metrics, 'state_store_bytes') == 0
+    (tmp_path / 'store').mkdir()
+    (tmp_path / 'store' / 'data').write_bytes(b'x' * 100)
+    assert sample(metrics, 'state_store_bytes') == 100
+
+
+def test_start_serves_the_metrics():
+    port = free_port()
+    metrics = Metrics('candles', port=port)
+    metrics.messages_out.inc(3)
+    metrics.start()
+
+    with urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics') as response:
+        body = response.read().decode()
+
+    assert 'messages_out_total 3.0' in body
+    assert 'target_info{service="candles"} 1.0' in body
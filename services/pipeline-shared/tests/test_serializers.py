@@ -0,0 +1,70 @@
+import msgspec
+import pytest
+from pipeline_shared.serializers import get_deserializer, get_serializer
+from quixstreams.models import SerializationContext
+from quixstreams.models.serializers import SerializationError
+
+CTX = SerializationContext(topic='test', field='value')
+
+TRADE = {
+    'pair': 'BTC/USD',
+    'price': 76395.0,
+    'volume': 0.01305597,
+    'timestamp_ms': 1731155565415,
+    'heartbeat': False,
+}
+CANDLE = {
+    'pair': 'BTC/USD',
+    'timestamp_ms': 1731155579999,
+    'open': 76395.0,
+    'high': 76400.0,
+    'low': 76390.0,
+    'close': 76398.0,
+    'volume': 1.5,
+    'window_start': 1731155520000,
+    'window_end': 1731155580000,
+    'candle_interval_seconds': 60,
+    'trade_count': 12,
+    'vwap': 76396.2,
+    'bar_type': 'time',
+}
+
+
+def roundtrip(serialization: str, schema, value):
+    encoded = get_serializer(serialization, schema)(value, CTX)
+    return get_deserializer(serialization, schema)(encoded, CTX)
+
+
+@pytest.mark.parametrize('serialization', ['json', 'msgpack'])
+@pytest.mark.parametrize('schema, value', [('trade', TRADE), ('candle', CANDLE)])
+def test_messages_round_trip(serialization, schema, value):
+    assert roundtrip(serialization, schema, value) == value
+
+
+def test_msgpack_messages_are_arrays_of_values():
+    encoded = get_serializer('msgpack', 'trade')(TRADE, CTX)
+
+    assert msgspec.msgpack.decode(encoded) == list(TRADE.values())
+
+
+def test_msgpack_candles_written_before_the_new_fields_still_decode():
+    # a candle of the first version of the schema, without trade_count, vwap
+    # and bar_type
+    encoded = msgspec.msgpack.encode(list(CANDLE.values())[:10])
+
+    candle = get_deserializer('msgpack', 'candle')(encoded, CTX)
+
+    assert candle == {**CANDLE, 'trade_count': 0, 'vwap': 0.0, 'bar_type': 'time'}
+
+
+def test_msgpack_rejects_a_message_with_missing_fields():
+    with pytest.raises(SerializationError):
+        get_serializer('msgpack', 'candle')({'pair': 'BTC/USD'}, CTX)
+    with pytest.raises(SerializationError):
+        get_deserializer('msgpack', 'trade')(msgspec.msgpack.encode(['BTC/USD']), CTX)
+
+
+def test_msgpack_without_schema_keeps_the_field_names():
+    value = {'title': 'news', 'signal': 1}
+
+    assert roundtrip('msgpack', None, value) == value
@@ -0,0 +1,256 @@
+import time
+from typing import Dict, List, Literal, Optional, Tuple
+
+import numpy as np
+from confluent_kafka import OFFSET_BEGINNING, Consumer, TopicPartition
+from incremental_indicators import BAR_FIELDS, Indicator
+from loguru import logger
+from pipeline_shared.serializers import get_deserializer, get_serializer
+from quixstreams import Application
+from quixstreams.models import SerializationContext
+from warm_up import WarmUp
+
+
+class BatchIndicators:
+    """
+    Technical indicators of a whole historical candles topic, with the
+    vectorized TA-Lib functions run once per pair over all its candles instead
+    of one candle at a time, to backfill the indicators of the topic.
+
+    The candles are added in chunks as they are read, and the indicators are
+    computed once the topic is read, so every function sees the whole history
+    of the pair as the incremental indicators of the streaming mode do. A
+    candle of the same window as the latest one of its pair replaces it, so
+    every window gets one row with the indicators of its latest candle, and
+    the candles of older windows are dropped.
+    """
+
+    def __init__(self, indicators: List[Indicator], warm_up: Optional[WarmUp] = None):
+        """
+        Args:
+            indicators: The indicators to compute, see `build_indicators`
+            warm_up: The rows to emit during the warm-up, as the streaming mode.
+                None emits every row, without the indicators not warm yet
+        """
+        self.indicators = indicators
+        self.warm_up = warm_up
+        # per pair, the latest candle of every window and its position among
+        # the candles added
+        self._candles: Dict[str, List[dict]] = {}
+        self._positions: Dict[str, List[int]] = {}
+        self.num_candles = 0
+        self.num_late_candles = 0
+
+    def add_candles(self, candles: List[dict]) -> None:
+        """
+        Adds a chunk of candles, in time order per pair
+        """
+        for position, candle in enumerate(candles, start=self.num_candles):
+            pair = candle['pair']
+            pair_candles = self._candles.setdefault(pair, [])
+            positions = self._positions.setdefault(pair, [])
+            if pair_candles:
+                window_start = pair_candles[-1]['window_start']
+                if candle['window_start'] < window_start:
+                    self.num_late_candles += 1
+                    continue
+                if candle['window_start'] == window_start:
+                    pair_candles.pop()
+                    positions.pop()
+            pair_candles.append(candle)
+            positions.append(position)
+        self.num_candles += len(candles)
+
+    def rows(self) -> List[Tuple[int, dict]]:
+        """
+        Computes the indicators of the candles added so far
+
+        Returns:
+            List[Tuple[int, dict]]: The candles with their indicators, as the
+                streaming mode emits them, and their position among the
+                candles added, in that order
+        """
+        rows: List[Tuple[int, dict]] = []
+        for pair, candles in self._candles.items():
+            rows.extend(self._pair_rows(candles, self._positions[pair]))
+        rows.sort(key=lambda row: row[0])
+        return rows
+
+    def _pair_rows(
+        self, candles: List[dict], positions: List[int]
+    ) -> List[Tuple[int, dict]]:
+        columns = {
+            field: np.fromiter(
+                (candle[field] for candle in candles), np.float64, len(candles)
+            )
+            for field in BAR_FIELDS
+        }
+        names: List[str] = []
+        outputs = []
+        for indicator in self.indicators:
+            for name, values in zip(
+                indicator.names, indicator.compute_batch(columns), strict=True
+            ):
+                names.append(name)
+                outputs.append(values)
+        # one row of outputs per candle
+        outputs = np.ascontiguousarray(
+            np.array(outputs).reshape(len(names), len(candles)).T
+        )
+
+        # TA-Lib has no value, NaN, for the candles within the lookback of an
+        # indicator, the ones the warm-up sets to None, so the warm-up is done
+        # here on the arrays instead of with `WarmUp.apply` row by row
+        first = 0
+        warm_from = 0
+        if self.warm_up is not None:
+            warm_from = self.warm_up.warm_up_candles - 1
+            if self.warm_up.policy == 'suppress':
+                first = min(warm_from, len(candles))
+        flag_warm = self.warm_up is not None and self.warm_up.policy == 'nulls'
+        outputs = outputs[first:]
+        complete = ~np.isnan(outputs).any(axis=1)
+
+        rows = []
+        for index, (candle, position, is_complete, values) in enumerate(
+            zip(
+                candles[first:],
+                positions[first:],
+                complete.tolist(),
+                outputs.tolist(),
+                strict=True,
+            ),
+            start=first,
+        ):
+            row = {**candle}
+            if is_complete:
+                row.update(zip(names, values))
+            elif self.warm_up is not None:
+                row.update(
+                    (name, value if value == value else None)
+                    for name, value in zip(names, values)
+                )
+            else:
+                # as the streaming mode, without the indicators not warm yet
+                row.update(
+                    (name, value)
+                    for name, value in zip(names, values)
+                    if value == value
+                )
+            if flag_warm:
+                row['warm'] = index >= warm_from
+            rows.append((position, row))
+        return rows
+
+
+def backfill_indicators(
+    kafka_broker_address: str,
+    kafka_input_topic: str,
+    kafka_output_topic: str,
+    kafka_consumer_group: str,
+    candle_interval_seconds: int,
+    indicators: List[Indicator],
+    warm_up: WarmUp,
+    kafka_input_serialization: Literal['json', 'msgpack'] = 'json',
+    kafka_output_serialization: Literal['json', 'msgpack'] = 'json',
+    batch_size: int = 100_000,
+    idle_timeout_seconds: float = 30.0,
+) -> None:
+    """
+    Backfills the technical indicators of a historical candles topic, reading
+    it from the beginning in chunks of `batch_size` candles, then computing the
+    indicators of every pair at once and writing them in bulk, in the same
+    schema as the streaming mode.
+
+    Reads until no new candle arrives for `idle_timeout_seconds`, so it can run
+    while the candles service is still rebuilding the topic.
+
+    Args:
+        kafka_broker_address: The address of the Kafka broker
+        kafka_input_topic: The historical candles topic
+        kafka_output_topic: The technical indicators topic
+        kafka_consumer_group: The consumer group, only used for the metadata
+        candle_interval_seconds: Only the candles of this interval are used
+        indicators: The indicators to compute, see `build_indicators`
+        warm_up: The rows to emit during the warm-up
+        kafka_input_serialization: Wire format of the candles topic
+        kafka_output_serialization: Wire format of the technical indicators topic
+        batch_size: Max number of candles per chunk
+        idle_timeout_seconds: Time without new candles before stopping
+    """
+    app = Application(broker_address=kafka_broker_address)
+    output_topic = app.topic(name=kafka_output_topic)
+
+    deserialize = get_deserializer(kafka_input_serialization, 'candle')
+    serialize = get_serializer(kafka_output_serialization)
+    input_ctx = SerializationContext(topic=kafka_input_topic, field='value')
+    output_ctx = SerializationContext(topic=kafka_output_topic, field='value')
+
+    consumer = Consumer(
+        {
+            'bootstrap.servers': kafka_broker_address,
+            'group.id': kafka_consumer_group,
+            'enable.auto.commit': False,
+        }
+    )
+    metadata = consumer.list_topics(kafka_input_topic, timeout=10)
+    consumer.assign(
+        [
+            TopicPartition(kafka_input_topic, partition, OFFSET_BEGINNING)
+            for partition in metadata.topics[kafka_input_topic].partitions
+        ]
+    )
+
+    batch_indicators = BatchIndicators(indicators, warm_up)
+    # the timestamps of the candles added, the streaming mode keeps them
+    timestamps: List[int] = []
+    start = time.monotonic()
+    last_message = time.monotonic()
+
+    try:
+        while time.monotonic() - last_message < idle_timeout_seconds:
+            messages = consumer.consume(num_messages=batch_size, timeout=1.0)
+            if not messages:
+                continue
+            last_message = time.monotonic()
+
+            candles = []
+            for message in messages:
+                if message.error():
+                    logger.error(f'Failed to read candles: {message.error()}')
+                    continue
+                candle = deserialize(message.value(), input_ctx)
+                if candle['candle_interval_seconds'] != candle_interval_seconds:
+                    continue
+                candles.append(candle)
+                timestamps.append(message.timestamp()[1])
+            batch_indicators.add_candles(candles)
+            logger.info(
+                f'Read {batch_indicators.num_candles} candles, '
+                f'{batch_indicators.num_candles / (time.monotonic() - start):.0f} '
+                'candles/s'
+            )
+    finally:
+        consumer.close()
+
+    compute_start = time.monotonic()
+    rows = batch_indicators.rows()
+    logger.info(
+        f'Computed the indicators of {len(rows)} rows in '
+        f'{time.monotonic() - compute_start:.1f}s'
+    )
+
+    with app.get_producer() as producer:
+        for position, row in rows:
+            producer.produce(
+                topic=output_topic.name,
+                key=row['pair'].encode(),
+                value=serialize(row, output_ctx),
+                timestamp=timestamps[position],
+            )
+
+    logger.info(
+        f'Backfilled the indicators of {batch_indicators.num_candles} candles in '
+        f'{time.monotonic() - start:.1f}s, skipped {batch_indicators.num_late_candles} '
+        f'late candles'
+    )
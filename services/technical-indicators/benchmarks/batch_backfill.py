@@ -0,0 +1,157 @@
+"""
+Benchmark of the batch backfill of the technical indicators against the
+streaming mode, in candles/s, without a broker.
+
+The harness builds `--days` days of 1 minute candles for `--num-pairs` pairs,
+interleaved as in the candles topic, then computes their indicators:
+
+- candle by candle, with `update_candles` and the incremental indicators of
+  the streaming mode, on an in-memory state per pair
+- with `BatchIndicators`, added in chunks of `--batch-size` candles as the
+  backfill reads them, then computed with the vectorized TA-Lib functions
+  once per pair
+
+with the rows of the warm-up emitted as `--warm-up-policy` says, and checks
+that both emit the same rows, with the same indicators up to the float
+rounding of the running sums. The rate of the vectorized TA-Lib functions
+alone, without building the rows, is printed too.
+
+Usage:
+    uv run python benchmarks/batch_backfill.py --days 30 --num-pairs 8
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from batch_indicators import BatchIndicators  # noqa: E402
+from candle_ring import CandleRing  # noqa: E402
+from incremental_indicators import BAR_FIELDS, IncrementalIndicators  # noqa: E402
+from indicator_registry import default_indicators  # noqa: E402
+from synthetic_candles import DictState, make_candles  # noqa: E402
+from warm_up import WarmUp  # noqa: E402
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--num-pairs', type=int, default=8)
+    parser.add_argument('--batch-size', type=int, default=100_000)
+    parser.add_argument('--num-candles-in-state', type=int, default=60)
+    parser.add_argument(
+        '--warm-up-policy', choices=['suppress', 'nulls'], default='suppress'
+    )
+    return parser.parse_args()
+
+
+def make_topic(args: argparse.Namespace) -> List[dict]:
+    """
+    The candles of all the pairs, in time order
+    """
+    num_candles = args.days * 24 * 60
+    pairs = [
+        [
+            {**candle, 'pair': f'PAIR{i}/USD', 'candle_interval_seconds': 60}
+            for candle in make_candles(num_candles, seed=i)
+        ]
+        for i in range(args.num_pairs)
+    ]
+    return [candle for candles in zip(*pairs) for candle in candles]
+
+
+def stream(args: argparse.Namespace, candles: List[dict]) -> List[dict]:
+    ring = CandleRing(args.num_candles_in_state)
+    engine = IncrementalIndicators(default_indicators())
+    warm_up = WarmUp(default_indicators(), args.warm_up_policy)
+    states = {}
+    rows = []
+    for candle in candles:
+        state = states.setdefault(candle['pair'], DictState())
+        ring.update(candle, state)
+        row = warm_up.apply_stream(engine.compute(candle, state), state)
+        if row is not None:
+            rows.append(row)
+    return rows
+
+
+def batch(args: argparse.Namespace, candles: List[dict]) -> List[dict]:
+    indicators = BatchIndicators(
+        default_indicators(), WarmUp(default_indicators(), args.warm_up_policy)
+    )
+    for start in range(0, len(candles), args.batch_size):
+        indicators.add_candles(candles[start : start + args.batch_size])
+    return [row for _, row in indicators.rows()]
+
+
+def vectorized(args: argparse.Namespace, candles: List[dict]) -> float:
+    """
+    The TA-Lib functions of `BatchIndicators` alone, over the columns of
+    every pair
+
+    Returns:
+        float: The seconds spent in the TA-Lib functions
+    """
+    seconds = 0.0
+    for i in range(args.num_pairs):
+        pair = f'PAIR{i}/USD'
+        columns = {
+            field: np.array(
+                [candle[field] for candle in candles if candle['pair'] == pair],
+                dtype=np.float64,
+            )
+            for field in BAR_FIELDS
+        }
+        start = time.perf_counter()
+        for indicator in default_indicators():
+            indicator.compute_batch(columns)
+        seconds += time.perf_counter() - start
+    return seconds
+
+
+def check_same_rows(stream_rows: List[dict], batch_rows: List[dict]) -> None:
+    assert len(stream_rows) == len(batch_rows), 'Not the same number of rows'
+    for stream_row, batch_row in zip(stream_rows, batch_rows, strict=True):
+        assert (
+            stream_row.keys() == batch_row.keys()
+        ), f'Not the same indicators: {stream_row.keys() ^ batch_row.keys()}'
+        for name, value in stream_row.items():
+            if isinstance(value, float) and batch_row[name] is not None:
+                assert np.isclose(value, batch_row[name], rtol=1e-9, atol=1e-9), (
+                    f'{stream_row["pair"]} {stream_row["window_start"]} {name}: '
+                    f'{value} != {batch_row[name]}'
+                )
+            else:
+                assert value == batch_row[name], name
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    candles = make_topic(args)
+    print(f'{len(candles):,} candles of {args.num_pairs} pairs')
+
+    start = time.perf_counter()
+    stream_rows = stream(args, candles)
+    stream_rate = len(candles) / (time.perf_counter() - start)
+    print(f'stream: {stream_rate:,.0f} candles/s')
+
+    start = time.perf_counter()
+    batch_rows = batch(args, candles)
+    batch_rate = len(candles) / (time.perf_counter() - start)
+    print(
+        f'batch: {batch_rate:,.0f} candles/s, speedup {batch_rate / stream_rate:.0f}x'
+    )
+
+    vectorized_rate = len(candles) / vectorized(args, candles)
+    print(
+        f'TA-Lib alone: {vectorized_rate:,.0f} candles/s, '
+        f'speedup {vectorized_rate / stream_rate:.0f}x'
+    )
+
+    check_same_rows(stream_rows, batch_rows)
+    print('same rows in both modes')
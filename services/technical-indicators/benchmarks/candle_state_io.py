@@ -0,0 +1,88 @@
+"""
+Benchmark of the bytes written to the state by `update_candles` per candle:
+the list of the last candles rewritten on every message, as before, against
+the ring buffer of `CandleRing` with one key per candle.
+
+The bytes are those of the values serialized as JSON, as the quixstreams state
+does before writing them to RocksDB and to the changelog topic.
+
+Usage:
+    uv run python benchmarks/candle_state_io.py --num-candles-in-state 60
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from candle_ring import CandleRing  # noqa: E402
+from synthetic_candles import DictState, make_candles  # noqa: E402
+
+
+class CountingState(DictState):
+    """
+    Counts the bytes of the values written to the state
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.bytes_written = 0
+
+    def set(self, key, value) -> None:
+        self.bytes_written += len(json.dumps(value))
+        super().set(key, value)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--num-candles', type=int, default=5000)
+    parser.add_argument('--updates-per-candle', type=int, default=3)
+    parser.add_argument('--num-candles-in-state', type=int, default=60)
+    return parser.parse_args()
+
+
+def candle_messages(args: argparse.Namespace):
+    for candle in make_candles(args.num_candles, seed=0):
+        candle = {
+            **candle,
+            'candle_interval_seconds': 60,
+            'trade_count': 100,
+            'vwap': candle['close'],
+            'timestamp_ms': candle['window_end'],
+        }
+        for _ in range(args.updates_per_candle + 1):
+            yield candle
+
+
+def list_state_bytes(args: argparse.Namespace) -> int:
+    state = CountingState()
+    for candle in candle_messages(args):
+        candles = state.get('candles', default=[])
+        if candles and candles[-1]['window_start'] == candle['window_start']:
+            candles[-1] = candle
+        else:
+            candles.append(candle)
+        if len(candles) > args.num_candles_in_state:
+            candles.pop(0)
+        state.set('candles', candles)
+    return state.bytes_written
+
+
+def ring_state_bytes(args: argparse.Namespace) -> int:
+    state = CountingState()
+    ring = CandleRing(args.num_candles_in_state)
+    for candle in candle_messages(args):
+        ring.update(candle, state)
+    return state.bytes_written
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    num_messages = args.num_candles * (args.updates_per_candle + 1)
+    list_bytes = list_state_bytes(args) / num_messages
+    ring_bytes = ring_state_bytes(args) / num_messages
+    print(f'list of candles: {list_bytes:,.0f} bytes written per candle')
+    print(f'ring buffer: {ring_bytes:,.0f} bytes written per candle')
+    print(f'reduction: {list_bytes / ring_bytes:.0f}x')
@@ -0,0 +1,74 @@
+"""
+Benchmark of the technical indicators in candles/s: TA-Lib over the candles
+in the state (INDICATORS_ENGINE=talib) against the incremental indicators, for
+the default feature set or the one of `--indicators`.
+
+Every candle is sent `--updates-per-candle` times, as the incomplete candles of
+its window, then once more as the final candle. The state of the candles is
+built as `update_candles` does, outside of the timings, and the first
+`--num-candles-in-state` candles are not timed, as TA-Lib needs them.
+
+Usage:
+    uv run python benchmarks/indicator_throughput.py --num-candles 20000
+"""
+
+import argparse
+import json
+import sys
+import time
+from functools import partial
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from candle_ring import CandleRing  # noqa: E402
+from incremental_indicators import IncrementalIndicators  # noqa: E402
+from indicator_registry import DEFAULT_INDICATORS, build_indicators  # noqa: E402
+from synthetic_candles import DictState, make_candles  # noqa: E402
+from technical_indicators import compute_technical_indicators  # noqa: E402
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--num-candles', type=int, default=20_000)
+    parser.add_argument('--updates-per-candle', type=int, default=3)
+    parser.add_argument('--num-candles-in-state', type=int, default=60)
+    parser.add_argument(
+        '--indicators',
+        type=json.loads,
+        default=DEFAULT_INDICATORS,
+        help='The feature set, as the INDICATORS setting',
+    )
+    return parser.parse_args()
+
+
+def run(args: argparse.Namespace, compute) -> float:
+    """
+    Returns:
+        float: Candles per second of `compute`, incomplete ones included
+    """
+    state = DictState()
+    ring = CandleRing(args.num_candles_in_state)
+    elapsed = 0.0
+    timed = 0
+    for i, candle in enumerate(make_candles(args.num_candles, seed=0)):
+        ring.update(candle, state)
+        if i + 1 < args.num_candles_in_state:
+            continue
+        for _ in range(args.updates_per_candle + 1):
+            start = time.perf_counter()
+            compute(candle, state)
+            elapsed += time.perf_counter() - start
+            timed += 1
+    return timed / elapsed
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    indicators = build_indicators(args.indicators)
+    print(f'{sum(len(indicator.names) for indicator in indicators)} indicators')
+    talib_rate = run(args, partial(compute_technical_indicators, indicators=indicators))
+    incremental_rate = run(args, IncrementalIndicators(indicators).compute)
+    print(f'talib: {talib_rate:,.0f} candles/s')
+    print(f'incremental: {incremental_rate:,.0f} candles/s')
+    print(f'speedup: {incremental_rate / talib_rate:.1f}x')
@@ -0,0 +1,55 @@
+"""
+Synthetic candles and an in-memory state, shared by the benchmarks
+"""
+
+from typing import List
+
+import numpy as np
+
+
+class DictState:
+    """
+    In-memory stand-in of the quixstreams `State` of one pair
+    """
+
+    def __init__(self):
+        self._values = {}
+
+    def get(self, key, default=None):
+        return self._values.get(key, default)
+
+    def set(self, key, value) -> None:
+        self._values[key] = value
+
+    def delete(self, key) -> None:
+        self._values.pop(key, None)
+
+
+def make_candles(num_candles: int, seed: int) -> List[dict]:
+    """
+    Random walk candles, with flat stretches where the indicators divide by zero
+    """
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.standard_normal(num_candles) * 1e-3))
+    # flat candles without volume, as the filled windows without trades
+    flat = rng.random(num_candles) < 0.05
+    for i in np.flatnonzero(flat)[1:]:
+        close[i] = close[i - 1]
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    spread = np.abs(rng.standard_normal(num_candles)) * 0.05 * ~flat
+    high = np.maximum(open_, close) + spread
+    low = np.minimum(open_, close) - spread
+    volume = rng.random(num_candles) * 10 * ~flat
+    return [
+        {
+            'pair': 'BTC/USD',
+            'window_start': 60_000 * i,
+            'window_end': 60_000 * (i + 1),
+            'open': open_[i],
+            'high': high[i],
+            'low': low[i],
+            'close': close[i],
+            'volume': volume[i],
+        }
+        for i in range(num_candles)
+    ]
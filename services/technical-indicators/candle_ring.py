@@ -0,0 +1,132 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+from quixstreams import State
+
+# fields of the candles kept in the state, read back as float64 arrays
+FIELDS = ('window_start', 'window_end', 'open', 'high', 'low', 'close', 'volume')
+
+HEADER_KEY = 'candles_ring'
+
+
+def _slot_key(slot: int) -> str:
+    return f'candles_slot_{slot}'
+
+
+def read_candles(state: State) -> Dict[str, np.ndarray]:
+    """
+    Reads the candles of the ring buffer of the pair
+
+    Returns:
+        Dict[str, np.ndarray]: One contiguous float64 array per field of
+            `FIELDS`, oldest candle first, empty if there are no candles
+    """
+    header = state.get(HEADER_KEY, default=None)
+    if header is None:
+        return {field: np.empty(0) for field in FIELDS}
+
+    capacity, head, size, _ = header
+    rows = [state.get(_slot_key((head + i) % capacity)) for i in range(size)]
+    packed = np.array(rows, dtype=np.float64).reshape(size, len(FIELDS)).T.copy()
+    return dict(zip(FIELDS, packed, strict=True))
+
+
+def read_num_candles(state: State) -> int:
+    """
+    Number of candles of the ring buffer of the pair, from its header only
+    """
+    header = state.get(HEADER_KEY, default=None)
+    return header[2] if header is not None else 0
+
+
+class CandleRing:
+    """
+    The last `capacity` candles of a pair in the state, as a ring buffer with
+    one key per slot, so a new candle costs the bytes of one candle instead of
+    the rewrite of the whole list:
+
+    - `candles_ring`: capacity, slot of the oldest candle, number of candles
+      and window start of the latest candle
+    - `candles_slot_<i>`: the fields of the candle of slot i, as in `FIELDS`
+
+    Replacing the latest candle writes its slot only, a candle of a new window
+    writes its slot and the header.
+    """
+
+    def __init__(self, capacity: int):
+        """
+        Args:
+            capacity: Max number of candles in the state
+        """
+        self.capacity = capacity
+
+    def last_window_start(self, state: State) -> Optional[int]:
+        header = state.get(HEADER_KEY, default=None)
+        return header[3] if header is not None else None
+
+    def update(self, candle: dict, state: State) -> bool:
+        """
+        Replaces the latest candle with the candle of the same window, or
+        appends the candle of a new window, evicting the oldest one when full
+
+        Returns:
+            bool: False if the candle is older than the latest one and was not
+                kept
+        """
+        header = state.get(HEADER_KEY, default=None)
+        if header is None or header[0] != self.capacity:
+            # first candle of the pair, or NUM_CANDLES_IN_STATE changed
+            candles = [
+                previous
+                for previous in self._candles(state, header)
+                if previous['window_start'] < candle['window_start']
+            ]
+            self.reset(candles + [candle], state)
+            return True
+
+        capacity, head, size, last_window_start = header
+        row = [candle[field] for field in FIELDS]
+        if candle['window_start'] == last_window_start:
+            state.set(_slot_key((head + size - 1) % capacity), row)
+            return True
+        if candle['window_start'] < last_window_start:
+            return False
+
+        if size < capacity:
+            state.set(_slot_key((head + size) % capacity), row)
+            size += 1
+        else:
+            state.set(_slot_key(head), row)
+            head = (head + 1) % capacity
+        state.set(HEADER_KEY, [capacity, head, size, candle['window_start']])
+        return True
+
+    def reset(self, candles: List[dict], state: State) -> None:
+        """
+        Replaces the candles of the pair with the last `capacity` candles
+        """
+        candles = candles[-self.capacity :]
+        for slot, candle in enumerate(candles):
+            state.set(_slot_key(slot), [candle[field] for field in FIELDS])
+        if candles:
+            header = [self.capacity, 0, len(candles), candles[-1]['window_start']]
+            state.set(HEADER_KEY, header)
+
+    def _candles(self, state: State, header: Optional[list]) -> List[dict]:
+        """
+        Candles of the ring buffer of another capacity, or of the list of
+        candles of the state before the ring buffer
+        """
+        if header is None:
+            candles = state.get('candles', default=[])
+            if candles:
+                state.delete('candles')
+            return candles
+
+        columns = read_candles(state)
+        for slot in range(header[0]):
+            state.delete(_slot_key(slot))
+        return [
+            dict(zip(FIELDS, values, strict=True))
+            for values in zip(*(columns[field].tolist() for field in FIELDS))
+        ]
@@ -0,0 +1,117 @@
+import time
+from typing import Dict, List, Literal
+
+from confluent_kafka import OFFSET_BEGINNING, Consumer, TopicPartition
+from loguru import logger
+from pipeline_shared.serializers import get_deserializer
+from quixstreams.models import SerializationContext
+
+# the columns of the snapshots, see `CandleSnapshots` in the candles service
+SNAPSHOT_COLUMNS = (
+    'window_start',
+    'window_end',
+    'open',
+    'high',
+    'low',
+    'close',
+    'volume',
+    'trade_count',
+    'vwap',
+    'timestamp_ms',
+)
+
+
+def load_candle_snapshots(
+    kafka_broker_address: str,
+    kafka_snapshot_topic: str,
+    candle_interval_seconds: int,
+    kafka_input_serialization: Literal['json', 'msgpack'] = 'json',
+    timeout_seconds: float = 30.0,
+) -> Dict[str, List[dict]]:
+    """
+    Reads the compacted topic of candle snapshots of the candles service up to
+    its end, to fill the state of the pairs at startup.
+
+    Args:
+        kafka_broker_address: The address of the Kafka broker
+        kafka_snapshot_topic: The compacted topic of the snapshots
+        candle_interval_seconds: Only the candles of this interval are kept
+        kafka_input_serialization: Wire format of the snapshots, the same as
+            the candles topic
+        timeout_seconds: Max time to read the topic
+
+    Returns:
+        Dict[str, List[dict]]: The last closed candles of every pair, oldest
+            first, in the schema of the candles topic
+    """
+    consumer = Consumer(
+        {
+            'bootstrap.servers': kafka_broker_address,
+            'group.id': f'{kafka_snapshot_topic}-loader',
+            'enable.auto.commit': False,
+        }
+    )
+    deserialize = get_deserializer(kafka_input_serialization)
+    ctx = SerializationContext(topic=kafka_snapshot_topic, field='value')
+
+    snapshots: Dict[str, dict] = {}
+    try:
+        metadata = consumer.list_topics(kafka_snapshot_topic, timeout=10)
+        topic = metadata.topics[kafka_snapshot_topic]
+        if topic.error is not None:
+            logger.warning(f'No candle snapshots to load: {topic.error}')
+            return {}
+
+        # read every partition from the beginning up to its current end
+        remaining = {}
+        for partition in topic.partitions:
+            low, high = consumer.get_watermark_offsets(
+                TopicPartition(kafka_snapshot_topic, partition), timeout=10
+            )
+            if high > low:
+                remaining[partition] = high
+        consumer.assign(
+            [
+                TopicPartition(kafka_snapshot_topic, partition, OFFSET_BEGINNING)
+                for partition in remaining
+            ]
+        )
+
+        deadline = time.monotonic() + timeout_seconds
+        while remaining and time.monotonic() < deadline:
+            for message in consumer.consume(num_messages=1000, timeout=1.0):
+                if message.error():
+                    logger.error(f'Failed to read candle snapshots: {message.error()}')
+                    continue
+                if message.offset() + 1 >= remaining.get(message.partition(), 0):
+                    remaining.pop(message.partition(), None)
+                snapshot = deserialize(message.value(), ctx)
+                if snapshot['candle_interval_seconds'] == candle_interval_seconds:
+                    # the topic is compacted, but not right away: the latest wins
+                    snapshots[snapshot['pair']] = snapshot
+    finally:
+        consumer.close()
+
+    if remaining:
+        logger.warning(
+            f'Candle snapshots partially loaded after {timeout_seconds}s, the '
+            f'partitions {list(remaining)} were not read to the end'
+        )
+
+    candles = {
+        pair: [
+            {
+                'pair': pair,
+                'candle_interval_seconds': candle_interval_seconds,
+                'bar_type': 'time',
+                **dict(zip(SNAPSHOT_COLUMNS, values, strict=True)),
+            }
+            for values in zip(*(snapshot[column] for column in SNAPSHOT_COLUMNS))
+        ]
+        for pair, snapshot in snapshots.items()
+    }
+    logger.info(
+        f'Loaded the candle snapshots of {len(candles)} pairs from '
+        f'{kafka_snapshot_topic}'
+    )
+    return candles
@@ -1,15 +1,31 @@
+from typing import Dict, List
+
+from candle_ring import CandleRing
 from config import config
+from incremental_indicators import INDICATORS_HEADER_KEY
+from indicator_registry import build_indicators, warm_up_candles
 from loguru import logger
 from quixstreams import State
 
-max_candles_in_state = config.num_candles_in_state
+# enough candles for the warm-up of every indicator, unless NUM_CANDLES_IN_STATE
+# is set
+max_candles_in_state = config.num_candles_in_state or warm_up_candles(
+    build_indicators(config.indicators)
+)
+
+# last candles of every pair, written one slot at a time
+candle_ring = CandleRing(capacity=max_candles_in_state)
+
+# last closed candles of every pair from the snapshots of the candles service,
+# filled at startup and used by the first candle of every pair
+warm_start_candles: Dict[str, List[dict]] = {}
 
 
 def update_candles(candle: dict, state: State) -> dict:
     """
-    Updates the list of candles we have in the state using the new candle,
-    if the latest candle corresponds to a new window of candles, we append it to the list
-    if it corresponds to the last candle of the current window, we replace the last candle in the list with the new candle
+    Updates the candles we have in the state using the new candle,
+    if the latest candle corresponds to a new window of candles, we append it to the ring buffer
+    if it corresponds to the last candle of the current window, we replace the last candle in the ring buffer with the new candle
 
     Args:
         candle: The new candle
@@ -26,26 +42,29 @@ def update_candles(candle: dict, state: State) -> dict:
         )
         return candle
 
-    # Get the list of candles in the state
-    candles = state.get(key='candles', default=[])
-    # If the list of candles is empty, we append the new candle
-    if len(candles) == 0:
-        candles.append(candle)
-    # If the new candle is in the current window, we replace the last candle in the list with the new candle
-    elif same_window(candles[-1], candle):
-        candles[-1] = candle
-    # If the new candle is in a new window, we append it to the list
-    else:
-        candles.append(candle)
-    # If the number of candles in the state is greater than the maximum number of candles in the state, we remove the oldest candle
-    if len(candles) > max_candles_in_state:
-        candles.pop(0)
-
-    # TODO: Check the candles have no missing windows. this can happen if the stream has small trade rates
-    logger.debug(f'Number of candles in state for {candle["pair"]}: {len(candles)}')
-
-    # Update the state with the new list of candles
-    state.set('candles', candles)
+    # On the first candle of the pair since the startup, the snapshot replaces
+    # the state if it is more recent, e.g after the service was down
+    snapshot = warm_start_candles.pop(candle['pair'], None)
+    if snapshot:
+        last_window_start = candle_ring.last_window_start(state)
+        if (
+            last_window_start is None
+            or snapshot[-1]['window_start'] > last_window_start
+        ):
+            candle_ring.reset(snapshot, state)
+            # the incremental indicators replay the candles of the snapshot
+            state.delete(INDICATORS_HEADER_KEY)
+
+    # Replace the last candle of the window, or append the candle of a new window,
+    # the oldest candle is evicted once the ring buffer is full
+    if not candle_ring.update(candle, state):
+        logger.debug(
+            f'Late candle of {candle["pair"]} for window {candle["window_start"]}, '
+            'not kept in the state'
+        )
+
+    # The candles service fills the windows without trades with flat candles when
+    # FILL_EMPTY_CANDLES is set, otherwise quiet pairs can have missing windows
 
     # Return the latest candle
     return candle
@@ -68,15 +87,3 @@ def count_candles(value: dict, state: State) -> int:
     total += 1
     state.set('total', total)
     return {**value, 'total': total}
-
-
-def same_window(previous_candle: dict, candle: dict) -> bool:
-    """
-    Checks if two candles correspond to the same window
-    """
-
-    return (
-        candle['window_start'] == previous_candle['window_start']
-        and candle['window_end'] == previous_candle['window_end']
-        and candle['pair'] == previous_candle['pair']
-    )
@@ -1,5 +1,6 @@
-from typing import Literal
+from typing import List, Literal, Optional
 
+from indicator_registry import DEFAULT_INDICATORS
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -9,9 +10,38 @@ class Config(BaseSettings):
     kafka_input_topic: str
     kafka_output_topic: str
     kafka_consumer_group: str
-    num_candles_in_state: int
+    # candles kept per pair, by default the longest warm-up of the indicators
+    num_candles_in_state: Optional[int] = None
     candle_interval_seconds: int
     data_source: Literal['live', 'historical']
+    # wire format of the input and output topics, 'json' or 'msgpack'
+    kafka_input_serialization: Literal['json', 'msgpack'] = 'json'
+    kafka_output_serialization: Literal['json', 'msgpack'] = 'json'
+    # port of the Prometheus metrics endpoint (/metrics), 0 turns the metrics off
+    metrics_port: int = 0
+    # compacted topic of the candle snapshots of the candles service, read at
+    # startup so the indicators are valid right away. Empty starts from scratch
+    kafka_snapshot_topic: str = ''
+    # 'exactly-once' produces the outputs, the state changelogs and the consumer
+    # offsets in one kafka transaction per commit, so a crash or a rebalance does
+    # not duplicate messages downstream, at the cost of some throughput
+    processing_guarantee: Literal['at-least-once', 'exactly-once'] = 'at-least-once'
+    commit_interval_seconds: float = 5.0
+    # 'incremental' updates the running state of every indicator in O(1) per
+    # candle, 'talib' recomputes them over the candles in the state
+    indicators_engine: Literal['incremental', 'talib'] = 'incremental'
+    # the indicators to compute, as a JSON list of their name and parameters, e.g
+    # [{"name": "rsi", "period": 14}], see INDICATORS in indicator_registry.py
+    indicators: List[dict] = DEFAULT_INDICATORS
+    # rows of a pair before all its indicators are warm: 'suppress' emits none,
+    # 'nulls' emits them with None for the cold indicators and a `warm` flag
+    warm_up_policy: Literal['suppress', 'nulls'] = 'suppress'
+    # 'batch' reads a historical topic in chunks of batch_size candles until
+    # batch_idle_timeout_seconds without new candles, then backfills the
+    # indicators of every pair at once with the vectorized TA-Lib functions
+    processing_mode: Literal['stream', 'batch'] = 'stream'
+    batch_size: int = 100_000
+    batch_idle_timeout_seconds: float = 30.0
 
 
 config = Config()
@@ -0,0 +1,713 @@
+import math
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import talib
+from candle_ring import read_candles
+from loguru import logger
+from quixstreams import State
+
+# A candle as the indicators see it: high, low, close, volume
+Bar = Tuple[float, float, float, float]
+BAR_FIELDS = ('high', 'low', 'close', 'volume')
+
+
+def _is_zero(value: float) -> bool:
+    # TA_IS_ZERO of TA-Lib
+    return -1e-8 < value < 1e-8
+
+
+def _true_range(high: float, low: float, previous_close: float) -> float:
+    true_range = high - low
+    if abs(high - previous_close) > true_range:
+        true_range = abs(high - previous_close)
+    if abs(low - previous_close) > true_range:
+        true_range = abs(low - previous_close)
+    return true_range
+
+
+# Fixed-capacity ring buffer stored as a JSON list: [head, size, values]
+
+
+def _ring(capacity: int) -> list:
+    return [0, 0, [0.0] * capacity]
+
+
+def _ring_push(ring: list, value: float) -> Optional[float]:
+    """
+    Appends the value, and returns the oldest value if it was evicted
+    """
+    head, size, values = ring
+    capacity = len(values)
+    if size < capacity:
+        values[(head + size) % capacity] = value
+        ring[1] = size + 1
+        return None
+    evicted = values[head]
+    values[head] = value
+    ring[0] = (head + 1) % capacity
+    return evicted
+
+
+def _ring_full(ring: list) -> bool:
+    return ring[1] == len(ring[2])
+
+
+def _ring_oldest(ring: list) -> float:
+    return ring[2][ring[0]]
+
+
+class Indicator(ABC):
+    """
+    An indicator updated one candle at a time, with the same values as the
+    TA-Lib function over the whole history of the pair.
+
+    The state only holds the closed candles, and is a JSON list so it fits the
+    quixstreams state. `value` computes the indicator of the current candle
+    without changing the state, so the incomplete candles of a window cost one
+    O(1) call each, and `push` adds the candle to the state once its window is
+    closed. `compute_batch` computes the same values over the whole history at
+    once, for the backfills.
+    """
+
+    # fields of the candles it reads, among `BAR_FIELDS`
+    inputs: Tuple[str, ...]
+    # names of the outputs, in the order of `value`
+    names: Tuple[str, ...]
+    # number of candles before the first value, as `talib.<FUNC>_Lookback`
+    lookback: int
+
+    @abstractmethod
+    def init_state(self) -> list:
+        pass
+
+    @abstractmethod
+    def value(self, state: list, bar: Bar) -> Optional[Tuple[float, ...]]:
+        """
+        Returns:
+            Optional[Tuple[float, ...]]: The outputs for the candle after the
+                closed candles of the state, None during the warm-up
+        """
+
+    @abstractmethod
+    def push(self, state: list, bar: Bar) -> None:
+        """
+        Adds the closed candle to the state, in place
+        """
+
+    @abstractmethod
+    def compute_batch(self, columns: Dict[str, np.ndarray]) -> Tuple[np.ndarray, ...]:
+        """
+        The outputs for every candle of the history at once, with TA-Lib
+
+        Args:
+            columns: The float64 arrays of `BAR_FIELDS`, oldest candle first
+
+        Returns:
+            Tuple[np.ndarray, ...]: One array per output, NaN during the warm-up
+        """
+
+
+class RecursiveIndicator(Indicator):
+    """
+    Indicator with a state of a few scalars, so `value` and `push` share one
+    step on a copy of the state
+    """
+
+    @abstractmethod
+    def step(self, state: list, bar: Bar) -> Tuple[list, Optional[Tuple[float, ...]]]:
+        pass
+
+    def value(self, state: list, bar: Bar) -> Optional[Tuple[float, ...]]:
+        return self.step(state, bar)[1]
+
+    def push(self, state: list, bar: Bar) -> None:
+        state[:] = self.step(state, bar)[0]
+
+
+class SMA(Indicator):
+    inputs = ('close',)
+
+    def __init__(self, period: int):
+        self.period = period
+        self.names = (f'sma_{period}',)
+        self.lookback = period - 1
+
+    def init_state(self) -> list:
+        # running sum of the last period - 1 closes, and the closes
+        return [0.0, _ring(self.period - 1)]
+
+    def compute_batch(self, columns):
+        return (talib.SMA(columns['close'], timeperiod=self.period),)
+
+    def value(self, state, bar):
+        total, ring = state
+        if not _ring_full(ring):
+            return None
+        return ((total + bar[2]) / self.period,)
+
+    def push(self, state, bar):
+        state[0] += bar[2]
+        evicted = _ring_push(state[1], bar[2])
+        if evicted is not None:
+            state[0] -= evicted
+
+
+class EMA(RecursiveIndicator):
+    inputs = ('close',)
+
+    def __init__(self, period: int, skip: int = 0):
+        """
+        Args:
+            period: Number of candles, the first value is their SMA
+            skip: Number of candles ignored before the SMA, so the fast EMA of
+                the MACD starts with the slow one as in TA-Lib
+        """
+        self.period = period
+        self.skip = skip
+        self.k = 2.0 / (period + 1)
+        self.names = (f'ema_{period}',)
+        self.lookback = skip + period - 1
+
+    def init_state(self) -> list:
+        # candles seen, sum of the first period closes, last EMA
+        return [0, 0.0, 0.0]
+
+    def compute_batch(self, columns):
+        ema = talib.EMA(columns['close'][self.skip :], timeperiod=self.period)
+        return (np.concatenate([np.full(self.skip, np.nan), ema]),)
+
+    def step(self, state, bar):
+        count, total, ema = state
+        seen = count - self.skip
+        if seen < 0:
+            return [count + 1, total, ema], None
+        if seen < self.period - 1:
+            return [count + 1, total + bar[2], ema], None
+        if seen == self.period - 1:
+            ema = (total + bar[2]) / self.period
+        else:
+            ema = ((bar[2] - ema) * self.k) + ema
+        return [count + 1, total, ema], (ema,)
+
+
+class RSI(RecursiveIndicator):
+    inputs = ('close',)
+
+    def __init__(self, period: int):
+        self.period = period
+        self.names = (f'rsi_{period}',)
+        self.lookback = period
+
+    def init_state(self) -> list:
+        # candles seen, previous close, average gain and loss (sums first)
+        return [0, 0.0, 0.0, 0.0]
+
+    def compute_batch(self, columns):
+        return (talib.RSI(columns['close'], timeperiod=self.period),)
+
+    def step(self, state, bar):
+        count, previous_close, gain, loss = state
+        close = bar[2]
+        if count == 0:
+            return [1, close, 0.0, 0.0], None
+
+        change = close - previous_close
+        if count > self.period:
+            # Wilder smoothing
+            gain *= self.period - 1
+            loss *= self.period - 1
+        if change < 0:
+            loss -= change
+        else:
+            gain += change
+        if count < self.period:
+            return [count + 1, close, gain, loss], None
+
+        gain /= self.period
+        loss /= self.period
+        total = gain + loss
+        rsi = 100.0 * (gain / total) if not _is_zero(total) else 0.0
+        return [count + 1, close, gain, loss], (rsi,)
+
+
+class MACD(Indicator):
+    inputs = ('close',)
+
+    def __init__(self, fast_period: int, slow_period: int, signal_period: int):
+        self.fast = EMA(fast_period, skip=slow_period - fast_period)
+        self.slow = EMA(slow_period)
+        self.signal = EMA(signal_period)
+        self.names = (
+            f'macd_{fast_period}_line',
+            f'macd_{fast_period}_signal',
+            f'macd_{fast_period}_hist',
+        )
+        self.lookback = slow_period - 1 + signal_period - 1
+
+    def init_state(self) -> list:
+        return [
+            self.fast.init_state(),
+            self.slow.init_state(),
+            self.signal.init_state(),
+        ]
+
+    def compute_batch(self, columns):
+        return talib.MACD(
+            columns['close'],
+            fastperiod=self.fast.period,
+            slowperiod=self.slow.period,
+            signalperiod=self.signal.period,
+        )
+
+    def _step(self, state: list, bar: Bar):
+        fast_state, fast = self.fast.step(state[0], bar)
+        slow_state, slow = self.slow.step(state[1], bar)
+        if slow is None:
+            return [fast_state, slow_state, state[2]], None
+        line = fast[0] - slow[0]
+        # the signal is the EMA of the line, fed as the close of a bar
+        signal_state, signal = self.signal.step(state[2], (0.0, 0.0, line, 0.0))
+        if signal is None:
+            return [fast_state, slow_state, signal_state], None
+        return (
+            [fast_state, slow_state, signal_state],
+            (line, signal[0], line - signal[0]),
+        )
+
+    def value(self, state, bar):
+        return self._step(state, bar)[1]
+
+    def push(self, state, bar):
+        state[:] = self._step(state, bar)[0]
+
+
+class BBANDS(Indicator):
+    inputs = ('close',)
+
+    def __init__(self, period: int, num_std: float = 2.0):
+        self.period = period
+        self.num_std = num_std
+        self.names = (
+            f'upper_band_{period}',
+            f'middle_band_{period}',
+            f'lower_band_{period}',
+        )
+        self.lookback = period - 1
+
+    def init_state(self) -> list:
+        # running sums of the last period - 1 closes and squares, and the closes
+        return [0.0, 0.0, _ring(self.period - 1)]
+
+    def compute_batch(self, columns):
+        return talib.BBANDS(
+            columns['close'],
+            timeperiod=self.period,
+            nbdevup=self.num_std,
+            nbdevdn=self.num_std,
+        )
+
+    def value(self, state, bar):
+        total, total_squares, ring = state
+        if not _ring_full(ring):
+            return None
+        close = bar[2]
+        middle = (total + close) / self.period
+        # running variance, E[x^2] - E[x]^2
+        variance = (total_squares + close * close) / self.period - middle * middle
+        std = math.sqrt(variance) if variance >= 1e-8 else 0.0
+        width = std * self.num_std
+        return (middle + width, middle, middle - width)
+
+    def push(self, state, bar):
+        close = bar[2]
+        state[0] += close
+        state[1] += close * close
+        evicted = _ring_push(state[2], close)
+        if evicted is not None:
+            state[0] -= evicted
+            state[1] -= evicted * evicted
+
+
+class ATR(RecursiveIndicator):
+    inputs = ('high', 'low', 'close')
+
+    def __init__(self, period: int):
+        self.period = period
+        self.names = (f'atr_{period}',)
+        self.lookback = period
+
+    def init_state(self) -> list:
+        # candles seen, previous close, ATR (sum of the true ranges first)
+        return [0, 0.0, 0.0]
+
+    def compute_batch(self, columns):
+        return (
+            talib.ATR(
+                columns['high'],
+                columns['low'],
+                columns['close'],
+                timeperiod=self.period,
+            ),
+        )
+
+    def step(self, state, bar):
+        count, previous_close, atr = state
+        high, low, close, _ = bar
+        if count == 0:
+            return [1, close, 0.0], None
+
+        true_range = _true_range(high, low, previous_close)
+        if count < self.period:
+            return [count + 1, close, atr + true_range], None
+        if count == self.period:
+            atr = (atr + true_range) / self.period
+        else:
+            atr = (atr * (self.period - 1) + true_range) / self.period
+        return [count + 1, close, atr], (atr,)
+
+
+class ADX(RecursiveIndicator):
+    inputs = ('high', 'low', 'close')
+
+    def __init__(self, period: int):
+        self.period = period
+        self.names = (f'adx_{period}',)
+        self.lookback = 2 * period - 1
+
+    def init_state(self) -> list:
+        # candles seen, previous high, low and close, smoothed +DM, -DM and true
+        # range, sum of the first DX, ADX
+        return [0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
+
+    def compute_batch(self, columns):
+        return (
+            talib.ADX(
+                columns['high'],
+                columns['low'],
+                columns['close'],
+                timeperiod=self.period,
+            ),
+        )
+
+    def step(self, state, bar):
+        count, prev_high, prev_low, prev_close, plus_dm, minus_dm, tr, sum_dx, adx = (
+            state
+        )
+        high, low, close, _ = bar
+        period = self.period
+        if count == 0:
+            return [1, high, low, close, 0.0, 0.0, 0.0, 0.0, 0.0], None
+
+        diff_plus = high - prev_high
+        diff_minus = prev_low - low
+        true_range = _true_range(high, low, prev_close)
+        if count >= period:
+            # Wilder smoothing, after the sums of the first period - 1 candles
+            plus_dm -= plus_dm / period
+            minus_dm -= minus_dm / period
+            tr = tr - (tr / period) + true_range
+        else:
+            tr += true_range
+        if diff_minus > 0 and diff_plus < diff_minus:
+            minus_dm += diff_minus
+        elif diff_plus > 0 and diff_plus > diff_minus:
+            plus_dm += diff_plus
+
+        output = None
+        if count >= period:
+            dx = None
+            if not _is_zero(tr):
+                minus_di = 100.0 * (minus_dm / tr)
+                plus_di = 100.0 * (plus_dm / tr)
+                total = minus_di + plus_di
+                if not _is_zero(total):
+                    dx = 100.0 * (abs(minus_di - plus_di) / total)
+            if count < 2 * period - 1:
+                sum_dx += dx if dx is not None else 0.0
+            elif count == 2 * period - 1:
+                sum_dx += dx if dx is not None else 0.0
+                adx = sum_dx / period
+                output = (adx,)
+            else:
+                if dx is not None:
+                    adx = ((adx * (period - 1)) + dx) / period
+                output = (adx,)
+
+        new_state = [count + 1, high, low, close, plus_dm, minus_dm, tr, sum_dx, adx]
+        return new_state, output
+
+
+class ROC(Indicator):
+    inputs = ('close',)
+
+    def __init__(self, period: int):
+        self.period = period
+        self.names = (f'price_roc_{period}',)
+        self.lookback = period
+
+    def init_state(self) -> list:
+        return [_ring(self.period)]
+
+    def compute_batch(self, columns):
+        return (talib.ROC(columns['close'], timeperiod=self.period),)
+
+    def value(self, state, bar):
+        ring = state[0]
+        if not _ring_full(ring):
+            return None
+        previous = _ring_oldest(ring)
+        if previous == 0.0:
+            return (0.0,)
+        return (((bar[2] / previous) - 1.0) * 100.0,)
+
+    def push(self, state, bar):
+        _ring_push(state[0], bar[2])
+
+
+class MFI(Indicator):
+    inputs = ('high', 'low', 'close', 'volume')
+
+    def __init__(self, period: int):
+        self.period = period
+        self.names = (f'mfi_{period}',)
+        self.lookback = period
+
+    def init_state(self) -> list:
+        # candles seen, previous typical price, sums of the last period - 1
+        # positive and negative money flows, and the flows
+        return [0, 0.0, 0.0, 0.0, _ring(self.period - 1), _ring(self.period - 1)]
+
+    def compute_batch(self, columns):
+        return (
+            talib.MFI(
+                columns['high'],
+                columns['low'],
+                columns['close'],
+                columns['volume'],
+                timeperiod=self.period,
+            ),
+        )
+
+    def _money_flow(self, state: list, bar: Bar) -> Tuple[float, float, float]:
+        high, low, close, volume = bar
+        typical_price = (high + low + close) / 3.0
+        money_flow = typical_price * volume
+        if typical_price < state[1]:
+            return typical_price, 0.0, money_flow
+        if typical_price > state[1]:
+            return typical_price, money_flow, 0.0
+        return typical_price, 0.0, 0.0
+
+    def value(self, state, bar):
+        if state[0] == 0 or not _ring_full(state[4]):
+            return None
+        _, positive, negative = self._money_flow(state, bar)
+        positive += state[2]
+        negative += state[3]
+        total = positive + negative
+        if total < 1.0:
+            return (0.0,)
+        return (100.0 * (positive / total),)
+
+    def push(self, state, bar):
+        typical_price, positive, negative = self._money_flow(state, bar)
+        if state[0] > 0:
+            state[2] += positive
+            state[3] += negative
+            evicted = _ring_push(state[4], positive)
+            if evicted is not None:
+                state[2] -= evicted
+            evicted = _ring_push(state[5], negative)
+            if evicted is not None:
+                state[3] -= evicted
+        state[0] += 1
+        state[1] = typical_price
+
+
+class WILLR(Indicator):
+    inputs = ('high', 'low', 'close')
+
+    def __init__(self, period: int):
+        self.period = period
+        self.names = (f'willr_{period}',)
+        self.lookback = period - 1
+
+    def init_state(self) -> list:
+        # candles seen, monotonic deques of [index, value] of the last period - 1
+        # candles: decreasing highs and increasing lows, so the highest high and
+        # the lowest low are the first items
+        return [0, [], []]
+
+    def compute_batch(self, columns):
+        return (
+            talib.WILLR(
+                columns['high'],
+                columns['low'],
+                columns['close'],
+                timeperiod=self.period,
+            ),
+        )
+
+    def value(self, state, bar):
+        count, highs, lows = state
+        if count < self.period - 1:
+            return None
+        high, low, close, _ = bar
+        highest = max(highs[0][1], high) if highs else high
+        lowest = min(lows[0][1], low) if lows else low
+        diff = (highest - lowest) / (-100.0)
+        if diff == 0.0:
+            return (0.0,)
+        return ((highest - close) / diff,)
+
+    def push(self, state, bar):
+        count, highs, lows = state
+        high, low, _, _ = bar
+        while highs and highs[-1][1] <= high:
+            highs.pop()
+        highs.append([count, high])
+        while lows and lows[-1][1] >= low:
+            lows.pop()
+        lows.append([count, low])
+        # keep the window of the next candle
+        oldest = count - self.period + 2
+        while highs[0][0] < oldest:
+            highs.pop(0)
+        while lows[0][0] < oldest:
+            lows.pop(0)
+        state[0] = count + 1
+
+
+# state of the pair: window and bar of the latest candle, not closed yet
+INDICATORS_HEADER_KEY = 'indicators_latest'
+
+
+def _state_key(indicator: Indicator) -> str:
+    return f'indicator_{indicator.names[0]}'
+
+
+class IncrementalIndicators:
+    """
+    Computes the technical indicators of every candle in O(1), with the
+    running state of every indicator, instead of recomputing them with TA-Lib
+    over the candles in the state.
+
+    The values are those of the TA-Lib functions over the whole history of the
+    pair. The TA-Lib stream functions only use the last `lookback + 1` candles,
+    so the recursive indicators (EMA, RSI, MACD, ATR, ADX) differ from them.
+
+    The state of a pair has one key per indicator, so a message only writes
+    what it changed:
+
+    - `indicators_latest`: the window and the bar of the latest candle, not
+      closed yet. An incomplete candle of the same window only rewrites it
+    - `indicator_<name of its first output>`: the state of the indicator with
+      the closed candles, written when a candle of a new window closes the
+      previous one
+    """
+
+    def __init__(self, indicators: List[Indicator]):
+        """
+        Args:
+            indicators: The indicators to compute, see `build_indicators`
+        """
+        self.indicators = indicators
+
+    def init_state(self, bars: Iterable[Bar]) -> List[list]:
+        """
+        States of the indicators after the closed candles, oldest first
+        """
+        states = [indicator.init_state() for indicator in self.indicators]
+        for bar in bars:
+            self.push(states, bar)
+        return states
+
+    def push(self, states: List[list], bar: Bar) -> None:
+        """
+        Adds the closed candle to the states of the indicators, in place
+        """
+        for indicator, indicator_state in zip(self.indicators, states):
+            indicator.push(indicator_state, bar)
+
+    def values(self, states: List[list], bar: Bar) -> Dict[str, float]:
+        """
+        The indicators of the candle after the closed candles of the states,
+        without the ones still in their warm-up
+        """
+        indicators = {}
+        for indicator, indicator_state in zip(self.indicators, states):
+            values = indicator.value(indicator_state, bar)
+            if values is not None:
+                indicators.update(zip(indicator.names, values))
+        return indicators
+
+    def compute(self, candle: dict, state: State) -> Optional[dict]:
+        """
+        Adds the technical indicators to the candle
+
+        Args:
+            candle: The new candle, closed or not
+            state: The state of the pair, with the candles of `update_candles`
+
+        Returns:
+            Optional[dict]: The candle with the indicators out of their warm-up,
+                None for a late candle of a closed window
+        """
+        header = state.get(INDICATORS_HEADER_KEY, default=None)
+        if header is None:
+            # first candle of the pair, replay the candles already in the state,
+            # e.g from the snapshots of the candles service
+            states = self._replay(state, self.indicators, candle['window_start'])
+            window_start, pending_bar = None, None
+        else:
+            window_start, pending_bar = header
+            states = [
+                state.get(_state_key(indicator), default=None)
+                for indicator in self.indicators
+            ]
+            missing = [
+                indicator
+                for indicator, indicator_state in zip(self.indicators, states)
+                if indicator_state is None
+            ]
+            if missing:
+                # indicators added to the feature set since the last run
+                replayed = iter(self._replay(state, missing, window_start))
+                states = [
+                    next(replayed) if indicator_state is None else indicator_state
+                    for indicator_state in states
+                ]
+
+        if window_start is not None and candle['window_start'] < window_start:
+            logger.debug(
+                f'Late candle of {candle["pair"]} for a closed window, ' 'no indicators'
+            )
+            return None
+        if window_start is not None and candle['window_start'] > window_start:
+            for indicator, indicator_state in zip(self.indicators, states):
+                indicator.push(indicator_state, pending_bar)
+                state.set(_state_key(indicator), indicator_state)
+        bar = to_bar(candle)
+        state.set(INDICATORS_HEADER_KEY, [candle['window_start'], bar])
+        return {**candle, **self.values(states, bar)}
+
+    def _replay(
+        self, state: State, indicators: List[Indicator], window_start: int
+    ) -> List[list]:
+        """
+        Initializes the states of `indicators` with the candles of the state
+        before `window_start`, and writes them
+        """
+        candles = read_candles(state)
+        closed = candles['window_start'] < window_start
+        bars = zip(*(candles[field][closed].tolist() for field in BAR_FIELDS))
+        states = IncrementalIndicators(indicators).init_state(bars)
+        for indicator, indicator_state in zip(indicators, states):
+            state.set(_state_key(indicator), indicator_state)
+        return states
+
+
+def to_bar(candle: dict) -> Bar:
+    return (candle['high'], candle['low'], candle['close'], candle['volume'])
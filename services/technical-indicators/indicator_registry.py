@@ -0,0 +1,98 @@
+from typing import Dict, List, Type
+
+from incremental_indicators import (
+    ADX,
+    ATR,
+    BBANDS,
+    EMA,
+    MACD,
+    MFI,
+    ROC,
+    RSI,
+    SMA,
+    WILLR,
+    Indicator,
+)
+
+# The indicators the feature sets are made of. An indicator of a feature set is
+# a dict with its name here and the parameters of its class, e.g
+# {"name": "rsi", "period": 14}. Every class declares the fields of the candles
+# it reads (`inputs`), its outputs (`names`) and its warm-up (`lookback`)
+INDICATORS: Dict[str, Type[Indicator]] = {
+    'sma': SMA,
+    'ema': EMA,
+    'rsi': RSI,
+    'macd': MACD,
+    'bbands': BBANDS,
+    'atr': ATR,
+    'adx': ADX,
+    'roc': ROC,
+    'mfi': MFI,
+    'willr': WILLR,
+}
+
+# the feature set of the feature group so far
+DEFAULT_INDICATORS: List[dict] = [
+    {'name': 'sma', 'period': 14},
+    {'name': 'rsi', 'period': 9},
+    {'name': 'rsi', 'period': 14},
+    {'name': 'rsi', 'period': 21},
+    {'name': 'macd', 'fast_period': 10, 'slow_period': 24, 'signal_period': 9},
+    {'name': 'bbands', 'period': 10, 'num_std': 2.0},
+    {'name': 'bbands', 'period': 15, 'num_std': 2.0},
+    {'name': 'bbands', 'period': 20, 'num_std': 2.0},
+    {'name': 'adx', 'period': 14},
+    {'name': 'ema', 'period': 10},
+    {'name': 'atr', 'period': 14},
+    {'name': 'roc', 'period': 10},
+    {'name': 'mfi', 'period': 14},
+    {'name': 'willr', 'period': 14},
+]
+
+
+def build_indicators(specs: List[dict]) -> List[Indicator]:
+    """
+    Builds the indicators of a feature set
+
+    Args:
+        specs: The indicators, as dicts of their name in `INDICATORS` and
+            their parameters
+
+    Returns:
+        List[Indicator]: The indicators, in the order of the specs
+    """
+    indicators: List[Indicator] = []
+    names = set()
+    for spec in specs:
+        params = dict(spec)
+        name = params.pop('name', None)
+        if name not in INDICATORS:
+            raise ValueError(
+                f'Unknown indicator {name!r} in {spec}, expected one of '
+                f'{sorted(INDICATORS)}'
+            )
+        for param, value in params.items():
+            if param.endswith('period') and (not isinstance(value, int) or value < 2):
+                raise ValueError(f'{param} of {spec} must be an integer >= 2')
+        try:
+            indicator = INDICATORS[name](**params)
+        except TypeError as e:
+            raise ValueError(f'Invalid parameters for the indicator {spec}') from e
+
+        duplicates = names.intersection(indicator.names)
+        if duplicates:
+            raise ValueError(f'The outputs {sorted(duplicates)} are computed twice')
+        names.update(indicator.names)
+        indicators.append(indicator)
+    return indicators
+
+
+def default_indicators() -> List[Indicator]:
+    return build_indicators(DEFAULT_INDICATORS)
+
+
+def warm_up_candles(indicators: List[Indicator]) -> int:
+    """
+    Number of candles for all the indicators to have a value
+    """
+    return max((indicator.lookback + 1 for indicator in indicators), default=1)
@@ -1,9 +1,17 @@
-from typing import Literal
-
-from candles import update_candles
+from functools import partial
+from typing import List, Literal
+
+from batch_indicators import backfill_indicators
+from candle_snapshot import load_candle_snapshots
+from candles import max_candles_in_state, update_candles, warm_start_candles
+from incremental_indicators import IncrementalIndicators
+from indicator_registry import DEFAULT_INDICATORS, build_indicators, warm_up_candles
 from loguru import logger
+from pipeline_shared.instrumentation import Metrics
+from pipeline_shared.serializers import get_deserializer, get_serializer
 from quixstreams import Application
 from technical_indicators import compute_technical_indicators
+from warm_up import WarmUp
 
 
 def main(
@@ -14,6 +22,18 @@ def main(
     candle_interval_seconds: int,
     num_candles_in_state: int,
     data_source: Literal['live', 'historical'],
+    kafka_input_serialization: Literal['json', 'msgpack'] = 'json',
+    kafka_output_serialization: Literal['json', 'msgpack'] = 'json',
+    metrics_port: int = 0,
+    kafka_snapshot_topic: str = '',
+    processing_guarantee: Literal['at-least-once', 'exactly-once'] = 'at-least-once',
+    commit_interval_seconds: float = 5.0,
+    indicators_engine: Literal['incremental', 'talib'] = 'incremental',
+    indicators: List[dict] = DEFAULT_INDICATORS,
+    warm_up_policy: Literal['suppress', 'nulls'] = 'suppress',
+    processing_mode: Literal['stream', 'batch'] = 'stream',
+    batch_size: int = 100_000,
+    batch_idle_timeout_seconds: float = 30.0,
 ):
     """
     Main function to start the technical-indicators service. 3 steps:
@@ -29,38 +49,132 @@ def main(
         max_candles_in_state: The number of candles to keep in the state
         candle_interval_secconds
         data_source: The data source to use for the technical indicators service
+        kafka_input_serialization: Wire format of the candles topic
+        kafka_output_serialization: Wire format of the technical indicators topic
+        metrics_port: Port of the Prometheus metrics endpoint, 0 turns the
+            metrics off
+        kafka_snapshot_topic: Compacted topic of the candle snapshots of the
+            candles service, to fill the state of the pairs at startup. Empty
+            to start from an empty state
+        processing_guarantee: 'at-least-once', or 'exactly-once' to produce the
+            outputs and commit the offsets in Kafka transactions
+        commit_interval_seconds: Time between two commits, or transactions
+        indicators_engine: 'incremental' to update the indicators in O(1) per
+            candle, or 'talib' to recompute them over the candles in the state
+        indicators: The indicators to compute, as dicts of their name and
+            parameters, see `INDICATORS` in indicator_registry.py
+        warm_up_policy: 'suppress' to emit no row of a pair until all its
+            indicators are warm, 'nulls' to emit them with None for the cold
+            indicators and a `warm` flag
+        processing_mode: 'stream' computes the indicators candle by candle,
+            'batch' backfills them over whole arrays of candles per pair
+        batch_size: Max number of candles per chunk read, in batch mode
+        batch_idle_timeout_seconds: Time without new candles before the batch
+            mode stops
 
     Returns:
         None
     """
     logger.info('Starting technical-indicators service...')
 
+    feature_set = build_indicators(indicators)
+    warm_up = WarmUp(feature_set, warm_up_policy)
+    logger.info(
+        f'Computing {sum(len(indicator.names) for indicator in feature_set)} '
+        f'indicators, with a warm-up of {warm_up_candles(feature_set)} candles'
+    )
+    # the readiness of the indicators comes from the candles in the state
+    if num_candles_in_state < warm_up_candles(feature_set):
+        raise ValueError(
+            f'NUM_CANDLES_IN_STATE={num_candles_in_state} is shorter than the '
+            f'warm-up of the indicators, {warm_up_candles(feature_set)} candles'
+        )
+
+    if processing_mode == 'batch':
+        if data_source != 'historical':
+            raise ValueError('The batch processing mode only backfills historical data')
+        if indicators_engine != 'incremental':
+            raise ValueError(
+                'The batch processing mode computes the values of the incremental '
+                'indicators engine'
+            )
+        backfill_indicators(
+            kafka_broker_address=kafka_broker_address,
+            kafka_input_topic=kafka_input_topic,
+            kafka_output_topic=kafka_output_topic,
+            kafka_consumer_group=kafka_consumer_group,
+            candle_interval_seconds=candle_interval_seconds,
+            indicators=feature_set,
+            warm_up=warm_up,
+            kafka_input_serialization=kafka_input_serialization,
+            kafka_output_serialization=kafka_output_serialization,
+            batch_size=batch_size,
+            idle_timeout_seconds=batch_idle_timeout_seconds,
+        )
+        return
+
+    metrics = Metrics('technical-indicators', port=metrics_port)
+
     app = Application(
         broker_address=kafka_broker_address,
         consumer_group=kafka_consumer_group,
         auto_offset_reset='earliest' if data_source == 'historical' else 'latest',
+        consumer_extra_config=metrics.consumer_config(),
+        processing_guarantee=processing_guarantee,
+        commit_interval=commit_interval_seconds,
     )
+    metrics.watch_state_dir(app.config.state_dir)
 
     # Create a dataframe from the input topic
-    input_topic = app.topic(name=kafka_input_topic, value_deserializer='json')
-    output_topic = app.topic(name=kafka_output_topic, value_serializer='json')
+    input_topic = app.topic(
+        name=kafka_input_topic,
+        value_deserializer=get_deserializer(kafka_input_serialization, 'candle'),
+    )
+    output_topic = app.topic(
+        name=kafka_output_topic,
+        value_serializer=get_serializer(kafka_output_serialization),
+    )
     sdf = app.dataframe(topic=input_topic)
+    sdf = metrics.track_input(sdf)
 
     # we only want to keep the candles with the same window size as the candle_interval_seconds
     sdf = sdf[sdf['candle_interval_seconds'] == candle_interval_seconds]
 
     # Update the state with the new candle
-    sdf = sdf.apply(update_candles, stateful=True)
+    sdf = sdf.apply(metrics.timed('update_candles', update_candles), stateful=True)
 
     # compute the technical indicators
-    sdf = sdf.apply(compute_technical_indicators, stateful=True)
+    if indicators_engine == 'incremental':
+        compute = IncrementalIndicators(feature_set).compute
+    else:
+        compute = partial(compute_technical_indicators, indicators=feature_set)
+    sdf = sdf.apply(
+        metrics.timed('compute_technical_indicators', compute), stateful=True
+    )
+
+    # emit the rows of the pairs still warming up as the warm-up policy says,
+    # and drop the late candles, without indicators
+    sdf = sdf.apply(metrics.timed('warm_up', warm_up.apply_stream), stateful=True)
+    sdf = sdf.filter(lambda value: value is not None)
 
     # Log the latest candle in the state
     sdf = sdf.update(lambda value: logger.debug(f'final message: {value}'))
 
     # Output the technical indicators to a Kafka topic
+    sdf = metrics.track_output(sdf)
     sdf = sdf.to_topic(topic=output_topic)
 
+    if kafka_snapshot_topic:
+        warm_start_candles.update(
+            load_candle_snapshots(
+                kafka_broker_address=kafka_broker_address,
+                kafka_snapshot_topic=kafka_snapshot_topic,
+                candle_interval_seconds=candle_interval_seconds,
+                kafka_input_serialization=kafka_input_serialization,
+            )
+        )
+
+    metrics.start()
     app.run()
 
 
@@ -73,6 +187,18 @@ if __name__ == '__main__':
         kafka_output_topic=config.kafka_output_topic,
         kafka_consumer_group=config.kafka_consumer_group,
         candle_interval_seconds=config.candle_interval_seconds,
-        num_candles_in_state=config.num_candles_in_state,
+        num_candles_in_state=max_candles_in_state,
         data_source=config.data_source,
+        kafka_input_serialization=config.kafka_input_serialization,
+        kafka_output_serialization=config.kafka_output_serialization,
+        metrics_port=config.metrics_port,
+        kafka_snapshot_topic=config.kafka_snapshot_topic,
+        processing_guarantee=config.processing_guarantee,
+        commit_interval_seconds=config.commit_interval_seconds,
+        indicators_engine=config.indicators_engine,
+        indicators=config.indicators,
+        warm_up_policy=config.warm_up_policy,
+        processing_mode=config.processing_mode,
+        batch_size=config.batch_size,
+        batch_idle_timeout_seconds=config.batch_idle_timeout_seconds,
     )
@@ -0,0 +1,64 @@
+from typing import List
+
+import numpy as np
+import pytest
+
+
+class DictState:
+    """
+    In-memory stand-in for the quixstreams `State` of one pair, recording the
+    keys written
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.writes: List[str] = []
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def set(self, key, value):
+        self.writes.append(key)
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def exists(self, key) -> bool:
+        return key in self.data
+
+
+def make_candles(num_candles: int, seed: int = 0, pair: str = 'BTC/USD') -> List[dict]:
+    """
+    Random walk 1 minute candles, with flat candles without volume, as the
+    windows without trades, where the indicators divide by zero
+    """
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.standard_normal(num_candles) * 1e-3))
+    flat = rng.random(num_candles) < 0.05
+    for i in np.flatnonzero(flat)[1:]:
+        close[i] = close[i - 1]
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    spread = np.abs(rng.standard_normal(num_candles)) * 0.05 * ~flat
+    high = np.maximum(open_, close) + spread
+    low = np.minimum(open_, close) - spread
+    volume = rng.random(num_candles) * 10 * ~flat
+    return [
+        {
+            'pair': pair,
+            'window_start': 60_000 * i,
+            'window_end': 60_000 * (i + 1),
+            'open': float(open_[i]),
+            'high': float(high[i]),
+            'low': float(low[i]),
+            'close': float(close[i]),
+            'volume': float(volume[i]),
+            'candle_interval_seconds': 60,
+        }
+        for i in range(num_candles)
+    ]
+
+
+@pytest.fixture
+def state() -> DictState:
+    return DictState()
@@ -0,0 +1,104 @@
+from typing import List
+
+import pytest
+from batch_indicators import BatchIndicators
+from candle_ring import CandleRing
+from conftest import DictState, make_candles
+from incremental_indicators import IncrementalIndicators
+from indicator_registry import default_indicators
+from warm_up import WarmUp
+
+
+def make_topic(num_candles: int) -> List[dict]:
+    """
+    The candles of two pairs interleaved, each window first as an incomplete
+    candle, and a late candle of a closed window now and then
+    """
+    pairs = [
+        make_candles(num_candles, seed=0, pair='BTC/USD'),
+        make_candles(num_candles, seed=1, pair='ETH/USD'),
+    ]
+    topic = []
+    for i, candles in enumerate(zip(*pairs)):
+        for candle in candles:
+            topic.append({**candle, 'close': candle['open'], 'volume': 0.0})
+            topic.append(candle)
+        if i % 50 == 49:
+            topic.append(pairs[0][i - 3])
+    return topic
+
+
+def stream(candles: List[dict], policy: str) -> dict:
+    """
+    The last row of every pair and window emitted by the streaming mode
+    """
+    ring = CandleRing(capacity=100)
+    engine = IncrementalIndicators(default_indicators())
+    warm_up = WarmUp(default_indicators(), policy)
+    states = {}
+    rows = {}
+    for candle in candles:
+        state = states.setdefault(candle['pair'], DictState())
+        ring.update(candle, state)
+        row = warm_up.apply_stream(engine.compute(candle, state), state)
+        if row is not None:
+            rows[candle['pair'], candle['window_start']] = row
+    return rows
+
+
+@pytest.mark.parametrize('batch_size', [7, 100, 10_000])
+@pytest.mark.parametrize('policy', ['suppress', 'nulls'])
+def test_batch_emits_the_rows_of_the_streaming_mode(batch_size, policy):
+    candles = make_topic(150)
+    batch_indicators = BatchIndicators(
+        default_indicators(), WarmUp(default_indicators(), policy)
+    )
+
+    for start in range(0, len(candles), batch_size):
+        batch_indicators.add_candles(candles[start : start + batch_size])
+    rows = {}
+    for position, row in batch_indicators.rows():
+        assert row['window_start'] == candles[position]['window_start']
+        key = row['pair'], row['window_start']
+        assert key not in rows, 'one row per window'
+        rows[key] = row
+
+    expected = stream(candles, policy)
+    assert rows.keys() == expected.keys()
+    # up to the rounding of the running sums of the bands in the streaming mode
+    for key, row in rows.items():
+        assert row == pytest.approx(expected[key], rel=1e-9, abs=1e-9), key
+    assert batch_indicators.num_late_candles == 3
+
+
+def test_rows_are_in_the_order_of_the_candles_with_one_row_per_window():
+    candles = make_topic(30)
+    batch_indicators = BatchIndicators(default_indicators())
+
+    batch_indicators.add_candles(candles)
+    rows = batch_indicators.rows()
+
+    positions = [position for position, _ in rows]
+    assert positions == sorted(positions)
+    assert len(rows) == 2 * 30
+    # the final candle of every window, not the incomplete one before it
+    for position, row in rows:
+        incomplete = candles[position - 1]
+        assert (incomplete['pair'], incomplete['window_start']) == (
+            row['pair'],
+            row['window_start'],
+        )
+
+
+def test_a_window_split_over_two_chunks_keeps_its_latest_candle():
+    candles = make_topic(30)
+    batch_indicators = BatchIndicators(default_indicators())
+
+    # the incomplete candle of the first window in one chunk, its final one in
+    # the next
+    batch_indicators.add_candles(candles[:1])
+    batch_indicators.add_candles(candles[1:])
+
+    (position, row), *_ = batch_indicators.rows()
+    assert position == 1
+    assert row == candles[1]
@@ -0,0 +1,76 @@
+from candle_ring import HEADER_KEY, CandleRing, read_candles, read_num_candles
+from conftest import make_candles
+
+
+def test_candles_are_read_back_oldest_first_once_the_ring_wraps(state):
+    ring = CandleRing(capacity=5)
+    candles = make_candles(12)
+    for candle in candles:
+        assert ring.update(candle, state)
+
+    columns = read_candles(state)
+
+    assert read_num_candles(state) == 5
+    assert columns['window_start'].tolist() == [c['window_start'] for c in candles[-5:]]
+    assert columns['close'].tolist() == [c['close'] for c in candles[-5:]]
+    assert ring.last_window_start(state) == candles[-1]['window_start']
+
+
+def test_a_candle_of_the_same_window_only_writes_its_slot(state):
+    ring = CandleRing(capacity=5)
+    candles = make_candles(7)
+    for candle in candles:
+        ring.update(candle, state)
+
+    state.writes.clear()
+    ring.update({**candles[-1], 'close': 1.0}, state)
+    assert state.writes == ['candles_slot_1']
+    assert read_candles(state)['close'][-1] == 1.0
+
+    # a new window writes its slot and the header
+    state.writes.clear()
+    ring.update({**candles[-1], 'window_start': candles[-1]['window_end']}, state)
+    assert state.writes == ['candles_slot_2', HEADER_KEY]
+
+
+def test_late_candles_are_not_kept(state):
+    ring = CandleRing(capacity=5)
+    candles = make_candles(3)
+    for candle in candles:
+        ring.update(candle, state)
+
+    state.writes.clear()
+    assert not ring.update(candles[0], state)
+    assert state.writes == []
+    assert read_num_candles(state) == 3
+
+
+def test_a_new_capacity_keeps_the_last_candles(state):
+    candles = make_candles(8)
+    for candle in candles[:-1]:
+        CandleRing(capacity=6).update(candle, state)
+
+    CandleRing(capacity=3).update(candles[-1], state)
+
+    assert read_candles(state)['window_start'].tolist() == [
+        c['window_start'] for c in candles[-3:]
+    ]
+    assert not state.exists('candles_slot_5')
+
+
+def test_the_list_of_candles_of_the_previous_state_is_moved_to_the_ring(state):
+    candles = make_candles(4)
+    state.set('candles', candles[:-1])
+
+    CandleRing(capacity=10).update(candles[-1], state)
+
+    assert read_candles(state)['window_start'].tolist() == [
+        c['window_start'] for c in candles
+    ]
+    assert not state.exists('candles')
+
+
+def test_an_empty_state_has_no_candles(state):
+    assert read_num_candles(state) == 0
+    assert len(read_candles(state)['close']) == 0
+    assert CandleRing(capacity=3).last_window_start(state) is None
@@ -0,0 +1,184 @@
+from typing import Dict, List
+
+import numpy as np
+import pytest
+import talib
+from candle_ring import CandleRing
+from conftest import DictState, make_candles
+from incremental_indicators import (
+    INDICATORS_HEADER_KEY,
+    IncrementalIndicators,
+    RecursiveIndicator,
+)
+from indicator_registry import build_indicators, default_indicators
+
+
+def talib_indicators(candles: List[dict]) -> Dict[str, np.ndarray]:
+    """
+    TA-Lib over the whole history, one array per output of the default
+    indicators
+    """
+    high = np.array([c['high'] for c in candles])
+    low = np.array([c['low'] for c in candles])
+    close = np.array([c['close'] for c in candles])
+    volume = np.array([c['volume'] for c in candles])
+
+    outputs = {'sma_14': talib.SMA(close, timeperiod=14)}
+    for period in [9, 14, 21]:
+        outputs[f'rsi_{period}'] = talib.RSI(close, timeperiod=period)
+    line, signal, hist = talib.MACD(close, fastperiod=10, slowperiod=24, signalperiod=9)
+    outputs.update(macd_10_line=line, macd_10_signal=signal, macd_10_hist=hist)
+    for period in [10, 15, 20]:
+        upper, middle, lower = talib.BBANDS(
+            close, timeperiod=period, nbdevup=2, nbdevdn=2
+        )
+        outputs[f'upper_band_{period}'] = upper
+        outputs[f'middle_band_{period}'] = middle
+        outputs[f'lower_band_{period}'] = lower
+    outputs['adx_14'] = talib.ADX(high, low, close, timeperiod=14)
+    outputs['ema_10'] = talib.EMA(close, timeperiod=10)
+    outputs['atr_14'] = talib.ATR(high, low, close, timeperiod=14)
+    outputs['price_roc_10'] = talib.ROC(close, timeperiod=10)
+    outputs['mfi_14'] = talib.MFI(high, low, close, volume, timeperiod=14)
+    outputs['willr_14'] = talib.WILLR(high, low, close, timeperiod=14)
+    return outputs
+
+
+def incomplete_versions(candle: dict, num_updates: int) -> List[dict]:
+    """
+    Incomplete candles of the window before the final one, with the close
+    moving towards the final close
+    """
+    versions = []
+    for step in range(1, num_updates + 1):
+        close = candle['open'] + (candle['close'] - candle['open']) * step / (
+            num_updates + 1
+        )
+        versions.append(
+            {
+                **candle,
+                'high': max(candle['open'], close),
+                'low': min(candle['open'], close),
+                'close': close,
+                'volume': candle['volume'] * step / (num_updates + 1),
+            }
+        )
+    return versions
+
+
+def assert_same_indicators(output: dict, reference: Dict[str, float]) -> None:
+    for name, value in reference.items():
+        if np.isnan(value):
+            assert name not in output, f'{name} during the warm-up'
+        else:
+            assert output[name] == pytest.approx(value, rel=1e-9, abs=1e-9), name
+
+
+def compute_all(engine: IncrementalIndicators, candles: List[dict], state) -> dict:
+    ring = CandleRing(capacity=1000)
+    output = None
+    for candle in candles:
+        ring.update(candle, state)
+        output = engine.compute(candle, state)
+    return output
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_indicators_match_talib_over_the_whole_history(seed):
+    """
+    The incremental indicators of every candle, final or after a few
+    incomplete versions of it as with EMIT_INCOMPLETE_CANDLES, have the values
+    of TA-Lib over the candles up to it
+    """
+    candles = make_candles(300, seed=seed)
+    expected = talib_indicators(candles)
+    engine = IncrementalIndicators(default_indicators())
+    state = DictState()
+
+    for i, candle in enumerate(candles):
+        for version in incomplete_versions(candle, num_updates=2):
+            reference = talib_indicators(candles[:i] + [version])
+            assert_same_indicators(
+                engine.compute(version, state),
+                {name: values[-1] for name, values in reference.items()},
+            )
+        assert_same_indicators(
+            engine.compute(candle, state),
+            {name: values[i] for name, values in expected.items()},
+        )
+
+
+def test_incomplete_candles_only_write_the_latest_candle(state):
+    indicators = default_indicators()
+    engine = IncrementalIndicators(indicators)
+    candles = make_candles(40)
+    compute_all(engine, candles[:-1], state)
+
+    # the first version of the window closes the previous one
+    first, *versions = incomplete_versions(candles[-1], num_updates=4)
+    engine.compute(first, state)
+    state.writes.clear()
+    for version in versions:
+        engine.compute(version, state)
+    assert state.writes == [INDICATORS_HEADER_KEY] * 3
+
+    # a candle of a new window writes every indicator once
+    state.writes.clear()
+    engine.compute({**candles[-1], 'window_start': candles[-1]['window_end']}, state)
+    assert sorted(state.writes) == sorted(
+        [INDICATORS_HEADER_KEY]
+        + [f'indicator_{indicator.names[0]}' for indicator in indicators]
+    )
+
+    # a late candle writes nothing
+    state.writes.clear()
+    assert engine.compute(candles[0], state) is None
+    assert state.writes == []
+
+
+def test_first_candle_replays_the_candles_of_the_state(state):
+    candles = make_candles(60)
+    engine = IncrementalIndicators(default_indicators())
+    # e.g the candles of a snapshot
+    CandleRing(capacity=100).reset(candles, state)
+
+    output = engine.compute(candles[-1], state)
+
+    expected = talib_indicators(candles)
+    assert_same_indicators(
+        output, {name: values[-1] for name, values in expected.items()}
+    )
+
+
+def test_indicators_added_to_the_feature_set_replay_the_closed_candles(state):
+    candles = make_candles(60)
+    compute_all(
+        IncrementalIndicators(build_indicators([{'name': 'sma', 'period': 14}])),
+        candles[:-1],
+        state,
+    )
+
+    output = compute_all(
+        IncrementalIndicators(default_indicators()), candles[-1:], state
+    )
+
+    expected = talib_indicators(candles)
+    assert_same_indicators(
+        output, {name: values[-1] for name, values in expected.items()}
+    )
+
+
+def test_an_incomplete_indicator_fails_when_created():
+    class Momentum(RecursiveIndicator):
+        inputs = ('close',)
+        names = ('momentum',)
+        lookback = 1
+
+        def init_state(self):
+            return [None]
+
+        def step(self, state, bar):
+            return [bar[2]], None if state[0] is None else (bar[2] - state[0],)
+
+    with pytest.raises(TypeError, match='compute_batch'):
+        Momentum()
@@ -0,0 +1,69 @@
+from functools import partial
+
+import pytest
+from candle_ring import CandleRing
+from conftest import make_candles
+from incremental_indicators import IncrementalIndicators
+from indicator_registry import build_indicators
+from technical_indicators import compute_technical_indicators
+from warm_up import WarmUp
+
+INDICATORS = build_indicators(
+    [{'name': 'sma', 'period': 3}, {'name': 'rsi', 'period': 5}]
+)
+
+
+def run_stream(compute, policy: str, candles: list, state) -> list:
+    ring = CandleRing(capacity=20)
+    warm_up = WarmUp(INDICATORS, policy)
+    rows = []
+    for candle in candles:
+        ring.update(candle, state)
+        rows.append(warm_up.apply_stream(compute(candle, state), state))
+    return rows
+
+
+def test_suppress_emits_no_row_until_all_the_indicators_are_warm(state):
+    rows = run_stream(
+        IncrementalIndicators(INDICATORS).compute, 'suppress', make_candles(8), state
+    )
+
+    # rsi_5 needs 6 candles
+    assert rows[:5] == [None] * 5
+    assert all(
+        row['sma_3'] is not None and row['rsi_5'] is not None for row in rows[5:]
+    )
+    assert all('warm' not in row for row in rows[5:])
+
+
+def test_nulls_emits_every_row_with_the_cold_indicators_as_none(state):
+    rows = run_stream(
+        IncrementalIndicators(INDICATORS).compute, 'nulls', make_candles(8), state
+    )
+
+    assert [row['warm'] for row in rows] == [False] * 5 + [True] * 3
+    assert [row['sma_3'] is None for row in rows] == [True] * 2 + [False] * 6
+    assert [row['rsi_5'] is None for row in rows] == [True] * 5 + [False] * 3
+
+
+def test_a_warm_indicator_without_a_value_is_none():
+    warm_up = WarmUp(INDICATORS, 'suppress')
+
+    row = warm_up.apply({'close': 1.0, 'sma_3': 2.0}, num_candles=10)
+
+    assert row == {'close': 1.0, 'sma_3': 2.0, 'rsi_5': None}
+
+
+@pytest.mark.parametrize('policy', ['suppress', 'nulls'])
+@pytest.mark.parametrize('engine', ['incremental', 'talib'])
+def test_late_candles_are_dropped(state, policy, engine):
+    if engine == 'incremental':
+        compute = IncrementalIndicators(INDICATORS).compute
+    else:
+        compute = partial(compute_technical_indicators, indicators=INDICATORS)
+    candles = make_candles(10)
+
+    rows = run_stream(compute, policy, candles + [candles[4]], state)
+
+    assert all(row is not None for row in rows[5:-1])
+    assert rows[-1] is None
@@ -0,0 +1,69 @@
+from typing import List, Literal, Optional
+
+from candle_ring import read_num_candles
+from incremental_indicators import Indicator
+from indicator_registry import warm_up_candles
+from quixstreams import State
+
+
+class WarmUp:
+    """
+    Readiness of every indicator from the number of candles of the pair, an
+    indicator is warm once the pair has more than its `lookback` candles, and
+    the rows to emit while the indicators warm up:
+
+    - 'suppress': no row until all the indicators are warm
+    - 'nulls': every row, with all the indicators, None until they are warm,
+      and a `warm` flag once all of them are
+
+    Either way the rows have all the indicators, None if TA-Lib has no value,
+    so the schema of the feature group does not change from row to row. The
+    warm start from the candle snapshots makes the pairs warm from their first
+    candle. The candles the engine did not compute, the late candles of a
+    closed window, are dropped.
+    """
+
+    def __init__(
+        self, indicators: List[Indicator], policy: Literal['suppress', 'nulls']
+    ):
+        """
+        Args:
+            indicators: The indicators of the rows
+            policy: 'suppress' or 'nulls'
+        """
+        self.policy = policy
+        self.warm_up_candles = warm_up_candles(indicators)
+        self._outputs = [
+            (indicator.lookback, indicator.names) for indicator in indicators
+        ]
+
+    def apply(self, row: Optional[dict], num_candles: int) -> Optional[dict]:
+        """
+        Args:
+            row: The candle with its indicators, None if the engine did not
+                compute them, e.g for a late candle
+            num_candles: The number of candles of the pair, the row included
+
+        Returns:
+            Optional[dict]: The row to emit, None if it is suppressed or was
+                not computed
+        """
+        if row is None:
+            return None
+        warm = num_candles >= self.warm_up_candles
+        if not warm and self.policy == 'suppress':
+            return None
+
+        for lookback, names in self._outputs:
+            for name in names:
+                if num_candles <= lookback or name not in row:
+                    row[name] = None
+        if self.policy == 'nulls':
+            row['warm'] = warm
+        return row
+
+    def apply_stream(self, row: Optional[dict], state: State) -> Optional[dict]:
+        """
+        `apply` with the number of candles of the pair in the state
+        """
+        return self.apply(row, read_num_candles(state))
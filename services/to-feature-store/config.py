@@ -15,6 +15,10 @@ class Settings(BaseSettings):
     feature_group_event_time: str
     feature_group_materialization_minutes: int
     data_source: Literal['live', 'historical']
+    # wire format of the input topic, 'json' or 'msgpack'
+    kafka_input_serialization: Literal['json', 'msgpack'] = 'json'
+    # port of the Prometheus metrics endpoint (/metrics), 0 turns the metrics off
+    metrics_port: int = 0
 
 
 config = Settings()
@@ -1,6 +1,8 @@
 from typing import Literal
 
 from loguru import logger
+from pipeline_shared.instrumentation import Metrics
+from pipeline_shared.serializers import get_deserializer
 from quixstreams import Application
 from sinks import HopsworksSink
 
@@ -11,6 +13,8 @@ def main(
     kafka_consumer_group: str,
     output_sink: HopsworksSink,
     data_source: Literal['live', 'historical'],
+    kafka_input_serialization: Literal['json', 'msgpack'] = 'json',
+    metrics_port: int = 0,
 ):
     """
     Main function to run the to-feature-store service.
@@ -22,13 +26,19 @@ def main(
         kafka_consumer_group: The consumer group to use for the Kafka consumer
         output_sink: The sink to write the messages to
         data_source: The data source to use for the to-feature-store service
+        kafka_input_serialization: Wire format of the input topic
+        metrics_port: Port of the Prometheus metrics endpoint, 0 turns the
+            metrics off
     """
     logger.info('Starting to-feature-store service!')
 
+    metrics = Metrics('to-feature-store', port=metrics_port)
+
     app = Application(
         broker_address=kafka_broker_address,
         consumer_group=kafka_consumer_group,
         auto_offset_reset='earliest' if data_source == 'historical' else 'latest',
+        consumer_extra_config=metrics.consumer_config(),
     )
 
     # Clear the state before starting in historical pipeline
@@ -40,16 +50,22 @@ def main(
         except FileNotFoundError:
             logger.info('No state directory found to clear. Continuing...')
 
-    input_topic = app.topic(kafka_input_topic, value_deserializer='json')
+    input_topic = app.topic(
+        kafka_input_topic,
+        value_deserializer=get_deserializer(kafka_input_serialization),
+    )
 
     # Read the data from the input topic
     sdf = app.dataframe(input_topic)
+    sdf = metrics.track_input(sdf)
 
     # Write the data to the output sink
+    sdf = metrics.track_output(sdf)
     sdf.sink(output_sink)
     logger.info('Data written to the feature store!')
 
     # Start the application
+    metrics.start()
     app.run()
 
 
@@ -77,4 +93,6 @@ if __name__ == '__main__':
         # Output sink settings
         output_sink=hopsworks_sink,
         data_source=config.data_source,
+        kafka_input_serialization=config.kafka_input_serialization,
+        metrics_port=config.metrics_port,
     )
@@ -0,0 +1,178 @@
+"""
+Load test of the trades -> candles -> technical-indicators pipeline.
+
+The harness runs the trades service with the deterministic synthetic source at
+increasing rates, while it tails the trades, candles and technical indicators
+topics. For every rate and stage it reports the throughput and the end-to-end
+latency percentiles, measured as the time from the synthetic trade (its
+`timestamp_ms`, on the wall clock) until the message is read from the topic.
+
+Only one message out of `--sample-every` is decoded for the latency, so the
+harness itself keeps up with the topics at high rates.
+
+A stage is sustainable at a rate when the trades source keeps up with the rate
+and the p99 latency of the stage stays under `--max-p99-ms`.
+
+Start the broker and the candles and technical-indicators services first:
+
+    docker compose -f docker-compose/redpanda.yml up -d
+    docker compose -f docker-compose/technical-indicators-pipeline-loadtest.yml up -d
+
+Usage:
+    uv run python benchmarks/pipeline_load_test.py --rates 1000,10000,100000
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+import orjson
+from confluent_kafka import Consumer
+
+SERVICE_DIR = Path(__file__).parent.parent
+STAGES = ['trades', 'candles', 'technical-indicators']
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--broker', default='localhost:19092')
+    parser.add_argument('--rates', default='1000,10000,50000,100000')
+    parser.add_argument('--num-pairs', type=int, default=8)
+    # same as the loadtest settings of the candles service
+    parser.add_argument('--partitions', type=int, default=8)
+    parser.add_argument('--step-seconds', type=float, default=30)
+    parser.add_argument('--drain-seconds', type=float, default=10)
+    parser.add_argument('--max-p99-ms', type=float, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--sample-every', type=int, default=10)
+    parser.add_argument('--trades-topic', default='trades_loadtest')
+    parser.add_argument('--candles-topic', default='candles_loadtest')
+    parser.add_argument('--indicators-topic', default='technical-indicators_loadtest')
+    return parser.parse_args()
+
+
+def start_trades(args: argparse.Namespace, rate: int) -> subprocess.Popen:
+    """
+    Runs the trades service with the synthetic source for one step
+    """
+    env = {
+        **os.environ,
+        'KAFKA_BROKER_ADDRESS': args.broker,
+        'KAFKA_TOPIC': args.trades_topic,
+        'KAFKA_TOPIC_PARTITIONS': str(args.partitions),
+        'PAIRS': json.dumps([f'PAIR{i}/USD' for i in range(args.num_pairs)]),
+        'DATA_SOURCE': 'synthetic',
+        'SYNTHETIC_TRADES_PER_SECOND': str(rate),
+        'SYNTHETIC_SEED': str(args.seed),
+        'SYNTHETIC_DURATION_SECONDS': str(args.step_seconds),
+        'SYNTHETIC_REALTIME': 'true',
+    }
+    return subprocess.Popen(
+        [sys.executable, 'run.py'],
+        cwd=SERVICE_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def run_step(
+    args: argparse.Namespace, consumer: Consumer, topics: Dict[str, str], rate: int
+) -> Tuple[Dict[str, int], Dict[str, List[float]]]:
+    """
+    Tails the topics while the trades service runs at `rate`
+
+    Returns:
+        Tuple: Number of messages and sampled latencies in ms, per stage
+    """
+    counts = {stage: 0 for stage in STAGES}
+    latencies: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+    start_ms = time.time() * 1000
+    trades = start_trades(args, rate)
+
+    deadline = time.monotonic() + args.step_seconds + args.drain_seconds
+    while time.monotonic() < deadline:
+        for message in consumer.consume(num_messages=10_000, timeout=0.1):
+            if message.error():
+                continue
+            stage = topics[message.topic()]
+            counts[stage] += 1
+            if counts[stage] % args.sample_every:
+                continue
+
+            value = orjson.loads(message.value())
+            # skip the messages of the previous steps that are still in flight
+            if value['timestamp_ms'] >= start_ms:
+                latencies[stage].append(time.time() * 1000 - value['timestamp_ms'])
+
+    trades.wait()
+    return counts, latencies
+
+
+def main() -> None:
+    args = parse_args()
+    rates = [int(rate) for rate in args.rates.split(',')]
+    topics = {
+        args.trades_topic: 'trades',
+        args.candles_topic: 'candles',
+        args.indicators_topic: 'technical-indicators',
+    }
+
+    consumer = Consumer(
+        {
+            'bootstrap.servers': args.broker,
+            'group.id': f'load-test-{uuid.uuid4()}',
+            'auto.offset.reset': 'latest',
+            'enable.auto.commit': False,
+        }
+    )
+    results = {}
+    try:
+        consumer.subscribe(list(topics))
+        # wait for the partitions to be assigned before producing anything
+        while not consumer.assignment():
+            consumer.poll(0.5)
+
+        for rate in rates:
+            print(f'Running {rate:,} trades/s for {args.step_seconds}s...')
+            results[rate] = run_step(args, consumer, topics, rate)
+    finally:
+        consumer.close()
+
+    print(
+        f'\n{"rate":>10} {"stage":<22} {"msg/s":>10} '
+        f'{"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"max ms":>8}'
+    )
+    max_sustainable = {stage: 0 for stage in STAGES}
+    for rate, (counts, latencies) in results.items():
+        upstream_ok = True
+        for stage in STAGES:
+            values = np.array(latencies[stage]) if latencies[stage] else np.zeros(1)
+            throughput = counts[stage] / args.step_seconds
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            print(
+                f'{rate:>10,} {stage:<22} {throughput:>10,.0f} '
+                f'{p50:>8.0f} {p95:>8.0f} {p99:>8.0f} {values.max():>8.0f}'
+            )
+
+            ok = len(latencies[stage]) > 0 and p99 <= args.max_p99_ms
+            if stage == 'trades':
+                ok = ok and throughput >= 0.95 * rate
+            upstream_ok = upstream_ok and ok
+            if upstream_ok:
+                max_sustainable[stage] = max(max_sustainable[stage], rate)
+
+    print(f'\nMax sustainable rate (p99 <= {args.max_p99_ms:.0f} ms):')
+    for stage, rate in max_sustainable.items():
+        print(f'  {stage:<22} {rate:>10,} trades/s')
+
+
+if __name__ == '__main__':
+    main()
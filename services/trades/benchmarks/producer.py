@@ -0,0 +1,89 @@
+"""
+Benchmark of the Kafka producer path of the trades service against a running
+broker: one `produce` plus one info log per trade with the librdkafka defaults,
+vs `TradesProducer` with linger, batching and lz4/zstd compression.
+
+Start the broker first with `docker compose -f docker-compose/redpanda.yml up -d`.
+
+Usage:
+    uv run python benchmarks/producer.py [broker_address]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+import numpy as np  # noqa: E402
+from kraken_api.trade_batch import TradeBatch  # noqa: E402
+from loguru import logger  # noqa: E402
+from producer import TradesProducer, producer_extra_config  # noqa: E402
+from quixstreams import Application  # noqa: E402
+
+TOPIC = 'benchmark_trades'
+NUM_TRADES = 500_000
+TRADES_PER_BATCH = 1000
+
+
+def make_batches() -> list:
+    rng = np.random.default_rng(0)
+    batches = []
+    for start in range(0, NUM_TRADES, TRADES_PER_BATCH):
+        batch = TradeBatch.from_columns(
+            pair='BTC/USD',
+            price=76000 + rng.random(TRADES_PER_BATCH) * 1000,
+            volume=rng.random(TRADES_PER_BATCH),
+            timestamp_ms=1731155565415 + np.arange(start, start + TRADES_PER_BATCH),
+        )
+        batches.append(batch)
+    return batches
+
+
+def per_message(broker_address: str, batches: list) -> None:
+    """
+    The previous producer loop of `run.py`
+    """
+    app = Application(broker_address=broker_address)
+    with app.get_producer() as producer:
+        for batch in batches:
+            for key, value in batch.serialize():
+                producer.produce(topic=TOPIC, value=value, key=key)
+                logger.info(f'Pushed trade to kafka topic {TOPIC}')
+
+
+def batched(broker_address: str, batches: list, compression_type: str) -> None:
+    app = Application(
+        broker_address=broker_address,
+        producer_extra_config=producer_extra_config(
+            linger_ms=100,
+            batch_size=1_000_000,
+            compression_type=compression_type,
+            queue_max_messages=100_000,
+        ),
+    )
+    with app.get_producer() as producer:
+        trades_producer = TradesProducer(producer=producer, topic=TOPIC)
+        for batch in batches:
+            trades_producer.produce_batch(batch)
+        trades_producer.close()
+
+
+def run(name: str, path, *args) -> None:
+    start = time.perf_counter()
+    path(*args)
+    elapsed = time.perf_counter() - start
+    print(f'{name:<22} msg/s={NUM_TRADES / elapsed:12,.0f}')
+
+
+if __name__ == '__main__':
+    broker_address = sys.argv[1] if len(sys.argv) > 1 else 'localhost:19092'
+    batches = make_batches()
+
+    # the per message logs go to a file, so we measure the logging and not the tty
+    logger.remove()
+    logger.add('/tmp/benchmark_producer.log')
+
+    run('per message + log', per_message, broker_address, batches)
+    run('TradesProducer lz4', batched, broker_address, batches, 'lz4')
+    run('TradesProducer zstd', batched, broker_address, batches, 'zstd')
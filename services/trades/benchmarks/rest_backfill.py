@@ -0,0 +1,145 @@
+"""
+Benchmark of the historical backfill against a local stub of the Kraken
+`Trades` endpoint, sequential `KrakenRestAPI` vs concurrent `KrakenRestAPIAsync`.
+
+Usage:
+    uv run python benchmarks/rest_backfill.py
+"""
+
+import json
+import multiprocessing
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from kraken_api.rate_limiter import AdaptivePacer  # noqa: E402
+from kraken_api.rest import KrakenRestAPI, KrakenRestAPISinglePair  # noqa: E402
+from kraken_api.rest_async import KrakenRestAPIAsync  # noqa: E402
+
+PAIRS = [
+    'BTC/USD',
+    'BTC/EUR',
+    'ETH/EUR',
+    'ETH/USD',
+    'ETH/BTC',
+    'SOL/USD',
+    'XRP/USD',
+    'DOGE/USD',
+]
+LAST_N_DAYS = 1
+TRADES_PER_PAGE = 1000
+SECONDS_BETWEEN_TRADES = 5
+# roughly the round trip time to api.kraken.com
+STUB_LATENCY_SECONDS = 0.25
+STUB_PORT = 8765
+# requests per second, way above what the stub can serve
+UNLIMITED_RATE = 10_000
+
+
+class KrakenTradesStub(BaseHTTPRequestHandler):
+    """
+    Answers like `GET /0/public/Trades`, with one trade every
+    SECONDS_BETWEEN_TRADES starting at `since` and never past the current time.
+    """
+
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        pair = params['pair'][0]
+        since_ns = int(params['since'][0])
+        now_ns = time.time_ns()
+
+        trades = []
+        # trades happen on a fixed grid, whatever the value of `since`
+        step_ns = int(SECONDS_BETWEEN_TRADES * 1e9)
+        timestamp_ns = since_ns // step_ns * step_ns
+        for _ in range(TRADES_PER_PAGE):
+            timestamp_ns += step_ns
+            if timestamp_ns > now_ns:
+                break
+            # like kraken's trade ids, unique and increasing with time
+            trade_id = timestamp_ns // step_ns
+            trades.append(
+                [
+                    '76395.00000',
+                    '0.01305597',
+                    timestamp_ns / 1e9,
+                    's',
+                    'm',
+                    '',
+                    trade_id,
+                ]
+            )
+        last = min(timestamp_ns, now_ns)
+
+        time.sleep(STUB_LATENCY_SECONDS)
+        body = json.dumps(
+            {'error': [], 'result': {pair: trades, 'last': str(last)}}
+        ).encode()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run(name: str, trades_api) -> None:
+    pages = 0
+    trades = 0
+    start = time.perf_counter()
+    while not trades_api.is_done():
+        pages += sum(not api.is_done() for api in trades_api.apis)
+        trades += len(trades_api.get_trade_data())
+    elapsed = time.perf_counter() - start
+    print(
+        f'{name:<12} pages={pages:<6} trades={trades:<9} time={elapsed:6.2f}s '
+        f'pages/s={pages / elapsed:8.1f} trades/s={trades / elapsed:10.0f}'
+    )
+
+
+def serve() -> None:
+    ThreadingHTTPServer(('127.0.0.1', STUB_PORT), KrakenTradesStub).serve_forever()
+
+
+if __name__ == '__main__':
+    # the stub runs in its own process so it does not compete for the GIL
+    server = multiprocessing.Process(target=serve, daemon=True)
+    server.start()
+    time.sleep(1)
+    KrakenRestAPISinglePair.URL = f'http://127.0.0.1:{STUB_PORT}/0/public/Trades'
+
+    from loguru import logger
+
+    logger.remove()
+
+    # the stub has no rate limit, we measure the engines themselves, so the
+    # pacers start and stay at a rate they never reach
+    run(
+        'sequential',
+        KrakenRestAPI(
+            pairs=PAIRS,
+            last_n_days=LAST_N_DAYS,
+            pacer=AdaptivePacer(rate=UNLIMITED_RATE, max_rate=UNLIMITED_RATE),
+        ),
+    )
+    run(
+        'async',
+        KrakenRestAPIAsync(
+            pairs=PAIRS,
+            last_n_days=LAST_N_DAYS,
+            max_concurrency=len(PAIRS),
+            rate_limit_per_second=UNLIMITED_RATE,
+            min_rate_limit_per_second=UNLIMITED_RATE,
+            max_rate_limit_per_second=UNLIMITED_RATE,
+            rate_limit_burst=len(PAIRS),
+        ),
+    )
+
+    server.terminate()
@@ -0,0 +1,92 @@
+"""
+Micro-benchmark of the trades hot path, from a raw Kraken REST page to the
+Kafka key/value bytes: per-trade pydantic `Trade` + `to_dict` vs `TradeBatch`.
+
+Usage:
+    uv run python benchmarks/trade_batch.py
+"""
+
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from kraken_api.trade import Trade  # noqa: E402
+from kraken_api.trade_batch import TradeBatch  # noqa: E402
+from quixstreams.utils.json import dumps  # noqa: E402
+
+PAIR = 'BTC/USD'
+TRADES_PER_PAGE = 1000
+NUM_PAGES = 200
+
+
+def make_page(seed: int) -> list:
+    """
+    One page of trades, like `result[pair]` in the Kraken REST API response
+    """
+    rng = random.Random(seed)
+    timestamp_sec = 1731155565.4159515
+    trades = []
+    for trade_id in range(TRADES_PER_PAGE):
+        timestamp_sec += rng.random()
+        trades.append(
+            [
+                f'{76000 + rng.random() * 1000:.5f}',
+                f'{rng.random():.8f}',
+                timestamp_sec,
+                's',
+                'm',
+                '',
+                trade_id,
+            ]
+        )
+    return trades
+
+
+def trade_path(page: list) -> list:
+    messages = []
+    for trade in page:
+        trade = Trade.from_kraken_rest_api_response(
+            pair=PAIR,
+            price=trade[0],
+            volume=trade[1],
+            timestamp_sec=trade[2],
+            trade_id=trade[6],
+        ).to_dict()
+        messages.append((trade['pair'], dumps(trade)))
+    return messages
+
+
+def batch_path(page: list) -> list:
+    return list(
+        TradeBatch.from_kraken_rest_api_response(pair=PAIR, trades=page).serialize()
+    )
+
+
+def run(name: str, path, pages: list) -> None:
+    start = time.perf_counter()
+    for page in pages:
+        path(page)
+    elapsed = time.perf_counter() - start
+    trades_per_sec = len(pages) * TRADES_PER_PAGE / elapsed
+
+    # memory allocated while turning one page into kafka messages
+    tracemalloc.start()
+    path(pages[0])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(
+        f'{name:<14} trades/s={trades_per_sec:12,.0f} '
+        f'bytes/trade={peak / TRADES_PER_PAGE:8.0f}'
+    )
+
+
+if __name__ == '__main__':
+    pages = [make_page(seed) for seed in range(NUM_PAGES)]
+
+    run('Trade+to_dict', trade_path, pages)
+    run('TradeBatch', batch_path, pages)
@@ -10,8 +10,62 @@ class Config(BaseSettings):
     kafka_broker_address: str
     kafka_topic: str
     pairs: List[str]
-    data_source: Literal['live', 'historical', 'test']
+    data_source: Literal['live', 'historical', 'archive', 'synthetic', 'test']
     last_n_days: Optional[int] = None
 
+    # live trades through the Kraken websocket API
+    websocket_client: Literal['blocking', 'async'] = 'async'
+    # only used with websocket_client='async'
+    websocket_pairs_per_connection: int = 10
+    websocket_heartbeat_timeout_seconds: float = 10.0
+    websocket_reconnect_max_backoff_seconds: float = 60.0
+    # number of worker processes the pairs are spread over, 1 runs in-process
+    num_shards: int = 1
+    shard_max_restarts: int = 5
+    shard_restart_window_seconds: float = 300.0
+
+    # historical backfill through the Kraken REST API
+    rest_fetch_mode: Literal['sequential', 'async', 'sliced'] = 'sliced'
+    rest_max_concurrency: int = 8
+    # starting request rate, adapted between the min and the max by the pacer
+    rest_rate_limit_per_second: float = 1.0
+    rest_min_rate_limit_per_second: float = 0.1
+    rest_max_rate_limit_per_second: float = 2.0
+    rest_rate_limit_burst: int = 5
+    # only used with rest_fetch_mode='sliced'
+    backfill_slices_per_pair: int = 4
+    backfill_checkpoint_dir: str = 'state/backfill'
+
+    # local parquet archive of the downloaded trades, used by the sliced backfill
+    # and replayed with data_source='archive'. Set to empty to disable it
+    archive_dir: str = 'state/archive'
+
+    # deterministic synthetic trades for load tests, with data_source='synthetic'
+    synthetic_trades_per_second: float = 10_000
+    synthetic_seed: int = 42
+    synthetic_duration_seconds: Optional[float] = None
+    synthetic_realtime: bool = True
+    synthetic_burst_probability: float = 0.01
+    synthetic_burst_multiplier: float = 10.0
+
+    # kafka producer: batching, compression and backpressure
+    kafka_linger_ms: int = 100
+    kafka_batch_size: int = 1_000_000
+    kafka_compression_type: Literal['none', 'gzip', 'snappy', 'lz4', 'zstd'] = 'lz4'
+    kafka_queue_max_messages: int = 100_000
+    # keep it under kafka_queue_max_messages, so `produce` never hits BufferError
+    kafka_max_in_flight_messages: int = 50_000
+    log_interval_seconds: float = 10.0
+    # wire format of the trades topic, the candles service has to read the same
+    kafka_output_serialization: Literal['json', 'msgpack'] = 'json'
+    # partitions of the topic when it is created, the trades are keyed by pair
+    kafka_topic_partitions: int = 1
+    # live only: a message per pair every heartbeat_interval_seconds with the
+    # current time, so the candles service closes the windows of quiet pairs.
+    # 0 disables them
+    heartbeat_interval_seconds: float = 1.0
+    # port of the Prometheus metrics endpoint (/metrics), 0 turns the metrics off
+    metrics_port: int = 0
+
 
 config = Config()
@@ -0,0 +1,231 @@
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from loguru import logger
+
+from .base import TradesAPI
+from .trade import Trade
+from .trade_batch import TradeBatch
+
+MS_PER_DAY = 24 * 60 * 60 * 1000
+
+
+class TradeArchive:
+    """
+    Local columnar archive of the trades downloaded from Kraken.
+
+    Trades are stored as parquet files partitioned by pair and UTC date:
+
+        <root>/pair=BTC-USD/date=2024-11-09/part-<start_ns>-<end_ns>.parquet
+
+    and every pair keeps a `_coverage.json` with the time ranges that have been
+    fully downloaded, so we know which ranges still have to go to the network.
+    """
+
+    SCHEMA = pa.schema(
+        [
+            ('price', pa.float64()),
+            ('volume', pa.float64()),
+            ('timestamp_ms', pa.int64()),
+            ('trade_id', pa.int64()),
+        ]
+    )
+
+    def __init__(self, root_dir: str):
+        self.root = Path(root_dir)
+
+    def write(self, pair: str, trades: TradeBatch, start_ns: int, end_ns: int) -> None:
+        """
+        Stores the trades of the pair and marks `[start_ns, end_ns)` as covered.
+        The coverage is only updated after the data is on disk, so a crash in
+        between just means the range is downloaded again.
+
+        Args:
+            pair: The pair of the trades
+            trades: All the trades of the pair in `[start_ns, end_ns)`
+            start_ns: Start of the downloaded range
+            end_ns: End of the downloaded range
+        """
+        if end_ns <= start_ns:
+            return
+
+        if len(trades) > 0:
+            table = pa.table(
+                {
+                    'price': trades.price,
+                    'volume': trades.volume,
+                    'timestamp_ms': trades.timestamp_ms,
+                    'trade_id': trades.trade_id,
+                },
+                schema=self.SCHEMA,
+            )
+            days = trades.timestamp_ms // MS_PER_DAY
+            for day in np.unique(days):
+                path = (
+                    self._date_dir(pair, int(day)) / f'part-{start_ns}-{end_ns}.parquet'
+                )
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_suffix('.tmp')
+                pq.write_table(table.filter(days == day), tmp_path)
+                os.replace(tmp_path, path)
+
+        coverage = self._add_range(self.coverage(pair), start_ns, end_ns)
+        self._save_coverage(pair, coverage)
+
+    def read(self, pair: str, start_ns: int, end_ns: int) -> TradeBatch:
+        """
+        Trades of the pair between `start_ns` and `end_ns` (both included),
+        sorted and de-duplicated by trade id
+        """
+        start_ms = start_ns // 1_000_000
+        end_ms = end_ns // 1_000_000
+
+        tables = [
+            pq.read_table(path, schema=self.SCHEMA)
+            for day in range(start_ms // MS_PER_DAY, end_ms // MS_PER_DAY + 1)
+            for path in sorted(self._date_dir(pair, day).glob('*.parquet'))
+        ]
+        if not tables:
+            return TradeBatch.empty()
+        table = pa.concat_tables(tables)
+
+        timestamp_ms = table.column('timestamp_ms').to_numpy()
+        table = table.filter((timestamp_ms >= start_ms) & (timestamp_ms <= end_ms))
+
+        # parts written by overlapping downloads can repeat trades
+        trade_ids = table.column('trade_id').to_numpy()
+        _, index = np.unique(trade_ids, return_index=True)
+        table = table.take(index)
+
+        return TradeBatch.from_columns(
+            pair=pair,
+            price=table.column('price').to_numpy(),
+            volume=table.column('volume').to_numpy(),
+            timestamp_ms=table.column('timestamp_ms').to_numpy(),
+            trade_id=table.column('trade_id').to_numpy(),
+        )
+
+    def coverage(self, pair: str) -> List[List[int]]:
+        """
+        Sorted, non overlapping `[start_ns, end_ns)` ranges stored for the pair
+        """
+        path = self._pair_dir(pair) / '_coverage.json'
+        if not path.exists():
+            return []
+        with open(path) as f:
+            return json.load(f)
+
+    def covered_ranges(
+        self, pair: str, start_ns: int, end_ns: int
+    ) -> List[Tuple[int, int]]:
+        """
+        Parts of `[start_ns, end_ns)` that are stored in the archive
+        """
+        return [
+            (max(start, start_ns), min(end, end_ns))
+            for start, end in self.coverage(pair)
+            if start < end_ns and end > start_ns
+        ]
+
+    def missing_ranges(
+        self, pair: str, start_ns: int, end_ns: int
+    ) -> List[Tuple[int, int]]:
+        """
+        Parts of `[start_ns, end_ns)` that still have to be downloaded
+        """
+        missing = []
+        cursor = start_ns
+        for start, end in self.covered_ranges(pair, start_ns, end_ns):
+            if start > cursor:
+                missing.append((cursor, start))
+            cursor = max(cursor, end)
+        if cursor < end_ns:
+            missing.append((cursor, end_ns))
+        return missing
+
+    def _pair_dir(self, pair: str) -> Path:
+        return self.root / f'pair={pair.replace("/", "-")}'
+
+    def _date_dir(self, pair: str, day: int) -> Path:
+        date = datetime.fromtimestamp(day * MS_PER_DAY / 1000, tz=timezone.utc)
+        return self._pair_dir(pair) / f'date={date:%Y-%m-%d}'
+
+    def _save_coverage(self, pair: str, coverage: List[List[int]]) -> None:
+        path = self._pair_dir(pair) / '_coverage.json'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(coverage, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _add_range(
+        coverage: List[List[int]], start_ns: int, end_ns: int
+    ) -> List[List[int]]:
+        """
+        Adds `[start_ns, end_ns)` to the ranges and merges the ones that touch
+        """
+        merged: List[List[int]] = []
+        for start, end in sorted(coverage + [[start_ns, end_ns]]):
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return merged
+
+
+class KrakenArchiveAPI(TradesAPI):
+    """
+    Replays the trades of the last `last_n_days` straight from the local archive,
+    one UTC day at a time, without touching the network.
+    """
+
+    def __init__(self, pairs: List[str], last_n_days: int, archive: TradeArchive):
+        self.pairs = pairs
+        self.last_n_days = last_n_days
+        self.archive = archive
+
+        now_ms = int(datetime.now(tz=timezone.utc).timestamp() * 1000)
+        self._days = self._iter_days(now_ms - last_n_days * MS_PER_DAY, now_ms)
+        self._next_day = next(self._days, None)
+
+    def get_trade_data(self) -> List[Trade]:
+        """
+        Trades of all the pairs for the next day in the archive, sorted by timestamp
+        """
+        return self.get_trade_batch().to_trades()
+
+    def get_trade_batch(self) -> TradeBatch:
+        """
+        Trades of all the pairs for the next day in the archive, sorted by timestamp
+        """
+        start_ms, end_ms = self._next_day
+        self._next_day = next(self._days, None)
+
+        trades_per_pair = [
+            self.archive.read(pair, start_ms * 1_000_000, end_ms * 1_000_000)
+            for pair in self.pairs
+        ]
+        trades = TradeBatch.merge(trades_per_pair)
+        logger.info(f'Replayed {len(trades)} trades from the archive')
+
+        return trades
+
+    def is_done(self) -> bool:
+        return self._next_day is None
+
+    @staticmethod
+    def _iter_days(start_ms: int, end_ms: int) -> Iterator[Tuple[int, int]]:
+        """
+        Splits `[start_ms, end_ms]` at UTC midnights, both ends included
+        """
+        while start_ms <= end_ms:
+            day_end_ms = min((start_ms // MS_PER_DAY + 1) * MS_PER_DAY - 1, end_ms)
+            yield start_ms, day_end_ms
+            start_ms = day_end_ms + 1
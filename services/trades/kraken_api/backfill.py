@@ -0,0 +1,435 @@
+import json
+import os
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from .archive import MS_PER_DAY, TradeArchive
+from .rate_limiter import AdaptivePacer
+from .rest import KrakenRestAPISinglePair
+from .rest_async import KrakenRestAPIAsync
+from .trade_batch import TradeBatch
+
+
+class KrakenRestAPISlice(KrakenRestAPISinglePair):
+    """
+    Cursor over the trades of a pair in `[since_timestamp_ns, until_timestamp_ns)`
+
+    An archived slice is already in the local trade archive, it is never fetched.
+    """
+
+    def __init__(
+        self,
+        pair: str,
+        index: int,
+        since_timestamp_ns: int,
+        until_timestamp_ns: int,
+        archived: bool = False,
+        pacer: Optional[AdaptivePacer] = None,
+    ):
+        super().__init__(
+            pair=pair,
+            last_n_days=0,
+            since_timestamp_ns=since_timestamp_ns,
+            pacer=pacer,
+        )
+        self.index = index
+        self.until_timestamp_ns = until_timestamp_ns
+        self.archived = archived
+        self._is_done = archived
+
+        # fetched trades not written to the archive yet
+        self.unarchived_trades: List[TradeBatch] = []
+        self.unarchived_since_ns = since_timestamp_ns
+
+    def process_response(self, data: dict) -> TradeBatch:
+        """
+        Same as the single pair cursor, but drops the trades past the end of the
+        slice and stops there.
+        """
+        trades = super().process_response(data)
+
+        # a trade on the boundary may end up in both slices, never in none
+        trades = trades.take(trades.timestamp_ms * 1_000_000 < self.until_timestamp_ns)
+
+        if self.since_timestamp_ns >= self.until_timestamp_ns:
+            self._is_done = True
+
+        return trades
+
+
+class BackfillCheckpoint:
+    """
+    Plan of the backfill (the slices of every pair) and the progress of each
+    slice, persisted as a json file so a restarted backfill resumes where it
+    stopped.
+
+    The trades of a slice that cannot be emitted yet, because an earlier slice
+    of the same pair is still running, are spilled to a jsonl file next to it.
+    A spill file is only deleted once a checkpoint saved after its trades were
+    emitted is on disk, a resumed backfill emits them again otherwise.
+    """
+
+    def __init__(self, checkpoint_dir: str):
+        self.dir = Path(checkpoint_dir)
+        self.path = self.dir / 'checkpoint.json'
+        self.data: dict = {}
+        # spill files read since the last save
+        self._unspilled: List[Path] = []
+
+    def load(self) -> Optional[dict]:
+        if not self.path.exists():
+            return None
+        with open(self.path) as f:
+            self.data = json.load(f)
+        return self.data
+
+    def save(self) -> None:
+        """
+        Writes the checkpoint atomically, a crash never leaves a half written file,
+        then deletes the spill files whose trades it covers
+        """
+        self.dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.data, f)
+        os.replace(tmp_path, self.path)
+
+        for path in self._unspilled:
+            path.unlink(missing_ok=True)
+        self._unspilled = []
+
+    def clear(self) -> None:
+        for path in self.dir.glob('*.jsonl'):
+            path.unlink()
+        self.path.unlink(missing_ok=True)
+        self._unspilled = []
+
+    def spill_path(self, pair: str, index: int) -> Path:
+        return self.dir / f'{pair.replace("/", "-")}_{index}.jsonl'
+
+    def spill(self, pair: str, index: int, trades: TradeBatch) -> None:
+        """
+        Appends the page of trades as one json line of columns
+        """
+        if len(trades) == 0:
+            return
+        self.dir.mkdir(parents=True, exist_ok=True)
+        with open(self.spill_path(pair, index), 'a') as f:
+            page = {
+                'price': trades.price.tolist(),
+                'volume': trades.volume.tolist(),
+                'timestamp_ms': trades.timestamp_ms.tolist(),
+                'trade_id': trades.trade_id.tolist(),
+            }
+            f.write(json.dumps(page) + '\n')
+
+    def unspill(self, pair: str, index: int) -> TradeBatch:
+        """
+        Reads the spilled trades of the slice. The file is deleted by the next
+        `save`, once the trades are covered by the checkpoint.
+        """
+        path = self.spill_path(pair, index)
+        if not path.exists():
+            return TradeBatch.empty()
+        with open(path) as f:
+            trades = TradeBatch.concat(
+                [TradeBatch.from_columns(pair=pair, **json.loads(line)) for line in f]
+            )
+        self._unspilled.append(path)
+        return trades
+
+
+class KrakenRestAPIBackfill(KrakenRestAPIAsync):
+    """
+    Historical backfill that splits `[now - last_n_days, now]` into
+    `slices_per_pair` time slices per pair and fetches all of them concurrently.
+
+    For every pair, the trades of the earliest slice that is not finished are
+    emitted as they arrive, the trades of later slices are spilled to disk until
+    the slices before them are done. Trades are de-duplicated by Kraken's trade
+    id, so the output of every pair is one ordered stream.
+
+    With a `TradeArchive`, the ranges already in the archive are read from disk
+    instead of the network, and every downloaded trade is written to it.
+    """
+
+    def __init__(
+        self,
+        pairs: List[str],
+        last_n_days: int,
+        slices_per_pair: int,
+        checkpoint_dir: str,
+        archive: Optional[TradeArchive] = None,
+        archive_flush_trades: int = 100_000,
+        max_concurrency: int = 8,
+        rate_limit_per_second: float = 1.0,
+        rate_limit_burst: int = 5,
+        request_timeout_seconds: float = 30.0,
+        min_rate_limit_per_second: float = 0.1,
+        max_rate_limit_per_second: float = 2.0,
+    ):
+        self.slices_per_pair = slices_per_pair
+        self.checkpoint = BackfillCheckpoint(checkpoint_dir)
+        self.archive = archive
+        self.archive_flush_trades = archive_flush_trades
+
+        super().__init__(
+            pairs=pairs,
+            last_n_days=last_n_days,
+            max_concurrency=max_concurrency,
+            rate_limit_per_second=rate_limit_per_second,
+            rate_limit_burst=rate_limit_burst,
+            request_timeout_seconds=request_timeout_seconds,
+            min_rate_limit_per_second=min_rate_limit_per_second,
+            max_rate_limit_per_second=max_rate_limit_per_second,
+        )
+
+        # index of the slice that is currently emitted, per pair
+        self._head: Dict[str, int] = self.checkpoint.data['head']
+        # last trade id emitted, per pair
+        self._last_trade_id: Dict[str, int] = self.checkpoint.data['last_trade_id']
+
+        self._slices = {(api.pair, api.index): api for api in self.apis}
+        self._num_slices = Counter(api.pair for api in self.apis)
+
+    def _create_apis(self) -> List[KrakenRestAPISlice]:
+        """
+        Creates the slices from the checkpoint if there is one for the same
+        backfill, otherwise plans a new backfill
+        """
+        data = self.checkpoint.load()
+        if (
+            data is not None
+            and data['pairs'] == self.pairs
+            and data['last_n_days'] == self.last_n_days
+            and data['slices_per_pair'] == self.slices_per_pair
+        ):
+            logger.info(f'Resuming backfill from {self.checkpoint.path}')
+            return [
+                self._slice_from_checkpoint(slice_data) for slice_data in data['slices']
+            ]
+
+        self.checkpoint.clear()
+        self.checkpoint.data = {
+            'pairs': self.pairs,
+            'last_n_days': self.last_n_days,
+            'slices_per_pair': self.slices_per_pair,
+            'head': {pair: 0 for pair in self.pairs},
+            'last_trade_id': {},
+            'slices': [],
+        }
+
+        # slice boundaries are whole milliseconds, like the trade timestamps
+        until_ns = time.time_ns() // 1_000_000 * 1_000_000
+        since_ns = until_ns - self.last_n_days * 24 * 60 * 60 * 1000000000
+        slice_ns = (until_ns - since_ns) // self.slices_per_pair
+        slice_ns = slice_ns // 1_000_000 * 1_000_000
+
+        apis = []
+        for pair in self.pairs:
+            for index, (start_ns, end_ns, archived) in enumerate(
+                self._plan_pair(pair, since_ns, until_ns, slice_ns)
+            ):
+                apis.append(
+                    KrakenRestAPISlice(
+                        pair=pair,
+                        index=index,
+                        since_timestamp_ns=start_ns,
+                        until_timestamp_ns=end_ns,
+                        archived=archived,
+                        pacer=self.pacer,
+                    )
+                )
+        self._save_progress(apis)
+
+        num_archived = sum(api.archived for api in apis)
+        logger.info(
+            f'Planned {len(apis)} slices, {num_archived} of them from the archive'
+        )
+
+        return apis
+
+    def _plan_pair(
+        self, pair: str, since_ns: int, until_ns: int, slice_ns: int
+    ) -> List[Tuple[int, int, bool]]:
+        """
+        Splits `[since_ns, until_ns)` into slices of at most `slice_ns` for the
+        ranges to download, and of one day for the ranges in the archive
+
+        Returns:
+            List[Tuple[int, int, bool]]: start, end and archived flag of each slice
+        """
+        if self.archive is not None:
+            ranges = [
+                (start, end, True)
+                for start, end in self.archive.covered_ranges(pair, since_ns, until_ns)
+            ] + [
+                (start, end, False)
+                for start, end in self.archive.missing_ranges(pair, since_ns, until_ns)
+            ]
+        else:
+            ranges = [(since_ns, until_ns, False)]
+
+        slices = []
+        for start_ns, end_ns, archived in sorted(ranges):
+            step_ns = MS_PER_DAY * 1_000_000 if archived else slice_ns
+            while start_ns < end_ns:
+                slices.append((start_ns, min(start_ns + step_ns, end_ns), archived))
+                start_ns = slices[-1][1]
+
+        if not slices:
+            # empty range, e.g. last_n_days=0
+            return slices
+
+        # the last slice is open ended, it stops when it reaches now
+        start_ns, end_ns, archived = slices[-1]
+        if not archived:
+            slices[-1] = (start_ns, 2 * until_ns, archived)
+
+        return slices
+
+    def get_trade_batch(self) -> TradeBatch:
+        """
+        Fetches one page for every slice that is not done yet, concurrently
+
+        Returns:
+            TradeBatch: The trades that can be emitted, sorted by timestamp
+        """
+        # the trades returned by the previous call have been processed by now
+        self._save_progress(self.apis)
+
+        apis = [api for api in self.apis if not api.is_done()]
+        pages = self._loop.run_until_complete(self._fetch_pages(apis))
+
+        trades_per_pair: Dict[str, List[TradeBatch]] = {pair: [] for pair in self.pairs}
+        for api, page in zip(apis, pages, strict=True):
+            if api.index == self._head[api.pair]:
+                trades_per_pair[api.pair].append(self._deduplicate(api.pair, page))
+            else:
+                self.checkpoint.spill(api.pair, api.index, page)
+
+            if self.archive is not None:
+                api.unarchived_trades.append(page)
+                if api.is_done() or (
+                    sum(len(batch) for batch in api.unarchived_trades)
+                    >= self.archive_flush_trades
+                ):
+                    self._flush_to_archive(api)
+
+        # once the head slice is done, the next one becomes the head and its
+        # spilled trades can be emitted. Archived slices are emitted at once.
+        for pair in self.pairs:
+            while self._head[pair] < self._num_slices[pair]:
+                api = self._slices[(pair, self._head[pair])]
+                if api.archived:
+                    trades_per_pair[pair].append(
+                        self._deduplicate(
+                            pair,
+                            self.archive.read(
+                                pair, api.since_timestamp_ns, api.until_timestamp_ns
+                            ),
+                        )
+                    )
+                if not api.is_done():
+                    break
+
+                self._head[pair] += 1
+                if self._head[pair] < self._num_slices[pair]:
+                    trades_per_pair[pair].append(
+                        self._deduplicate(
+                            pair, self.checkpoint.unspill(pair, self._head[pair])
+                        )
+                    )
+                if api.archived:
+                    # at most one day from the archive per call, to bound memory
+                    break
+
+        if self.is_done():
+            logger.info('Backfill done, removing the checkpoint')
+            self.checkpoint.clear()
+            self.close()
+
+        # the trades of each pair are in order, so we only merge across pairs
+        return TradeBatch.merge(
+            [TradeBatch.concat(batches) for batches in trades_per_pair.values()]
+        )
+
+    def is_done(self) -> bool:
+        """
+        done when the last slice of every pair has been emitted
+        """
+        return all(self._head[pair] >= self._num_slices[pair] for pair in self.pairs)
+
+    def close(self) -> None:
+        """
+        Saves the progress, so the next run resumes from here, and closes the
+        HTTP session
+        """
+        if self.archive is not None:
+            for api in self.apis:
+                self._flush_to_archive(api)
+        if not self.is_done():
+            self._save_progress(self.apis)
+        super().close()
+
+    def _flush_to_archive(self, api: KrakenRestAPISlice) -> None:
+        if api.archived:
+            return
+        end_ns = min(api.since_timestamp_ns, api.until_timestamp_ns)
+        self.archive.write(
+            api.pair,
+            TradeBatch.concat(api.unarchived_trades),
+            api.unarchived_since_ns,
+            end_ns,
+        )
+        api.unarchived_trades = []
+        api.unarchived_since_ns = end_ns
+
+    def _deduplicate(self, pair: str, trades: TradeBatch) -> TradeBatch:
+        """
+        Drops the trades already emitted for the pair. Slices overlap by a few
+        trades at their boundaries, and a resumed slice may fetch a page twice.
+        """
+        if len(trades) == 0:
+            return trades
+        last_trade_id = self._last_trade_id.get(pair, -1)
+
+        # keep a trade only if its id is above every id seen before it
+        seen_max = np.maximum.accumulate(
+            np.concatenate([[last_trade_id], trades.trade_id])
+        )
+        trades = trades.take(trades.trade_id > seen_max[:-1])
+
+        self._last_trade_id[pair] = int(seen_max[-1])
+        return trades
+
+    def _slice_from_checkpoint(self, slice_data: dict) -> KrakenRestAPISlice:
+        api = KrakenRestAPISlice(
+            pair=slice_data['pair'],
+            index=slice_data['index'],
+            since_timestamp_ns=slice_data['since_timestamp_ns'],
+            until_timestamp_ns=slice_data['until_timestamp_ns'],
+            archived=slice_data['archived'],
+            pacer=self.pacer,
+        )
+        api._is_done = slice_data['done']
+        return api
+
+    def _save_progress(self, apis: List[KrakenRestAPISlice]) -> None:
+        self.checkpoint.data['slices'] = [
+            {
+                'pair': api.pair,
+                'index': api.index,
+                'since_timestamp_ns': api.since_timestamp_ns,
+                'until_timestamp_ns': api.until_timestamp_ns,
+                'done': api.is_done(),
+                'archived': api.archived,
+            }
+            for api in apis
+        ]
+        self.checkpoint.save()
@@ -2,6 +2,7 @@ from abc import ABC, abstractmethod
 from typing import List
 
 from .trade import Trade
+from .trade_batch import TradeBatch
 
 
 class TradesAPI(ABC):
@@ -9,6 +10,13 @@ class TradesAPI(ABC):
     def get_trade_data(self) -> List[Trade]:
         pass
 
+    def get_trade_batch(self) -> TradeBatch:
+        """
+        Same trades as `get_trade_data`, as a columnar batch. Clients that parse
+        the raw responses straight into a batch override this method.
+        """
+        return TradeBatch.from_trades(self.get_trade_data())
+
     @abstractmethod
     def is_done(self) -> bool:
         pass
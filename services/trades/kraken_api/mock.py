@@ -8,41 +8,29 @@ from .trade import Trade
 
 
 class KrakenMockAPI(TradesAPI):
-    def __init__(self, pair: str):
-        self.pair = pair
+    def __init__(self, pairs: List[str]):
+        self.pairs = pairs
 
-    def get_trades(self, pair: str) -> List[Trade]:
+    def get_trade_data(self) -> List[Trade]:
         mock_trades = [
             Trade(
-                pair=self.pair,
-                price=0.5027,
-                volume=144.12,
-                timestamp=datetime(2024, 2, 12, 14, 43, 23, 123456),
-                timestamp_ms=1,
-            ),
-            Trade(
-                pair=self.pair,
-                price=0.5018,
-                volume=23.12,
-                timestamp=datetime(2024, 2, 12, 14, 43, 24, 123456),
-                timestamp_ms=2,
-            ),
-            Trade(
-                pair=self.pair,
-                price=0.5039,
-                volume=32.0013,
-                timestamp=datetime(2024, 2, 12, 14, 43, 25, 123456),
-                timestamp_ms=3,
-            ),
-            Trade(
-                pair=self.pair,
-                price=0.5030,
-                volume=33.46326,
-                timestamp=datetime(2024, 2, 12, 14, 43, 26, 123456),
-                timestamp_ms=4,
-            ),
+                pair=pair,
+                price=price,
+                volume=volume,
+                timestamp=datetime(2024, 2, 12, 14, 43, second, 123456),
+            )
+            for pair in self.pairs
+            for price, volume, second in [
+                (0.5027, 144.12, 23),
+                (0.5018, 23.12, 24),
+                (0.5039, 32.0013, 25),
+                (0.5030, 33.46326, 26),
+            ]
         ]
 
         sleep(1)
 
         return mock_trades
+
+    def is_done(self) -> bool:
+        return False
@@ -0,0 +1,206 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from loguru import logger
+
+
+class TokenBucket:
+    """
+    Async token bucket. Every request takes one token, tokens are refilled at
+    `rate` per second up to `capacity`, so short bursts are allowed while the
+    long term request rate never goes above `rate`.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._last_refill = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """
+        Waits until a token is available and takes it
+        """
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                # sleep just long enough for the next token to be ready
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def drain(self) -> None:
+        """
+        Drops the tokens left, so we don't burst right after being throttled
+        """
+        self._refill()
+        self._tokens = min(self._tokens, 0.0)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._last_refill) * self.rate
+        )
+        self._last_refill = now
+
+
+class AdaptivePacer:
+    """
+    Adaptive request rate for an API with an unknown or changing rate limit,
+    additive increase / multiplicative decrease like TCP congestion control.
+
+    Every successful request raises the rate by `increase_per_success`, up to
+    `max_rate`, so we keep probing for the max rate allowed. Every time we are
+    throttled the rate is multiplied by `decrease_factor`, down to `min_rate`,
+    and all the requests pause for an exponential backoff with jitter.
+
+    It also keeps the metrics of the pacing: the current rate, the observed
+    request rate and the time spent waiting.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        min_rate: float = 0.1,
+        max_rate: float = 2.0,
+        increase_per_success: float = 0.02,
+        decrease_factor: float = 0.5,
+        min_backoff_seconds: float = 1.0,
+        max_backoff_seconds: float = 60.0,
+        window_seconds: float = 60.0,
+    ):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase_per_success = increase_per_success
+        self.decrease_factor = decrease_factor
+        self.min_backoff_seconds = min_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.window_seconds = window_seconds
+
+        # metrics
+        self.num_requests = 0
+        self.num_throttled = 0
+        self.throttle_seconds = 0.0
+
+        self._consecutive_throttles = 0
+        self._paused_until = 0.0
+        self._next_request = 0.0
+        self._request_times: deque = deque()
+
+    def on_success(self) -> None:
+        self._consecutive_throttles = 0
+        self.rate = min(self.max_rate, self.rate + self.increase_per_success)
+
+    def on_throttled(self, reason: str) -> None:
+        """
+        Slows down after a rate limit error, or any error that asks us to
+        come back later
+        """
+        self.num_throttled += 1
+        now = time.monotonic()
+        if now < self._paused_until:
+            # the requests that were in flight when we got throttled, we
+            # already slowed down for them
+            return
+
+        self._consecutive_throttles += 1
+        self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+        backoff = min(
+            self.max_backoff_seconds,
+            self.min_backoff_seconds * 2 ** (self._consecutive_throttles - 1),
+        )
+        # equal jitter: wait at least half the backoff, so we do slow down
+        backoff = random.uniform(backoff / 2, backoff)
+        self._paused_until = now + backoff
+
+        logger.warning(
+            f'Throttled ({reason}), pausing {backoff:.1f}s and slowing down to '
+            f'{self.rate:.2f} req/s'
+        )
+
+    def wait(self) -> None:
+        """
+        Blocks until the next request can be sent, for the sync clients
+        """
+        now = time.monotonic()
+        delay = max(self._paused_until, self._next_request) - now
+        if delay > 0:
+            time.sleep(delay)
+            self.throttle_seconds += delay
+        self._next_request = max(now, self._next_request) + 1 / self.rate
+        self.record_request()
+
+    async def wait_pause(self) -> None:
+        """
+        Waits for the end of the backoff pause, if any, for the async clients
+        that enforce the rate with a token bucket
+        """
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def record_request(self) -> None:
+        now = time.monotonic()
+        self.num_requests += 1
+        self._request_times.append(now)
+        while self._request_times[0] < now - self.window_seconds:
+            self._request_times.popleft()
+
+    def metrics(self) -> dict:
+        """
+        Current allowed rate, observed request rate over the last window and
+        totals since the start
+        """
+        return {
+            'request_rate': self.rate,
+            'observed_request_rate': len(self._request_times) / self.window_seconds,
+            'num_requests': self.num_requests,
+            'num_throttled': self.num_throttled,
+            'throttle_seconds': self.throttle_seconds,
+        }
+
+
+class HostRateLimiter:
+    """
+    One token bucket per host, so every client hitting the same API shares the
+    same request budget.
+
+    With a `pacer`, the rate of the buckets follows the rate of the pacer and
+    the requests wait for its backoff pauses.
+    """
+
+    def __init__(
+        self, rate: float, capacity: int, pacer: Optional[AdaptivePacer] = None
+    ):
+        self.rate = rate
+        self.capacity = capacity
+        self.pacer = pacer
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._num_throttled = 0
+
+    async def acquire(self, url: str) -> None:
+        host = urlparse(url).netloc
+        if host not in self._buckets:
+            self._buckets[host] = TokenBucket(rate=self.rate, capacity=self.capacity)
+        bucket = self._buckets[host]
+
+        if self.pacer is None:
+            await bucket.acquire()
+            return
+
+        start = time.monotonic()
+        await self.pacer.wait_pause()
+        if self.pacer.num_throttled != self._num_throttled:
+            self._num_throttled = self.pacer.num_throttled
+            bucket.drain()
+        bucket.rate = self.pacer.rate
+        await bucket.acquire()
+        self.pacer.throttle_seconds += time.monotonic() - start
+        self.pacer.record_request()
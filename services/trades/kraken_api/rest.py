@@ -1,43 +1,77 @@
-import json
 import time
-from typing import List
+from typing import List, Optional
 
+import orjson
 import requests
 from loguru import logger
 
 from .base import TradesAPI
+from .rate_limiter import AdaptivePacer
 from .trade import Trade
+from .trade_batch import TradeBatch
+
+
+class KrakenAPIError(Exception):
+    """
+    Errors returned by Kraken in the `error` array of the response
+    """
+
+    # errors that won't go away by asking again
+    PERMANENT_PREFIXES = (
+        'EQuery:',
+        'EGeneral:Invalid arguments',
+        'EGeneral:Permission denied',
+        'EAPI:Invalid',
+    )
+
+    def __init__(self, errors: List[str], retryable: Optional[bool] = None):
+        super().__init__(', '.join(errors))
+        self.errors = errors
+        if retryable is None:
+            retryable = not any(
+                error.startswith(self.PERMANENT_PREFIXES) for error in errors
+            )
+        self.retryable = retryable
 
 
 class KrakenRestAPI(TradesAPI):
-    def __init__(self, pairs: List[str], last_n_days: int):
+    def __init__(
+        self,
+        pairs: List[str],
+        last_n_days: int,
+        pacer: Optional[AdaptivePacer] = None,
+    ):
         self.pairs = pairs
         self.last_n_days = last_n_days
+        # shared by all the pairs, Kraken applies the rate limit per IP
+        self.pacer = pacer or AdaptivePacer(rate=1.0)
         self.apis = [
-            KrakenRestAPISinglePair(pair=pair, last_n_days=last_n_days)
+            KrakenRestAPISinglePair(
+                pair=pair, last_n_days=last_n_days, pacer=self.pacer
+            )
             for pair in self.pairs
         ]
 
     def get_trade_data(
         self,
-    ) -> List[
-        Trade
-    ]:  # TODO asyncronous method to request all the pairs at the same time
+    ) -> List[Trade]:
         """
         get trades for each trade, sort them by timestamp and return them
 
+        The concurrent version of this method lives in `KrakenRestAPIAsync`.
+
         Returns:
             List[Trade]: _description_
         """
-        trades = []
-        for api in self.apis:
-            if not api.is_done():
-                trades += api.get_trade_data()
+        return self.get_trade_batch().to_trades()
 
-        # sort the trades by timestamp
-        trades.sort(key=lambda x: x.timestamp_ms)
-
-        return trades
+    def get_trade_batch(self) -> TradeBatch:
+        """
+        get the next page of each pair and merge them by timestamp
+        """
+        return TradeBatch.merge(
+            [api.get_trade_batch() for api in self.apis if not api.is_done()]
+        )
 
     def is_done(self) -> bool:
         """
@@ -59,58 +93,131 @@ class KrakenRestAPISinglePair(TradesAPI):
         self,
         pair: str,
         last_n_days: int,
+        since_timestamp_ns: Optional[int] = None,
+        pacer: Optional[AdaptivePacer] = None,
     ):
         self.pair = pair
         self.last_n_days = last_n_days
+        self.pacer = pacer or AdaptivePacer(rate=1.0)
         self._is_done = False
 
         # get current timestamp in nanoseconds
-        self.since_timestamp_ns = int(
-            time.time_ns() - last_n_days * 24 * 60 * 60 * 1000000000
-        )
+        if since_timestamp_ns is None:
+            since_timestamp_ns = int(
+                time.time_ns() - last_n_days * 24 * 60 * 60 * 1000000000
+            )
+        self.since_timestamp_ns = since_timestamp_ns
 
         logger.info(
-            f'Getting trades for pair {self.pair} for the last {self.since_timestamp_ns * 1000000000} seconds'
+            f'Getting trades for pair {self.pair} since {self.since_timestamp_ns} ns'
         )
 
     def get_trade_data(self) -> List[Trade]:
+        """
+        Sends a request to the Kraken API and returns the trades for the pair.
+        """
+        return self.get_trade_batch().to_trades()
+
+    def get_trade_batch(self) -> TradeBatch:
         """
         Sends a request to the Kraken API and returns the trades for the pair.
         """
         headers = {'Accept': 'application/json'}
-        params = {
+
+        self.pacer.wait()
+        try:
+            response = requests.request(
+                'GET',
+                self.URL,
+                headers=headers,
+                params=self.request_params(),
+                timeout=30,
+            )
+        except requests.RequestException as e:
+            logger.error(f'Failed to get trades for pair {self.pair}: {e}')
+            self.pacer.on_throttled(str(e))
+            return TradeBatch.empty()
+
+        return self.handle_response(response.status_code, response.content)
+
+    def request_params(self) -> dict:
+        """
+        Query parameters for the next page of trades, starting at the cursor.
+        """
+        return {
             'pair': self.pair,
             'since': self.since_timestamp_ns,
         }
 
-        response = requests.request('GET', self.URL, headers=headers, params=params)
+    def handle_response(self, status: int, body: bytes) -> TradeBatch:
+        """
+        Parses a Kraken `Trades` response and tells the pacer how it went.
+        Shared by the sequential and the async clients.
+
+        Rate limit and transient errors slow the pacer down and leave the cursor
+        where it is, so the page is asked again later. Permanent errors stop
+        the pair, instead of asking for the same failing page forever.
+
+        Args:
+            status: The HTTP status code of the response
+            body: The raw body of the response
+
+        Returns:
+            TradeBatch: The trades in the page, empty if the request failed
+        """
+        if status == 429 or status >= 500:
+            self.pacer.on_throttled(f'HTTP {status}')
+            return TradeBatch.empty()
 
         # parse the response as json
         try:
-            data = json.loads(response.text)
-        except json.JSONDecodeError as e:
+            data = orjson.loads(body)
+        except orjson.JSONDecodeError as e:
             logger.error(f'Failed to parse response as json: {e}')
-            return []
+            self.pacer.on_throttled('invalid json')
+            return TradeBatch.empty()
 
-        # TODO: check if we get a an error response. If so, implement a slow-down mechanism
+        try:
+            trades = self.process_response(data)
+        except KrakenAPIError as e:
+            if e.retryable:
+                self.pacer.on_throttled(str(e))
+            else:
+                logger.error(f'Giving up on pair {self.pair}: {e}')
+                self._is_done = True
+            return TradeBatch.empty()
+
+        self.pacer.on_success()
+        return trades
+
+    def process_response(self, data: dict) -> TradeBatch:
+        """
+        Converts a parsed Kraken `Trades` response into a batch of trades and
+        moves the cursor forward.
+
+        Args:
+            data: The json body returned by the Kraken REST API
+
+        Returns:
+            TradeBatch: The trades in the page, in ascending timestamp order
+
+        Raises:
+            KrakenAPIError: If Kraken returned errors instead of trades
+        """
+        # e.g {'error': ['EAPI:Rate limit exceeded'], 'result': {}}
+        if data.get('error'):
+            raise KrakenAPIError(data['error'])
 
         # get the trades for the self.pair cryptocurrency
         try:
             trades = data['result'][self.pair]
-        except KeyError as e:
-            logger.error(f'Failed to get trades for pair {self.pair}: {e}')
-            return []
-
-        # convert the trades to Trade objects
-        trades = [
-            Trade.from_kraken_rest_api_response(
-                pair=self.pair,
-                price=trade[0],
-                volume=trade[1],
-                timestamp_sec=trade[2],
-            )
-            for trade in trades
-        ]
+        except (KeyError, TypeError) as e:
+            raise KrakenAPIError(
+                [f'Missing trades for pair {self.pair}: {e!r}'], retryable=False
+            ) from e
+
+        # convert the trades to a columnar batch, no Trade object per trade
+        trades = TradeBatch.from_kraken_rest_api_response(pair=self.pair, trades=trades)
 
         # update the since_timestamp_ns
         self.since_timestamp_ns = int(float(data['result']['last']))
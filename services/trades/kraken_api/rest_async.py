@@ -0,0 +1,152 @@
+import asyncio
+import time
+from typing import List, Optional
+
+import aiohttp
+from loguru import logger
+
+from .base import TradesAPI
+from .rate_limiter import AdaptivePacer, HostRateLimiter
+from .rest import KrakenRestAPISinglePair
+from .trade import Trade
+from .trade_batch import TradeBatch
+
+
+class KrakenRestAPIAsync(TradesAPI):
+    """
+    Concurrent version of `KrakenRestAPI`.
+
+    Every call to `get_trade_data` fetches the next page of all the pairs that
+    are not done yet at the same time, over one keep-alive HTTP session, and
+    merges the pages by timestamp.
+    """
+
+    # seconds between two logs of the pacing metrics
+    METRICS_LOG_INTERVAL = 30
+
+    def __init__(
+        self,
+        pairs: List[str],
+        last_n_days: int,
+        max_concurrency: int = 8,
+        rate_limit_per_second: float = 1.0,
+        rate_limit_burst: int = 5,
+        request_timeout_seconds: float = 30.0,
+        min_rate_limit_per_second: float = 0.1,
+        max_rate_limit_per_second: float = 2.0,
+    ):
+        self.pairs = pairs
+        self.last_n_days = last_n_days
+        self.max_concurrency = max_concurrency
+        self.request_timeout_seconds = request_timeout_seconds
+
+        # shared by all the pairs, Kraken applies the rate limit per IP.
+        # `rate_limit_per_second` is the starting rate, the pacer adapts it
+        self.pacer = AdaptivePacer(
+            rate=rate_limit_per_second,
+            min_rate=min_rate_limit_per_second,
+            max_rate=max_rate_limit_per_second,
+        )
+        self._rate_limiter = HostRateLimiter(
+            rate=rate_limit_per_second, capacity=rate_limit_burst, pacer=self.pacer
+        )
+        self._last_metrics_log = time.monotonic()
+
+        self.apis = self._create_apis()
+
+        # the session and the semaphore are bound to this loop, so we keep the
+        # same loop alive across calls to `get_trade_data`
+        self._loop = asyncio.new_event_loop()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def get_trade_data(self) -> List[Trade]:
+        """
+        Fetches one page for every pair that is not done yet, concurrently
+
+        Returns:
+            List[Trade]: The trades of all the pages, sorted by timestamp
+        """
+        return self.get_trade_batch().to_trades()
+
+    def get_trade_batch(self) -> TradeBatch:
+        """
+        Fetches one page for every pair that is not done yet, concurrently
+
+        Returns:
+            TradeBatch: The trades of all the pages, sorted by timestamp
+        """
+        apis = [api for api in self.apis if not api.is_done()]
+        pages = self._loop.run_until_complete(self._fetch_pages(apis))
+
+        # each page is already sorted by timestamp, so a k-way merge is enough
+        trades = TradeBatch.merge(pages)
+
+        if time.monotonic() - self._last_metrics_log >= self.METRICS_LOG_INTERVAL:
+            self._last_metrics_log = time.monotonic()
+            logger.info(f'REST pacing: {self.pacer.metrics()}')
+
+        if self.is_done():
+            self.close()
+
+        return trades
+
+    def is_done(self) -> bool:
+        """
+        done only when all the apis are done
+        """
+        return all(api.is_done() for api in self.apis)
+
+    def _create_apis(self) -> List[KrakenRestAPISinglePair]:
+        """
+        One cursor per pair, starting `last_n_days` ago
+        """
+        return [
+            KrakenRestAPISinglePair(
+                pair=pair, last_n_days=self.last_n_days, pacer=self.pacer
+            )
+            for pair in self.pairs
+        ]
+
+    def close(self) -> None:
+        """
+        Closes the HTTP session and the event loop
+        """
+        if self._loop.is_closed():
+            return
+        if self._session is not None:
+            self._loop.run_until_complete(self._session.close())
+            self._session = None
+        self._loop.close()
+
+    async def _fetch_pages(
+        self, apis: List[KrakenRestAPISinglePair]
+    ) -> List[TradeBatch]:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+                headers={'Accept': 'application/json'},
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout_seconds),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        return await asyncio.gather(*[self._fetch_page(api) for api in apis])
+
+    async def _fetch_page(self, api: KrakenRestAPISinglePair) -> TradeBatch:
+        """
+        Sends one request for the pair and moves its cursor forward
+        """
+        async with self._semaphore:
+            await self._rate_limiter.acquire(api.URL)
+            try:
+                async with self._session.get(
+                    api.URL, params=api.request_params()
+                ) as response:
+                    status = response.status
+                    body = await response.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.error(f'Failed to get trades for pair {api.pair}: {e}')
+                self.pacer.on_throttled(repr(e))
+                return TradeBatch.empty()
+
+        return api.handle_response(status, body)
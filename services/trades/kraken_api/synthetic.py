@@ -0,0 +1,162 @@
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from .base import TradesAPI
+from .trade import Trade
+from .trade_batch import TradeBatch
+
+MS_PER_DAY = 24 * 60 * 60 * 1000
+
+
+class SyntheticTradesAPI(TradesAPI):
+    """
+    Deterministic synthetic trades, to load test the pipeline without Kraken.
+
+    Every call returns the trades of the next `batch_interval_ms` of synthetic
+    time, for all the pairs:
+
+    - arrivals are Poisson, at `trades_per_second` on average. From time to time
+      the source enters a burst, where the rate is `burst_multiplier` times the
+      calm rate, for `burst_duration_ms`.
+    - the pairs are picked with Zipf-like weights, so the first pairs of the
+      list are the busy ones, like on a real exchange.
+    - prices follow a geometric random walk per pair with `daily_volatility`.
+
+    The same `seed` and parameters always give the same trades. With
+    `realtime=True` the batches are paced on the wall clock, otherwise they are
+    returned as fast as they can be generated, to find the max throughput.
+    """
+
+    def __init__(
+        self,
+        pairs: List[str],
+        trades_per_second: float,
+        seed: int = 42,
+        duration_seconds: Optional[float] = None,
+        realtime: bool = True,
+        batch_interval_ms: int = 100,
+        burst_probability: float = 0.01,
+        burst_multiplier: float = 10.0,
+        burst_duration_ms: int = 1000,
+        daily_volatility: float = 0.03,
+        start_price: float = 100.0,
+        start_timestamp_ms: Optional[int] = None,
+    ):
+        """
+        Args:
+            pairs: The pairs to generate trades for
+            trades_per_second: Long run average of trades per second, all pairs
+            seed: Seed of the random generator
+            duration_seconds: Synthetic time to generate, forever if None
+            realtime: Whether to pace the batches on the wall clock
+            batch_interval_ms: Synthetic time covered by each batch
+            burst_probability: Probability of a burst starting in each batch
+            burst_multiplier: Rate during a burst, relative to the calm rate
+            burst_duration_ms: Duration of a burst
+            daily_volatility: Standard deviation of the daily log return
+            start_price: Price of all the pairs at the start
+            start_timestamp_ms: Timestamp of the first batch, now if None
+        """
+        self.pairs = pairs
+        self.trades_per_second = trades_per_second
+        self.duration_seconds = duration_seconds
+        self.realtime = realtime
+        self.batch_interval_ms = batch_interval_ms
+        self.burst_probability = burst_probability
+        self.burst_multiplier = burst_multiplier
+        self.daily_volatility = daily_volatility
+
+        self._rng = np.random.default_rng(seed)
+
+        # share of the time spent in bursts, to keep the average rate
+        burst_batches = max(1, burst_duration_ms // batch_interval_ms)
+        burst_share = (
+            burst_probability * burst_batches / (1 + burst_probability * burst_batches)
+        )
+        self._calm_rate = trades_per_second / (
+            1 - burst_share + burst_share * burst_multiplier
+        )
+        self._burst_batches = burst_batches
+        self._burst_left = 0
+
+        weights = 1 / np.arange(1, len(pairs) + 1)
+        self._pair_weights = weights / weights.sum()
+        self._log_price = np.full(len(pairs), np.log(start_price))
+        # per trade volatility, so the daily volatility doesn't depend on the rate
+        trades_per_day = trades_per_second * self._pair_weights * MS_PER_DAY / 1000
+        self._trade_volatility = daily_volatility / np.sqrt(
+            np.maximum(trades_per_day, 1)
+        )
+
+        if start_timestamp_ms is None:
+            start_timestamp_ms = int(time.time() * 1000)
+        self.start_timestamp_ms = start_timestamp_ms
+        self._next_timestamp_ms = start_timestamp_ms
+        self._next_trade_id = 0
+        self._wall_start = time.monotonic()
+
+    def get_trade_data(self) -> List[Trade]:
+        return self.get_trade_batch().to_trades()
+
+    def get_trade_batch(self) -> TradeBatch:
+        """
+        Trades of the next `batch_interval_ms`, sorted by timestamp
+        """
+        start_ms = self._next_timestamp_ms
+        self._next_timestamp_ms += self.batch_interval_ms
+
+        if self.realtime:
+            ahead = (self._next_timestamp_ms - self.start_timestamp_ms) / 1000 - (
+                time.monotonic() - self._wall_start
+            )
+            if ahead > 0:
+                time.sleep(ahead)
+
+        # calm or bursty arrivals
+        if self._burst_left == 0 and self._rng.random() < self.burst_probability:
+            self._burst_left = self._burst_batches
+        rate = self._calm_rate
+        if self._burst_left > 0:
+            rate *= self.burst_multiplier
+            self._burst_left -= 1
+        num_trades = self._rng.poisson(rate * self.batch_interval_ms / 1000)
+
+        timestamp_ms = start_ms + np.sort(
+            self._rng.integers(0, self.batch_interval_ms, num_trades)
+        )
+        pair_index = self._rng.choice(
+            len(self.pairs), size=num_trades, p=self._pair_weights
+        ).astype(np.int32)
+
+        # random walk of the log price, each pair continues from its last price
+        steps = (
+            self._rng.standard_normal(num_trades) * self._trade_volatility[pair_index]
+        )
+        log_price = np.empty(num_trades)
+        for i in np.unique(pair_index):
+            mask = pair_index == i
+            walk = self._log_price[i] + np.cumsum(steps[mask])
+            log_price[mask] = walk
+            self._log_price[i] = walk[-1]
+
+        trade_id = np.arange(
+            self._next_trade_id, self._next_trade_id + num_trades, dtype=np.int64
+        )
+        self._next_trade_id += num_trades
+
+        return TradeBatch(
+            pairs=self.pairs,
+            pair_index=pair_index,
+            price=np.exp(log_price),
+            volume=self._rng.lognormal(mean=-2.0, sigma=1.5, size=num_trades),
+            timestamp_ms=timestamp_ms.astype(np.int64),
+            trade_id=trade_id,
+        )
+
+    def is_done(self) -> bool:
+        if self.duration_seconds is None:
+            return False
+        elapsed_ms = self._next_timestamp_ms - self.start_timestamp_ms
+        return elapsed_ms >= self.duration_seconds * 1000
@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Optional
 
 from pydantic import BaseModel, computed_field
 
@@ -8,6 +9,7 @@ class Trade(BaseModel):
     price: float
     volume: float
     timestamp: datetime  # readable human
+    trade_id: Optional[int] = None  # kraken trade id, unique and increasing per pair
 
     @computed_field
     def timestamp_ms(
@@ -16,11 +18,16 @@ class Trade(BaseModel):
         return int(self.timestamp.timestamp() * 1000)
 
     def to_dict(self) -> dict:
-        return self.model_dump(exclude={'timestamp'})
+        return self.model_dump(exclude={'timestamp', 'trade_id'})
 
     @classmethod
     def from_kraken_rest_api_response(
-        cls, pair: str, price: float, volume: float, timestamp_sec: str
+        cls,
+        pair: str,
+        price: float,
+        volume: float,
+        timestamp_sec: str,
+        trade_id: Optional[int] = None,
     ) -> 'Trade':
         """
         Returns a Trade object from the Kraken REST API response.
@@ -31,6 +38,7 @@ class Trade(BaseModel):
             price: float
             volume: float
             timestamp_sec: float
+            trade_id: int
         """
 
         timestamp_ms = int(float(timestamp_sec) * 1000)
@@ -41,6 +49,7 @@ class Trade(BaseModel):
             volume=volume,
             timestamp=cls._milliseconds2datestr(timestamp_ms),
             timestamp_ms=timestamp_ms,
+            trade_id=trade_id,
         )
 
     @classmethod
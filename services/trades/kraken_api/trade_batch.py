@@ -0,0 +1,272 @@
+import json
+from typing import Iterator, List, Optional, Tuple
+
+import msgspec
+import numpy as np
+from pipeline_shared.serializers import TradeMessage
+
+from .trade import Trade
+
+
+class TradeBatch:
+    """
+    Columnar batch of trades, one NumPy array per field plus a dictionary of
+    pairs, so we don't build one pydantic `Trade` per trade on the hot path.
+
+    `pair_index[i]` is the position of the pair of the i-th trade in `pairs`.
+    """
+
+    def __init__(
+        self,
+        pairs: List[str],
+        pair_index: np.ndarray,
+        price: np.ndarray,
+        volume: np.ndarray,
+        timestamp_ms: np.ndarray,
+        trade_id: np.ndarray,
+    ):
+        self.pairs = pairs
+        self.pair_index = pair_index
+        self.price = price
+        self.volume = volume
+        self.timestamp_ms = timestamp_ms
+        self.trade_id = trade_id
+
+    def __len__(self) -> int:
+        return len(self.timestamp_ms)
+
+    @classmethod
+    def empty(cls) -> 'TradeBatch':
+        return cls.from_columns(
+            pair='',
+            price=np.empty(0, dtype=np.float64),
+            volume=np.empty(0, dtype=np.float64),
+            timestamp_ms=np.empty(0, dtype=np.int64),
+            trade_id=np.empty(0, dtype=np.int64),
+        )
+
+    @classmethod
+    def from_columns(
+        cls,
+        pair: str,
+        price: np.ndarray,
+        volume: np.ndarray,
+        timestamp_ms: np.ndarray,
+        trade_id: Optional[np.ndarray] = None,
+    ) -> 'TradeBatch':
+        """
+        Batch of trades of a single pair
+        """
+        if trade_id is None:
+            trade_id = np.full(len(timestamp_ms), -1, dtype=np.int64)
+        return cls(
+            pairs=[pair],
+            pair_index=np.zeros(len(timestamp_ms), dtype=np.int32),
+            price=np.asarray(price, dtype=np.float64),
+            volume=np.asarray(volume, dtype=np.float64),
+            timestamp_ms=np.asarray(timestamp_ms, dtype=np.int64),
+            trade_id=np.asarray(trade_id, dtype=np.int64),
+        )
+
+    @classmethod
+    def from_kraken_rest_api_response(cls, pair: str, trades: list) -> 'TradeBatch':
+        """
+        Builds the batch straight from the `result[pair]` list of the Kraken REST API
+
+        E.g response:
+            [['76395.00000', '0.01305597', 1731155565.4159515, 's', 'm', '', 75468573], ...]
+        """
+        if not trades:
+            return cls.empty()
+        price, volume, timestamp_sec, _, _, _, trade_id = zip(*trades, strict=True)
+        return cls.from_columns(
+            pair=pair,
+            price=np.array(price, dtype=np.float64),
+            volume=np.array(volume, dtype=np.float64),
+            # same truncation as `int(float(timestamp_sec) * 1000)`
+            timestamp_ms=(np.array(timestamp_sec, dtype=np.float64) * 1000).astype(
+                np.int64
+            ),
+            trade_id=np.array(trade_id, dtype=np.int64),
+        )
+
+    @classmethod
+    def from_kraken_websocket_api_response(cls, trades: List[dict]) -> 'TradeBatch':
+        """
+        Builds the batch straight from the `data` list of a websocket trade message
+
+        E.g message data:
+            [{'symbol': 'BTC/USD', 'side': 'buy', 'price': 76395.0, 'qty': 0.013,
+              'ord_type': 'market', 'trade_id': 75468573,
+              'timestamp': '2024-11-09T12:32:45.415951Z'}, ...]
+        """
+        if not trades:
+            return cls.empty()
+        pairs = sorted({trade['symbol'] for trade in trades})
+        index = {pair: i for i, pair in enumerate(pairs)}
+        return cls(
+            pairs=pairs,
+            pair_index=np.array(
+                [index[trade['symbol']] for trade in trades], dtype=np.int32
+            ),
+            price=np.array([trade['price'] for trade in trades], dtype=np.float64),
+            volume=np.array([trade['qty'] for trade in trades], dtype=np.float64),
+            # kraken timestamps are UTC, numpy wants them without the 'Z'
+            timestamp_ms=np.array(
+                [trade['timestamp'].rstrip('Z') for trade in trades],
+                dtype='datetime64[ms]',
+            ).astype(np.int64),
+            trade_id=np.array(
+                [trade.get('trade_id', -1) for trade in trades], dtype=np.int64
+            ),
+        )
+
+    @classmethod
+    def from_trades(cls, trades: List[Trade]) -> 'TradeBatch':
+        """
+        Converts a list of `Trade` objects, for the clients that still produce them
+        """
+        if not trades:
+            return cls.empty()
+        pairs = sorted({trade.pair for trade in trades})
+        index = {pair: i for i, pair in enumerate(pairs)}
+        return cls(
+            pairs=pairs,
+            pair_index=np.array([index[trade.pair] for trade in trades], np.int32),
+            price=np.array([trade.price for trade in trades], np.float64),
+            volume=np.array([trade.volume for trade in trades], np.float64),
+            timestamp_ms=np.array([trade.timestamp_ms for trade in trades], np.int64),
+            trade_id=np.array(
+                [
+                    trade.trade_id if trade.trade_id is not None else -1
+                    for trade in trades
+                ],
+                np.int64,
+            ),
+        )
+
+    @classmethod
+    def concat(cls, batches: List['TradeBatch']) -> 'TradeBatch':
+        """
+        Concatenates the batches, merging their pair dictionaries
+        """
+        batches = [batch for batch in batches if len(batch) > 0]
+        if not batches:
+            return cls.empty()
+        if len(batches) == 1:
+            return batches[0]
+
+        pairs = sorted({pair for batch in batches for pair in batch.pairs})
+        index = {pair: i for i, pair in enumerate(pairs)}
+        return cls(
+            pairs=pairs,
+            pair_index=np.concatenate(
+                [
+                    np.array([index[pair] for pair in batch.pairs], np.int32)[
+                        batch.pair_index
+                    ]
+                    for batch in batches
+                ]
+            ),
+            price=np.concatenate([batch.price for batch in batches]),
+            volume=np.concatenate([batch.volume for batch in batches]),
+            timestamp_ms=np.concatenate([batch.timestamp_ms for batch in batches]),
+            trade_id=np.concatenate([batch.trade_id for batch in batches]),
+        )
+
+    @classmethod
+    def merge(cls, batches: List['TradeBatch']) -> 'TradeBatch':
+        """
+        Merges batches that are each sorted by timestamp into one sorted batch.
+        The stable sort keeps the order of the batches for equal timestamps, like
+        `heapq.merge`, and finds the sorted runs so it works as a k-way merge.
+        """
+        batch = cls.concat(batches)
+        return batch.take(np.argsort(batch.timestamp_ms, kind='stable'))
+
+    def take(self, index: np.ndarray) -> 'TradeBatch':
+        """
+        New batch with the trades at `index`, or where `index` is True
+        """
+        return TradeBatch(
+            pairs=self.pairs,
+            pair_index=self.pair_index[index],
+            price=self.price[index],
+            volume=self.volume[index],
+            timestamp_ms=self.timestamp_ms[index],
+            trade_id=self.trade_id[index],
+        )
+
+    def to_dicts(self) -> List[dict]:
+        """
+        Same dicts as `Trade.to_dict`
+        """
+        return [
+            {'pair': pair, 'price': price, 'volume': volume, 'timestamp_ms': ts}
+            for pair, price, volume, ts in zip(
+                [self.pairs[i] for i in self.pair_index.tolist()],
+                self.price.tolist(),
+                self.volume.tolist(),
+                self.timestamp_ms.tolist(),
+                strict=True,
+            )
+        ]
+
+    def to_trades(self) -> List[Trade]:
+        """
+        Converts the batch back to `Trade` objects
+        """
+        return [
+            Trade.from_kraken_rest_api_response(
+                pair=self.pairs[pair_index],
+                price=price,
+                volume=volume,
+                timestamp_sec=timestamp_ms / 1000,
+                trade_id=trade_id if trade_id >= 0 else None,
+            )
+            for pair_index, price, volume, timestamp_ms, trade_id in zip(
+                self.pair_index.tolist(),
+                self.price.tolist(),
+                self.volume.tolist(),
+                self.timestamp_ms.tolist(),
+                self.trade_id.tolist(),
+                strict=True,
+            )
+        ]
+
+    def serialize(self, serialization: str = 'json') -> Iterator[Tuple[bytes, bytes]]:
+        """
+        Kafka (key, value) of every trade. The key is the pair and the value is
+        built straight from the columns, either the json of `Trade.to_dict` or,
+        with `serialization='msgpack'`, the `TradeMessage` struct of
+        `pipeline_shared.serializers`.
+        """
+        keys = [pair.encode() for pair in self.pairs]
+        columns = zip(
+            self.pair_index.tolist(),
+            self.price.tolist(),
+            self.volume.tolist(),
+            self.timestamp_ms.tolist(),
+            strict=True,
+        )
+
+        if serialization == 'msgpack':
+            encode = msgspec.msgpack.Encoder().encode
+            for pair_index, price, volume, timestamp_ms in columns:
+                yield (
+                    keys[pair_index],
+                    encode(
+                        TradeMessage(
+                            self.pairs[pair_index], price, volume, timestamp_ms
+                        )
+                    ),
+                )
+            return
+
+        pairs_json = [json.dumps(pair).encode() for pair in self.pairs]
+        for pair_index, price, volume, timestamp_ms in columns:
+            yield (
+                keys[pair_index],
+                b'{"pair":%b,"price":%r,"volume":%r,"timestamp_ms":%d}'
+                % (pairs_json[pair_index], price, volume, timestamp_ms),
+            )
@@ -1,11 +1,13 @@
 import json
 from typing import List
 
+import orjson
 from loguru import logger
 from websocket import create_connection
 
 from .base import TradesAPI
 from .trade import Trade
+from .trade_batch import TradeBatch
 
 
 class KrakenWebsocketApi(TradesAPI):
@@ -28,38 +30,49 @@ class KrakenWebsocketApi(TradesAPI):
         """
         Fetch the trade data from the Kraken websocket APIs and return a list of Trade objects
         """
-        logger.info(f'Fetching trade data for pairs: {self.pairs}')
+        trade_data = self._get_trade_message()
+
+        trades = [
+            Trade(
+                pair=trade['symbol'],
+                price=trade['price'],
+                volume=trade['qty'],
+                timestamp=trade['timestamp'],
+            )
+            for trade in trade_data
+        ]
+
+        return trades
+
+    def get_trade_batch(self) -> TradeBatch:
+        """
+        Fetch the trade data from the Kraken websocket APIs and return it as a batch
+        """
+        return TradeBatch.from_kraken_websocket_api_response(self._get_trade_message())
+
+    def _get_trade_message(self) -> List[dict]:
+        """
+        Reads messages until we get one with trade data, and returns its data
+        """
+        logger.debug(f'Fetching trade data for pairs: {self.pairs}')
 
         # Keep reading messages until we get trade data
         while True:
             data = self._ws_client.recv()
-            data_dict = json.loads(data)
+            data_dict = orjson.loads(data)
 
             # Skip heartbeat messages
             if data_dict.get('channel') == 'heartbeat':
-                logger.info('HEARTBEAT')
+                logger.debug('HEARTBEAT')
                 continue
 
             # Check if the message contains trade data
             if 'data' in data_dict:
-                trade_data = data_dict['data']
-                break
+                return data_dict['data']
             else:
                 logger.warning('Received message without trade data')
                 continue
 
-        trades = [
-            Trade(
-                pair=trade['symbol'],
-                price=trade['price'],
-                volume=trade['qty'],
-                timestamp=trade['timestamp'],
-            )
-            for trade in trade_data
-        ]
-
-        return trades
-
     def is_done(self) -> bool:
         """
         Check if the websocket connection is done
@@ -0,0 +1,329 @@
+import asyncio
+import json
+import queue
+import random
+import threading
+from typing import Dict, List, Optional
+
+import aiohttp
+import numpy as np
+import orjson
+from loguru import logger
+from websockets.asyncio.client import ClientConnection, connect
+from websockets.exceptions import WebSocketException
+
+from .base import TradesAPI
+from .rate_limiter import AdaptivePacer, HostRateLimiter
+from .rest import KrakenRestAPISinglePair
+from .trade import Trade
+from .trade_batch import TradeBatch
+
+
+class KrakenWebsocketAPIAsync(TradesAPI):
+    """
+    Asyncio websocket client for Kraken's real-time trade data API.
+
+    The pairs are split over `pairs_per_connection` sized connections, that run
+    in an event loop in a background thread and push the trades to a queue, so
+    the connections keep reading while the main thread pushes to Kafka.
+
+    Every connection reconnects with exponential backoff and jitter when it is
+    closed or when no message (trades or heartbeats) arrives for
+    `heartbeat_timeout_seconds`. After a reconnect the trades missed in between
+    are fetched from the REST `Trades` endpoint, starting at the last trade seen
+    of every pair, and the trades already seen are dropped by trade id.
+    """
+
+    URL = 'wss://ws.kraken.com/v2'
+
+    def __init__(
+        self,
+        pairs: List[str],
+        pairs_per_connection: int = 10,
+        heartbeat_timeout_seconds: float = 10.0,
+        reconnect_min_backoff_seconds: float = 1.0,
+        reconnect_max_backoff_seconds: float = 60.0,
+        resume_from_ms: Optional[Dict[str, int]] = None,
+        rate_limit_per_second: float = 1.0,
+        rate_limit_burst: int = 5,
+        min_rate_limit_per_second: float = 0.1,
+        max_rate_limit_per_second: float = 2.0,
+        request_timeout_seconds: float = 30.0,
+    ):
+        """
+        Args:
+            pairs: The pairs to subscribe to
+            pairs_per_connection: Max number of pairs subscribed on one connection
+            heartbeat_timeout_seconds: Max time without messages before reconnecting
+            reconnect_min_backoff_seconds: Delay before the first reconnect attempt
+            reconnect_max_backoff_seconds: Max delay between reconnect attempts
+            resume_from_ms: Timestamp of the last trade already pushed per pair,
+                e.g after a restart. These pairs are backfilled on the first
+                connection as well.
+            rate_limit_per_second: Rate limit of the REST requests of the gap fill
+            rate_limit_burst: Max burst of REST requests of the gap fill
+            min_rate_limit_per_second: Min rate the gap fill slows down to when
+                throttled
+            max_rate_limit_per_second: Max rate the gap fill speeds up to
+            request_timeout_seconds: Timeout of the REST requests of the gap fill
+        """
+        self.pairs = pairs
+        self.pairs_per_connection = pairs_per_connection
+        self.heartbeat_timeout_seconds = heartbeat_timeout_seconds
+        self.reconnect_min_backoff_seconds = reconnect_min_backoff_seconds
+        self.reconnect_max_backoff_seconds = reconnect_max_backoff_seconds
+        self.request_timeout_seconds = request_timeout_seconds
+        self.rate_limit_per_second = rate_limit_per_second
+        self.rate_limit_burst = rate_limit_burst
+        self.pacer = AdaptivePacer(
+            rate=rate_limit_per_second,
+            min_rate=min_rate_limit_per_second,
+            max_rate=max_rate_limit_per_second,
+        )
+
+        # last trade seen per pair, to know where the gaps start and to drop the
+        # trades we get twice, from the REST API and from the websocket
+        self.last_timestamp_ms: Dict[str, int] = dict(resume_from_ms or {})
+        self.last_trade_id: Dict[str, int] = {}
+
+        self._queue: queue.Queue = queue.Queue()
+        self._error: Optional[BaseException] = None
+        # the event loop of the connections and its main task, to close them
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._main_task: Optional[asyncio.Task] = None
+        self._started = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name='kraken-websocket', daemon=True
+        )
+        self._thread.start()
+
+    def get_trade_data(self) -> List[Trade]:
+        """
+        Trades received since the last call, waits for at least one message
+        """
+        return self.get_trade_batch().to_trades()
+
+    def get_trade_batch(self, timeout_seconds: float = 1.0) -> TradeBatch:
+        """
+        Trades received since the last call, from all the connections.
+        Waits up to `timeout_seconds` for the first message, so the caller can
+        check `is_done` from time to time even when the market is quiet.
+
+        Returns:
+            TradeBatch: The trades, sorted by timestamp
+        """
+        try:
+            batches = [self._queue.get(timeout=timeout_seconds)]
+        except queue.Empty:
+            batches = []
+
+        # drain the rest of the queue, so we push bigger batches when we lag
+        while True:
+            try:
+                batches.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        if self._error is not None:
+            raise RuntimeError('Kraken websocket client stopped') from self._error
+
+        return TradeBatch.merge(batches)
+
+    def is_done(self) -> bool:
+        """
+        The live stream is never done
+        """
+        return False
+
+    def close(self) -> None:
+        """
+        Closes the connections and stops the background thread
+        """
+        self._started.wait()
+        self._loop.call_soon_threadsafe(self._main_task.cancel)
+        self._thread.join()
+
+    def _run(self) -> None:
+        try:
+            asyncio.run(self._run_connections())
+        except asyncio.CancelledError:
+            logger.info('Kraken websocket client closed')
+        except BaseException as e:
+            logger.exception('Kraken websocket client stopped')
+            self._error = e
+            # wake up `get_trade_batch`
+            self._queue.put(TradeBatch.empty())
+
+    async def _run_connections(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._main_task = asyncio.current_task()
+        self._started.set()
+
+        # shared by all the connections, Kraken applies the rate limit per IP
+        self._rate_limiter = HostRateLimiter(
+            rate=self.rate_limit_per_second,
+            capacity=self.rate_limit_burst,
+            pacer=self.pacer,
+        )
+        async with aiohttp.ClientSession(
+            headers={'Accept': 'application/json'},
+            timeout=aiohttp.ClientTimeout(total=self.request_timeout_seconds),
+        ) as session:
+            await asyncio.gather(
+                *[
+                    self._run_connection(
+                        self.pairs[i : i + self.pairs_per_connection], session
+                    )
+                    for i in range(0, len(self.pairs), self.pairs_per_connection)
+                ]
+            )
+
+    async def _run_connection(
+        self, pairs: List[str], session: aiohttp.ClientSession
+    ) -> None:
+        """
+        Keeps one connection subscribed to the pairs, reconnecting forever
+        """
+        attempt = 0
+        while True:
+            try:
+                async with connect(self.URL) as ws:
+                    await self._subscribe(ws, pairs)
+                    logger.info(f'Subscribed to the trades of {pairs}')
+
+                    # new trades are buffered by the connection in the meantime
+                    await self._fill_gaps(pairs, session)
+
+                    while True:
+                        message = await asyncio.wait_for(
+                            ws.recv(), timeout=self.heartbeat_timeout_seconds
+                        )
+                        self._process_message(message)
+                        # only a connection that delivers messages resets the backoff
+                        attempt = 0
+
+            except (WebSocketException, OSError, asyncio.TimeoutError) as e:
+                delay = min(
+                    self.reconnect_max_backoff_seconds,
+                    self.reconnect_min_backoff_seconds * 2**attempt,
+                )
+                # full jitter, so the connections don't reconnect all at once
+                delay = random.uniform(0, delay)
+                attempt += 1
+                logger.warning(
+                    f'Websocket connection for {pairs} lost ({e!r}), '
+                    f'reconnecting in {delay:.1f}s (attempt {attempt})'
+                )
+                await asyncio.sleep(delay)
+
+    async def _subscribe(self, ws: ClientConnection, pairs: List[str]) -> None:
+        await ws.send(
+            json.dumps(
+                {
+                    'method': 'subscribe',
+                    'params': {
+                        'channel': 'trade',
+                        'symbol': pairs,
+                        # the REST gap fill already covers the snapshot trades
+                        'snapshot': False,
+                    },
+                }
+            )
+        )
+
+    def _process_message(self, message: str) -> None:
+        """
+        Pushes the trades of a message. A malformed message is logged and
+        skipped, so one bad frame doesn't stop the connection.
+        """
+        try:
+            data = orjson.loads(message)
+        except orjson.JSONDecodeError as e:
+            logger.error(f'Skipping a message that is not json: {e}')
+            return
+        if not isinstance(data, dict):
+            logger.warning(f'Skipping an unexpected message: {message!r}')
+            return
+
+        # heartbeats only matter for the timeout
+        if data.get('channel') != 'trade' or 'data' not in data:
+            if data.get('method') == 'subscribe' and not data.get('success', True):
+                logger.error(f'Failed to subscribe: {data.get("error")}')
+            return
+
+        try:
+            trades = TradeBatch.from_kraken_websocket_api_response(data['data'])
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error(f'Skipping a malformed trade message: {e!r}')
+            return
+        self._push(trades)
+
+    async def _fill_gaps(self, pairs: List[str], session: aiohttp.ClientSession):
+        """
+        Fetches from the REST API the trades of every pair since the last one we
+        saw, and pushes the ones we don't have yet.
+
+        Network errors and throttling slow the pacer down and the page is asked
+        again after its backoff, so the gap is not left open. Only a permanent
+        Kraken error gives up on the pair.
+        """
+        for pair in pairs:
+            if pair not in self.last_timestamp_ms:
+                # nothing pushed yet, so there is no gap to fill
+                continue
+
+            since_ms = self.last_timestamp_ms[pair]
+            if pair not in self.last_trade_id:
+                # resumed from a timestamp, the trades of that ms are already pushed
+                since_ms += 1
+            api = KrakenRestAPISinglePair(
+                pair=pair,
+                last_n_days=0,
+                since_timestamp_ns=since_ms * 1_000_000,
+                pacer=self.pacer,
+            )
+            num_trades = 0
+            while not api.is_done():
+                await self._rate_limiter.acquire(api.URL)
+                try:
+                    async with session.get(
+                        api.URL, params=api.request_params()
+                    ) as response:
+                        status, body = response.status, await response.read()
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    logger.warning(f'Failed to fill the gap of pair {pair}: {e!r}')
+                    self.pacer.on_throttled(repr(e))
+                    continue
+
+                num_throttled = self.pacer.num_throttled
+                trades = api.handle_response(status, body)
+                if len(trades) == 0 and self.pacer.num_throttled == num_throttled:
+                    # nothing new and not throttled, the gap is filled
+                    break
+                num_trades += self._push(trades)
+
+            logger.info(f'Filled the gap of pair {pair} with {num_trades} trades')
+
+    def _push(self, trades: TradeBatch) -> int:
+        """
+        Pushes the trades we haven't pushed yet and moves the last trade seen of
+        their pairs forward
+
+        Returns:
+            int: Number of trades pushed
+        """
+        last_trade_id = np.array(
+            [self.last_trade_id.get(pair, -1) for pair in trades.pairs], np.int64
+        )
+        trades = trades.take(trades.trade_id > last_trade_id[trades.pair_index])
+        if len(trades) == 0:
+            return 0
+
+        for i, pair in enumerate(trades.pairs):
+            mask = trades.pair_index == i
+            if mask.any():
+                self.last_trade_id[pair] = int(trades.trade_id[mask].max())
+                self.last_timestamp_ms[pair] = int(trades.timestamp_ms[mask].max())
+
+        self._queue.put(trades)
+        return len(trades)
@@ -0,0 +1,228 @@
+import json
+import time
+from collections import deque
+from typing import Optional
+
+import msgspec
+import numpy as np
+from kraken_api.trade_batch import TradeBatch
+from loguru import logger
+from pipeline_shared.instrumentation import Metrics
+from pipeline_shared.serializers import TradeMessage
+from quixstreams.kafka import Producer
+
+
+def producer_extra_config(
+    linger_ms: int,
+    batch_size: int,
+    compression_type: str,
+    queue_max_messages: int,
+) -> dict:
+    """
+    librdkafka settings for the batching and compression of the producer
+
+    Args:
+        linger_ms: How long librdkafka waits to fill a batch before sending it
+        batch_size: Max size in bytes of a batch of messages for one partition
+        compression_type: Compression codec of the batches, e.g 'lz4' or 'zstd'
+        queue_max_messages: Max number of messages in the local producer queue
+    Returns:
+        dict: To be passed as `producer_extra_config` to the `Application`
+    """
+    return {
+        'linger.ms': linger_ms,
+        'batch.size': batch_size,
+        'compression.type': compression_type,
+        'queue.buffering.max.messages': queue_max_messages,
+    }
+
+
+class TradesProducer:
+    """
+    Pushes batches of trades to a Kafka topic without blocking on every message.
+
+    librdkafka batches and compresses the messages in the background, and we
+    count the messages in flight with the delivery callbacks, so when the broker
+    is slower than the source we wait for deliveries instead of filling the
+    local queue until `produce` raises `BufferError`.
+
+    It also keeps throughput and delivery latency stats, logged at most every
+    `log_interval_seconds` and reported in full when the producer is closed.
+
+    With `heartbeat_interval_seconds`, it also pushes a heartbeat per pair at
+    that interval, a message without trade and with the current time, so the
+    candles of quiet pairs close on time instead of waiting for the next trade.
+    """
+
+    # delivery latencies kept to compute the percentiles of the report
+    LATENCY_SAMPLES = 100_000
+    # log one out of every N delivery errors
+    LOG_ERROR_EVERY = 1000
+
+    def __init__(
+        self,
+        producer: Producer,
+        topic: str,
+        max_in_flight_messages: int = 50_000,
+        log_interval_seconds: float = 10.0,
+        flush_timeout_seconds: float = 30.0,
+        serialization: str = 'json',
+        heartbeat_interval_seconds: float = 0.0,
+        metrics: Optional[Metrics] = None,
+    ):
+        self.producer = producer
+        self.topic = topic
+        self.serialization = serialization
+        self.max_in_flight_messages = max_in_flight_messages
+        self.log_interval_seconds = log_interval_seconds
+        self.flush_timeout_seconds = flush_timeout_seconds
+        self.heartbeat_interval_seconds = heartbeat_interval_seconds
+
+        self.in_flight = 0
+        self.produced = 0
+        self.delivered = 0
+        self.failed = 0
+        self.bytes_produced = 0
+        self.backpressure_seconds = 0.0
+        self.latencies_ms: deque = deque(maxlen=self.LATENCY_SAMPLES)
+
+        self._start = time.monotonic()
+        self._last_log = self._start
+        self._produced_at_last_log = 0
+        self._pairs: set = set()
+        self._last_heartbeat = self._start
+
+        self.metrics = metrics or Metrics('trades')
+        self._delivery_latency = self.metrics.histogram(
+            'delivery_latency_seconds', 'From produce to delivery ack'
+        )
+        self._failed = self.metrics.counter('delivery_failures_total', 'Failed')
+        self._backpressure = self.metrics.counter(
+            'backpressure_seconds_total', 'Time waiting for deliveries'
+        )
+
+    def produce_batch(self, trades: TradeBatch) -> None:
+        """
+        Queues all the trades of the batch in the producer, keyed by pair
+
+        Args:
+            trades: The trades to push to the topic
+        """
+        for key, value in trades.serialize(self.serialization):
+            if self.in_flight >= self.max_in_flight_messages:
+                self._wait_for_deliveries()
+
+            self.producer.produce(
+                topic=self.topic, value=value, key=key, on_delivery=self._on_delivery
+            )
+            self.in_flight += 1
+            self.produced += 1
+            self.bytes_produced += len(value)
+
+        if self.heartbeat_interval_seconds > 0:
+            # the pairs of a batch can list pairs without trades, e.g the empty
+            # pair of `TradeBatch.empty` after a merge
+            self._pairs.update(
+                trades.pairs[i] for i in np.unique(trades.pair_index).tolist()
+            )
+            self._maybe_heartbeat()
+        self.metrics.messages_out.inc(len(trades))
+        if self.metrics.enabled:
+            now = time.time()
+            for timestamp_ms in trades.timestamp_ms.tolist():
+                self.metrics.event_to_emit.observe(max(now - timestamp_ms / 1000, 0.0))
+        self._maybe_log()
+
+    def close(self) -> None:
+        """
+        Flushes the messages still in the producer queue and logs the report
+        """
+        remaining = self.producer.flush(timeout=self.flush_timeout_seconds)
+        if remaining > 0:
+            logger.error(
+                f'{remaining} messages were not delivered after '
+                f'{self.flush_timeout_seconds}s'
+            )
+        logger.info(self.report())
+
+    def report(self) -> str:
+        """
+        Throughput and delivery latency since the producer was created
+        """
+        elapsed = max(time.monotonic() - self._start, 1e-9)
+        report = (
+            f'Producer report for topic {self.topic}: '
+            f'produced={self.produced} delivered={self.delivered} '
+            f'failed={self.failed} elapsed={elapsed:.1f}s '
+            f'throughput={self.delivered / elapsed:,.0f} msg/s '
+            f'({self.bytes_produced / elapsed / 1e6:.2f} MB/s uncompressed) '
+            f'backpressure={self.backpressure_seconds:.1f}s'
+        )
+        if self.latencies_ms:
+            p50, p99 = np.percentile(self.latencies_ms, [50, 99])
+            report += (
+                f' latency_ms p50={p50:.0f} p99={p99:.0f} '
+                f'max={max(self.latencies_ms):.0f}'
+            )
+        return report
+
+    def _wait_for_deliveries(self) -> None:
+        """
+        Serves delivery callbacks until the messages in flight are under the limit
+        """
+        start = time.monotonic()
+        while self.in_flight >= self.max_in_flight_messages:
+            self.producer.poll(timeout=0.1)
+        waited = time.monotonic() - start
+        self.backpressure_seconds += waited
+        self._backpressure.inc(waited)
+
+    def _on_delivery(self, err, msg) -> None:
+        self.in_flight -= 1
+        if err is not None:
+            self.failed += 1
+            self._failed.inc()
+            # failures come in bursts, so we only log a sample of them
+            if self.failed % self.LOG_ERROR_EVERY == 1:
+                logger.error(f'Failed to deliver message to {self.topic}: {err}')
+            return
+
+        self.delivered += 1
+        # without an explicit timestamp the message timestamp is the produce time
+        _, timestamp_ms = msg.timestamp()
+        if timestamp_ms > 0:
+            latency_ms = time.time() * 1000 - timestamp_ms
+            self.latencies_ms.append(latency_ms)
+            self._delivery_latency.observe(latency_ms / 1000)
+
+    def _maybe_heartbeat(self) -> None:
+        now = time.monotonic()
+        if now - self._last_heartbeat < self.heartbeat_interval_seconds:
+            return
+        self._last_heartbeat = now
+
+        timestamp_ms = int(time.time() * 1000)
+        for pair in self._pairs:
+            if self.serialization == 'msgpack':
+                value = msgspec.msgpack.encode(
+                    TradeMessage(pair, 0.0, 0.0, timestamp_ms, heartbeat=True)
+                )
+            else:
+                value = (
+                    b'{"pair":%b,"price":0.0,"volume":0.0,"timestamp_ms":%d,'
+                    b'"heartbeat":true}' % (json.dumps(pair).encode(), timestamp_ms)
+                )
+            # not counted as produced, the stats are about the trades
+            self.producer.produce(topic=self.topic, value=value, key=pair.encode())
+
+    def _maybe_log(self) -> None:
+        now = time.monotonic()
+        if now - self._last_log < self.log_interval_seconds:
+            return
+        rate = (self.produced - self._produced_at_last_log) / (now - self._last_log)
+        logger.info(
+            f'Pushed {self.produced} trades to kafka topic {self.topic} '
+            f'({rate:,.0f} msg/s, {self.in_flight} in flight, {self.failed} failed)'
+        )
+        self._last_log = now
+        self._produced_at_last_log = self.produced
@@ -1,15 +1,34 @@
+from kraken_api.archive import KrakenArchiveAPI, TradeArchive
+from kraken_api.backfill import KrakenRestAPIBackfill
 from kraken_api.base import TradesAPI
 from kraken_api.mock import KrakenMockAPI
+from kraken_api.rate_limiter import AdaptivePacer
 from kraken_api.rest import KrakenRestAPI
+from kraken_api.rest_async import KrakenRestAPIAsync
+from kraken_api.synthetic import SyntheticTradesAPI
 from kraken_api.websocket import KrakenWebsocketApi
+from kraken_api.websocket_async import KrakenWebsocketAPIAsync
 from loguru import logger
+from pipeline_shared.instrumentation import Metrics
+from producer import TradesProducer, producer_extra_config
 from quixstreams import Application
+from quixstreams.models import TopicConfig
 
 
 def main(
     kafka_broker_address: str,
     kafka_topic: str,
     trades_api: TradesAPI,
+    kafka_linger_ms: int = 100,
+    kafka_batch_size: int = 1_000_000,
+    kafka_compression_type: str = 'lz4',
+    kafka_queue_max_messages: int = 100_000,
+    kafka_max_in_flight_messages: int = 50_000,
+    log_interval_seconds: float = 10.0,
+    kafka_output_serialization: str = 'json',
+    heartbeat_interval_seconds: float = 0.0,
+    metrics_port: int = 0,
+    kafka_topic_partitions: int = 1,
 ):
     """
     Main function to start the trades service
@@ -20,6 +39,19 @@ def main(
         kafka_broker_address: str
         kafka_topic: str
         kraken_api: TradesAPI
+        kafka_linger_ms: How long the producer waits to fill a batch
+        kafka_batch_size: Max size in bytes of a batch
+        kafka_compression_type: Compression codec of the batches
+        kafka_queue_max_messages: Max number of messages in the producer queue
+        kafka_max_in_flight_messages: Max number of messages waiting for delivery
+        log_interval_seconds: Min time between two progress logs
+        kafka_output_serialization: Wire format of the trades, 'json' or 'msgpack'
+        heartbeat_interval_seconds: Interval of the heartbeats per pair, 0 for none
+        metrics_port: Port of the Prometheus metrics endpoint, 0 turns the
+            metrics off
+        kafka_topic_partitions: Partitions of the topic, if it does not exist yet.
+            The trades are keyed by pair, so the candles service can run up
+            to that many replicas
     Returns:
         None
     """
@@ -28,24 +60,44 @@ def main(
     # Create an Application instance with Kafka config
     app = Application(
         broker_address=kafka_broker_address,
+        producer_extra_config=producer_extra_config(
+            linger_ms=kafka_linger_ms,
+            batch_size=kafka_batch_size,
+            compression_type=kafka_compression_type,
+            queue_max_messages=kafka_queue_max_messages,
+        ),
     )
 
     # define topic
-    topic = app.topic(name=kafka_topic, value_serializer='json')
+    topic = app.topic(
+        name=kafka_topic,
+        value_serializer='json',
+        config=TopicConfig(num_partitions=kafka_topic_partitions, replication_factor=1),
+    )
+
+    metrics = Metrics('trades', port=metrics_port)
+    metrics.start()
 
     # Create a Producer instance
     with app.get_producer() as producer:
-        while not trades_api.is_done():
-            logger.info('Getting trades from Kraken')
-            trades = trades_api.get_trade_data()
-
-            for trade in trades:
-                trade = trade.to_dict()
-                logger.debug(f'trade: {trade}')
-                message = topic.serialize(key=trade['pair'], value=trade)
-                producer.produce(topic=topic.name, value=message.value, key=message.key)
+        trades_producer = TradesProducer(
+            producer=producer,
+            topic=topic.name,
+            max_in_flight_messages=kafka_max_in_flight_messages,
+            log_interval_seconds=log_interval_seconds,
+            serialization=kafka_output_serialization,
+            heartbeat_interval_seconds=heartbeat_interval_seconds,
+            metrics=metrics,
+        )
+        try:
+            while not trades_api.is_done():
+                trades = trades_api.get_trade_batch()
 
-                logger.info(f'Pushed trade to kafka topic: {trade}')
+                # keys and values are serialized straight from the columns of the
+                # batch, and librdkafka batches and compresses them
+                trades_producer.produce_batch(trades)
+        finally:
+            trades_producer.close()
 
 
 if __name__ == '__main__':
@@ -54,13 +106,79 @@ if __name__ == '__main__':
 
     sys.path.append(str(Path(__file__).parent))
     from config import config
+    from shards import ShardCoordinator
 
-    if config.data_source == 'live':
+    if config.data_source == 'live' and config.num_shards > 1:
+        # each shard process runs its own `main`
+        ShardCoordinator(
+            pairs=config.pairs,
+            num_shards=config.num_shards,
+            max_restarts=config.shard_max_restarts,
+            restart_window_seconds=config.shard_restart_window_seconds,
+        ).run()
+        sys.exit(0)
+    elif config.data_source == 'live' and config.websocket_client == 'async':
+        kraken_api = KrakenWebsocketAPIAsync(
+            pairs=config.pairs,
+            pairs_per_connection=config.websocket_pairs_per_connection,
+            heartbeat_timeout_seconds=config.websocket_heartbeat_timeout_seconds,
+            reconnect_max_backoff_seconds=config.websocket_reconnect_max_backoff_seconds,
+            rate_limit_per_second=config.rest_rate_limit_per_second,
+            rate_limit_burst=config.rest_rate_limit_burst,
+            min_rate_limit_per_second=config.rest_min_rate_limit_per_second,
+            max_rate_limit_per_second=config.rest_max_rate_limit_per_second,
+        )
+    elif config.data_source == 'live':
         kraken_api = KrakenWebsocketApi(pairs=config.pairs)
+    elif config.data_source == 'historical' and config.rest_fetch_mode == 'sliced':
+        kraken_api = KrakenRestAPIBackfill(
+            pairs=config.pairs,
+            last_n_days=config.last_n_days,
+            slices_per_pair=config.backfill_slices_per_pair,
+            checkpoint_dir=config.backfill_checkpoint_dir,
+            archive=TradeArchive(config.archive_dir) if config.archive_dir else None,
+            max_concurrency=config.rest_max_concurrency,
+            rate_limit_per_second=config.rest_rate_limit_per_second,
+            rate_limit_burst=config.rest_rate_limit_burst,
+            min_rate_limit_per_second=config.rest_min_rate_limit_per_second,
+            max_rate_limit_per_second=config.rest_max_rate_limit_per_second,
+        )
+    elif config.data_source == 'historical' and config.rest_fetch_mode == 'async':
+        kraken_api = KrakenRestAPIAsync(
+            pairs=config.pairs,
+            last_n_days=config.last_n_days,
+            max_concurrency=config.rest_max_concurrency,
+            rate_limit_per_second=config.rest_rate_limit_per_second,
+            rate_limit_burst=config.rest_rate_limit_burst,
+            min_rate_limit_per_second=config.rest_min_rate_limit_per_second,
+            max_rate_limit_per_second=config.rest_max_rate_limit_per_second,
+        )
     elif config.data_source == 'historical':
         kraken_api = KrakenRestAPI(
-            pairs=config.pairs, last_n_days=config.last_n_days
+            pairs=config.pairs,
+            last_n_days=config.last_n_days,
+            pacer=AdaptivePacer(
+                rate=config.rest_rate_limit_per_second,
+                min_rate=config.rest_min_rate_limit_per_second,
+                max_rate=config.rest_max_rate_limit_per_second,
+            ),
         )  # TODO implement as a Quix streams stateful Source, now the backfilling is done in the to-feature-store service
+    elif config.data_source == 'archive':
+        kraken_api = KrakenArchiveAPI(
+            pairs=config.pairs,
+            last_n_days=config.last_n_days,
+            archive=TradeArchive(config.archive_dir),
+        )
+    elif config.data_source == 'synthetic':
+        kraken_api = SyntheticTradesAPI(
+            pairs=config.pairs,
+            trades_per_second=config.synthetic_trades_per_second,
+            seed=config.synthetic_seed,
+            duration_seconds=config.synthetic_duration_seconds,
+            realtime=config.synthetic_realtime,
+            burst_probability=config.synthetic_burst_probability,
+            burst_multiplier=config.synthetic_burst_multiplier,
+        )
     elif config.data_source == 'test':
         kraken_api = KrakenMockAPI(pairs=config.pairs)
     else:
@@ -70,4 +188,17 @@ if __name__ == '__main__':
         kafka_broker_address=config.kafka_broker_address,
         kafka_topic=config.kafka_topic,
         trades_api=kraken_api,
+        kafka_linger_ms=config.kafka_linger_ms,
+        kafka_batch_size=config.kafka_batch_size,
+        kafka_compression_type=config.kafka_compression_type,
+        kafka_queue_max_messages=config.kafka_queue_max_messages,
+        kafka_max_in_flight_messages=config.kafka_max_in_flight_messages,
+        log_interval_seconds=config.log_interval_seconds,
+        kafka_output_serialization=config.kafka_output_serialization,
+        # only the live trades follow the clock
+        heartbeat_interval_seconds=config.heartbeat_interval_seconds
+        if config.data_source == 'live'
+        else 0.0,
+        metrics_port=config.metrics_port,
+        kafka_topic_partitions=config.kafka_topic_partitions,
     )
@@ -0,0 +1,246 @@
+import multiprocessing
+import signal
+import sys
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+from kraken_api.base import TradesAPI
+from kraken_api.trade import Trade
+from kraken_api.trade_batch import TradeBatch
+from kraken_api.websocket_async import KrakenWebsocketAPIAsync
+from loguru import logger
+
+
+class LastSeenTradesAPI(TradesAPI):
+    """
+    Wraps the trades API of a shard and publishes the timestamp of the last
+    trade of every pair to the coordinator, so a restarted shard can fill the
+    gap from there.
+
+    The timestamps are published one interval late, so the trades before them
+    have been delivered to Kafka by then. A restart can push some trades twice,
+    but it doesn't leave holes.
+    """
+
+    def __init__(
+        self,
+        trades_api: TradesAPI,
+        last_seen_ms: Dict[str, int],
+        publish_interval_seconds: float = 1.0,
+    ):
+        self.trades_api = trades_api
+        self.last_seen_ms = last_seen_ms
+        self.publish_interval_seconds = publish_interval_seconds
+        self._pending: Dict[str, int] = {}
+        self._previous: Dict[str, int] = {}
+        self._last_publish = 0.0
+
+    def get_trade_data(self) -> List[Trade]:
+        return self.get_trade_batch().to_trades()
+
+    def get_trade_batch(self) -> TradeBatch:
+        trades = self.trades_api.get_trade_batch()
+        for i, pair in enumerate(trades.pairs):
+            mask = trades.pair_index == i
+            if mask.any():
+                self._pending[pair] = int(trades.timestamp_ms[mask].max())
+
+        # one round trip to the manager per interval, not per batch
+        now = time.monotonic()
+        if now - self._last_publish >= self.publish_interval_seconds:
+            if self._previous:
+                self.last_seen_ms.update(self._previous)
+            self._previous = self._pending
+            self._pending = {}
+            self._last_publish = now
+
+        return trades
+
+    def is_done(self) -> bool:
+        return self.trades_api.is_done()
+
+
+def run_shard(shard_id: int, pairs: List[str], last_seen_ms: Dict[str, int]) -> None:
+    """
+    Entry point of a shard process: live trades of `pairs` to Kafka, resuming
+    from the last trades seen by the previous process of the shard, if any.
+    """
+    from config import config
+    from run import main
+
+    # terminate() sends SIGTERM, exit through the `finally` of `main` so the
+    # producer is flushed
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    logger.info(f'Starting shard {shard_id} with pairs {pairs}')
+
+    trades_api = KrakenWebsocketAPIAsync(
+        pairs=pairs,
+        pairs_per_connection=config.websocket_pairs_per_connection,
+        heartbeat_timeout_seconds=config.websocket_heartbeat_timeout_seconds,
+        reconnect_max_backoff_seconds=config.websocket_reconnect_max_backoff_seconds,
+        resume_from_ms={
+            pair: last_seen_ms[pair] for pair in pairs if pair in last_seen_ms
+        },
+        rate_limit_per_second=config.rest_rate_limit_per_second,
+        rate_limit_burst=config.rest_rate_limit_burst,
+        min_rate_limit_per_second=config.rest_min_rate_limit_per_second,
+        max_rate_limit_per_second=config.rest_max_rate_limit_per_second,
+    )
+
+    main(
+        kafka_broker_address=config.kafka_broker_address,
+        kafka_topic=config.kafka_topic,
+        trades_api=LastSeenTradesAPI(trades_api, last_seen_ms),
+        kafka_linger_ms=config.kafka_linger_ms,
+        kafka_batch_size=config.kafka_batch_size,
+        kafka_compression_type=config.kafka_compression_type,
+        kafka_queue_max_messages=config.kafka_queue_max_messages,
+        kafka_max_in_flight_messages=config.kafka_max_in_flight_messages,
+        log_interval_seconds=config.log_interval_seconds,
+        kafka_output_serialization=config.kafka_output_serialization,
+        heartbeat_interval_seconds=config.heartbeat_interval_seconds,
+        # one endpoint per shard process
+        metrics_port=config.metrics_port + shard_id if config.metrics_port else 0,
+        kafka_topic_partitions=config.kafka_topic_partitions,
+    )
+
+
+class ShardCoordinator:
+    """
+    Spreads the pairs over `num_shards` worker processes, each one with its own
+    websocket connections and Kafka producer, and keeps them running.
+
+    A shard that dies is restarted with the same pairs and fills the gap from
+    the last trades it pushed. A shard that dies more than `max_restarts` times
+    within `restart_window_seconds` is given up, and its pairs are rebalanced
+    over the shards that are still healthy, which are restarted with their new
+    pairs.
+    """
+
+    def __init__(
+        self,
+        pairs: List[str],
+        num_shards: int,
+        max_restarts: int = 5,
+        restart_window_seconds: float = 300.0,
+        check_interval_seconds: float = 1.0,
+        process_factory: Optional[Callable[..., multiprocessing.Process]] = None,
+    ):
+        """
+        Args:
+            pairs: The pairs to spread over the shards
+            num_shards: Number of worker processes, at most one per pair
+            max_restarts: Max number of restarts of a shard within
+                `restart_window_seconds` before its pairs are rebalanced
+            restart_window_seconds: Window over which the restarts are counted
+            check_interval_seconds: Time between two checks of the shards
+            process_factory: Creates the process of a shard, as
+                `multiprocessing.Process`. Defaults to a spawned process
+        """
+        self.pairs = pairs
+        self.num_shards = min(num_shards, len(pairs))
+        self.max_restarts = max_restarts
+        self.restart_window_seconds = restart_window_seconds
+        self.check_interval_seconds = check_interval_seconds
+
+        # spawn, so the workers don't inherit the threads of the parent
+        self._context = multiprocessing.get_context('spawn')
+        self._manager = self._context.Manager()
+        self.last_seen_ms = self._manager.dict()
+        self._process_factory = process_factory or self._context.Process
+
+        # round robin, so the busy pairs at the top of the list are spread out
+        self.assignment: Dict[int, List[str]] = {
+            shard_id: self.pairs[shard_id :: self.num_shards]
+            for shard_id in range(self.num_shards)
+        }
+        self._processes: Dict[int, multiprocessing.Process] = {}
+        self._failures: Dict[int, deque] = {
+            shard_id: deque() for shard_id in self.assignment
+        }
+
+    def run(self) -> None:
+        """
+        Starts the shards and supervises them until interrupted
+        """
+        for shard_id in self.assignment:
+            self._start(shard_id)
+
+        try:
+            while True:
+                time.sleep(self.check_interval_seconds)
+                self._check_shards()
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        """
+        Terminates all the shards
+        """
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in self._processes.values():
+            process.join(timeout=10)
+        self._manager.shutdown()
+
+    def _check_shards(self) -> None:
+        """
+        Restarts or rebalances the shards that died since the last check
+        """
+        for shard_id in list(self.assignment):
+            process = self._processes[shard_id]
+            if not process.is_alive():
+                self._on_shard_died(shard_id, process.exitcode)
+
+    def _start(self, shard_id: int) -> None:
+        process = self._process_factory(
+            target=run_shard,
+            args=(shard_id, self.assignment[shard_id], self.last_seen_ms),
+            name=f'trades-shard-{shard_id}',
+        )
+        process.start()
+        self._processes[shard_id] = process
+
+    def _on_shard_died(self, shard_id: int, exitcode: Optional[int]) -> None:
+        now = time.monotonic()
+        failures = self._failures[shard_id]
+        failures.append(now)
+        while failures and now - failures[0] > self.restart_window_seconds:
+            failures.popleft()
+
+        if len(failures) <= self.max_restarts:
+            logger.warning(
+                f'Shard {shard_id} died with exit code {exitcode}, restarting it'
+            )
+            self._start(shard_id)
+            return
+
+        pairs = self.assignment.pop(shard_id)
+        del self._processes[shard_id]
+        if not self.assignment:
+            raise RuntimeError('All the shards failed, giving up')
+
+        logger.error(
+            f'Shard {shard_id} died {len(failures)} times in '
+            f'{self.restart_window_seconds}s, rebalancing its pairs {pairs}'
+        )
+        self._rebalance(pairs)
+
+    def _rebalance(self, pairs: List[str]) -> None:
+        """
+        Moves the pairs to the shards with the fewest pairs and restarts them
+        """
+        restart = set()
+        for pair in pairs:
+            shard_id = min(self.assignment, key=lambda i: len(self.assignment[i]))
+            self.assignment[shard_id].append(pair)
+            restart.add(shard_id)
+
+        for shard_id in restart:
+            process = self._processes[shard_id]
+            process.terminate()
+            process.join(timeout=10)
+            self._start(shard_id)
@@ -0,0 +1,93 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from kraken_api.rest import KrakenRestAPISinglePair
+
+
+class KrakenTradesStub(BaseHTTPRequestHandler):
+    """
+    Answers like `GET /0/public/Trades`, with one trade every `step_ms` starting
+    at `since` and never past the current time, like the stub of
+    `benchmarks/rest_backfill.py`.
+
+    There are no trades before `first_trade_ms`, like a recently listed pair.
+    `responses` are (status, body) returned before the trades, one per request,
+    to simulate rate limits and errors. `requests` records the (pair, since) of
+    every request.
+    """
+
+    step_ms = 60_000
+    trades_per_page = 1000
+    first_trade_ms = 0
+    responses: list = []
+    requests: list = []
+
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        pair = params['pair'][0]
+        since_ns = int(params['since'][0])
+        self.requests.append((pair, since_ns))
+
+        if self.responses:
+            status, body = self.responses.pop(0)
+        else:
+            status, body = 200, self._trades(pair, since_ns)
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _trades(self, pair: str, since_ns: int) -> bytes:
+        now_ns = time.time_ns()
+        step_ns = self.step_ms * 1_000_000
+        first_trade_ns = self.first_trade_ms * 1_000_000
+        timestamp_ns = max(since_ns, first_trade_ns - step_ns) // step_ns * step_ns
+        trades = []
+        for _ in range(self.trades_per_page):
+            timestamp_ns += step_ns
+            if timestamp_ns > now_ns:
+                break
+            trades.append(
+                [
+                    '76395.00000',
+                    '0.01305597',
+                    timestamp_ns / 1e9,
+                    's',
+                    'm',
+                    '',
+                    # like kraken's trade ids, unique and increasing with time
+                    timestamp_ns // step_ns,
+                ]
+            )
+        last = min(timestamp_ns, now_ns)
+        return json.dumps(
+            {'error': [], 'result': {pair: trades, 'last': str(last)}}
+        ).encode()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def kraken_stub(monkeypatch):
+    """
+    Local stub of the Kraken `Trades` endpoint, used by every REST client
+    """
+    stub = type('Stub', (KrakenTradesStub,), {'responses': [], 'requests': []})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), stub)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(
+        KrakenRestAPISinglePair,
+        'URL',
+        f'http://127.0.0.1:{server.server_port}/0/public/Trades',
+    )
+    yield stub
+    server.shutdown()
+    server.server_close()
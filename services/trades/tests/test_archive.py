@@ -0,0 +1,98 @@
+import numpy as np
+from kraken_api.archive import MS_PER_DAY, KrakenArchiveAPI, TradeArchive
+from kraken_api.backfill import KrakenRestAPIBackfill
+from kraken_api.trade_batch import TradeBatch
+
+PAIR = 'BTC/USD'
+MS = 1_000_000
+
+
+def trades_between(start_ms: int, end_ms: int, step_ms: int = 60_000) -> TradeBatch:
+    timestamp_ms = np.arange(start_ms, end_ms, step_ms)
+    return TradeBatch.from_columns(
+        pair=PAIR,
+        price=np.full(len(timestamp_ms), 100.0),
+        volume=np.full(len(timestamp_ms), 0.1),
+        timestamp_ms=timestamp_ms,
+        trade_id=timestamp_ms // step_ms,
+    )
+
+
+def test_coverage_merges_the_ranges_that_touch(tmp_path):
+    archive = TradeArchive(str(tmp_path))
+    archive.write(PAIR, TradeBatch.empty(), 0, 10)
+    archive.write(PAIR, TradeBatch.empty(), 20, 30)
+    archive.write(PAIR, TradeBatch.empty(), 10, 15)
+    archive.write(PAIR, TradeBatch.empty(), 40, 40)
+
+    assert archive.coverage(PAIR) == [[0, 15], [20, 30]]
+    assert archive.covered_ranges(PAIR, 5, 25) == [(5, 15), (20, 25)]
+    assert archive.missing_ranges(PAIR, 5, 50) == [(15, 20), (30, 50)]
+    assert archive.missing_ranges('ETH/USD', 5, 50) == [(5, 50)]
+
+
+def test_archive_reads_back_the_trades_across_days(tmp_path):
+    archive = TradeArchive(str(tmp_path))
+    start_ms = 10 * MS_PER_DAY - 60 * 60_000
+    end_ms = 10 * MS_PER_DAY + 60 * 60_000
+    trades = trades_between(start_ms, end_ms)
+    archive.write(PAIR, trades, start_ms * MS, end_ms * MS)
+    # an overlapping download of the first 10 minutes repeats some trades
+    archive.write(
+        PAIR, trades.take(slice(0, 10)), start_ms * MS, (start_ms + 600_000) * MS
+    )
+
+    assert len(list(tmp_path.glob('pair=BTC-USD/date=*'))) == 2
+    read = archive.read(PAIR, start_ms * MS, end_ms * MS)
+    assert read.trade_id.tolist() == trades.trade_id.tolist()
+    assert read.timestamp_ms.tolist() == trades.timestamp_ms.tolist()
+
+
+def test_archive_api_replays_the_archive_one_day_at_a_time(tmp_path):
+    archive = TradeArchive(str(tmp_path))
+    now_ms = int(np.datetime64('now', 'ms').astype(np.int64))
+    start_ms = now_ms - 2 * MS_PER_DAY
+    trades = trades_between(start_ms + 30_000, now_ms)
+    archive.write(PAIR, trades, start_ms * MS, now_ms * MS)
+
+    trades_api = KrakenArchiveAPI(pairs=[PAIR], last_n_days=2, archive=archive)
+    trade_ids = []
+    num_days = 0
+    while not trades_api.is_done():
+        trade_ids += trades_api.get_trade_batch().trade_id.tolist()
+        num_days += 1
+
+    assert num_days == 3
+    assert trade_ids == trades.trade_id.tolist()
+
+
+def test_backfill_only_downloads_the_ranges_missing_from_the_archive(
+    kraken_stub, tmp_path
+):
+    archive = TradeArchive(str(tmp_path / 'archive'))
+    now_ms = int(np.datetime64('now', 'ms').astype(np.int64))
+    # the first half of the last day is already archived
+    start_ms = now_ms - MS_PER_DAY - 60 * 60_000
+    end_ms = now_ms - MS_PER_DAY // 2
+    archived = trades_between(start_ms // 60_000 * 60_000 + 60_000, end_ms)
+    archive.write(PAIR, archived, start_ms * MS, end_ms * MS)
+
+    backfill = KrakenRestAPIBackfill(
+        pairs=[PAIR],
+        last_n_days=1,
+        slices_per_pair=2,
+        checkpoint_dir=str(tmp_path / 'checkpoint'),
+        archive=archive,
+        rate_limit_per_second=1000,
+        min_rate_limit_per_second=1000,
+        max_rate_limit_per_second=1000,
+    )
+    trade_ids = []
+    while not backfill.is_done():
+        trade_ids += backfill.get_trade_batch().trade_id.tolist()
+
+    assert all(since_ns >= end_ms * MS for _, since_ns in kraken_stub.requests)
+    assert np.all(np.diff(trade_ids) == 1)
+    assert len(trade_ids) in (24 * 60 - 1, 24 * 60)
+    # the downloaded half is in the archive now
+    assert archive.missing_ranges(PAIR, start_ms * MS, now_ms * MS) == []
@@ -0,0 +1,88 @@
+import time
+
+import numpy as np
+from kraken_api.backfill import BackfillCheckpoint, KrakenRestAPIBackfill
+from kraken_api.rest_async import KrakenRestAPIAsync
+from kraken_api.trade_batch import TradeBatch
+
+PAIR = 'BTC/USD'
+
+
+def create_backfill(checkpoint_dir, last_n_days: int = 1) -> KrakenRestAPIBackfill:
+    return KrakenRestAPIBackfill(
+        pairs=[PAIR],
+        last_n_days=last_n_days,
+        slices_per_pair=4,
+        checkpoint_dir=str(checkpoint_dir),
+        rate_limit_per_second=1000,
+        min_rate_limit_per_second=1000,
+        max_rate_limit_per_second=1000,
+    )
+
+
+def crash(backfill: KrakenRestAPIBackfill) -> None:
+    """
+    Stops the backfill without saving its progress, like a killed process
+    """
+    KrakenRestAPIAsync.close(backfill)
+
+
+def test_checkpoint_keeps_the_spill_file_until_it_is_saved(tmp_path):
+    checkpoint = BackfillCheckpoint(str(tmp_path))
+    trades = TradeBatch.from_columns(
+        pair=PAIR,
+        price=[1.0, 2.0],
+        volume=[0.1, 0.2],
+        timestamp_ms=[1000, 2000],
+        trade_id=[1, 2],
+    )
+    checkpoint.spill(PAIR, 1, trades)
+
+    assert checkpoint.unspill(PAIR, 1).trade_id.tolist() == [1, 2]
+    assert checkpoint.spill_path(PAIR, 1).exists()
+
+    checkpoint.save()
+    assert not checkpoint.spill_path(PAIR, 1).exists()
+    assert len(checkpoint.unspill(PAIR, 1)) == 0
+
+
+def test_resumed_backfill_emits_the_spilled_trades_of_a_crashed_run(
+    kraken_stub, tmp_path
+):
+    kraken_stub.trades_per_page = 100
+    # slices of 6h with a trade per minute: the first slice only has ~250
+    # trades, so it is done one call before the others, with their first pages
+    # already spilled
+    kraken_stub.first_trade_ms = (time.time_ns() // 1_000_000) - (
+        24 * 60 - 110
+    ) * 60_000
+
+    backfill = create_backfill(tmp_path)
+    trade_ids = []
+    while True:
+        trades = backfill.get_trade_batch()
+        if backfill._head[PAIR] > 0:
+            break
+        trade_ids += trades.trade_id.tolist()
+    # crashes before the trades of the call that moved to the next slice are
+    # produced to Kafka
+    assert not backfill.is_done()
+    crash(backfill)
+
+    backfill = create_backfill(tmp_path)
+    while not backfill.is_done():
+        trade_ids += backfill.get_trade_batch().trade_id.tolist()
+
+    # the trades emitted twice are the ones after the last checkpoint, no gaps
+    trade_ids = np.unique(trade_ids)
+    assert np.all(np.diff(trade_ids) == 1)
+    assert len(trade_ids) >= 24 * 60 - 110
+    assert not list(tmp_path.iterdir())
+
+
+def test_backfill_of_an_empty_range_is_done_right_away(kraken_stub, tmp_path):
+    backfill = create_backfill(tmp_path, last_n_days=0)
+
+    assert backfill.is_done()
+    assert kraken_stub.requests == []
+    backfill.close()
@@ -0,0 +1,139 @@
+import time
+from typing import List
+
+import numpy as np
+import pytest
+from kraken_api.trade_batch import TradeBatch
+from pipeline_shared.serializers import get_deserializer
+from producer import TradesProducer
+from quixstreams.models import SerializationContext
+
+
+class FakeMessage:
+    def __init__(self, timestamp_ms: int):
+        self._timestamp_ms = timestamp_ms
+
+    def timestamp(self):
+        # (TIMESTAMP_CREATE_TIME, ms) as confluent_kafka
+        return 1, self._timestamp_ms
+
+
+class FakeProducer:
+    """
+    Stand-in of the quixstreams `Producer`, that keeps the messages in flight
+    until `poll` delivers them one at a time, or `flush` all of them.
+    `errors` are the delivery errors of the next deliveries, None for a success.
+    """
+
+    def __init__(self):
+        self.messages: List[dict] = []
+        self.errors: list = []
+        self.num_polls = 0
+        self.max_in_flight = 0
+        self._in_flight: list = []
+
+    def produce(self, topic, value, key, on_delivery=None):
+        self.messages.append({'topic': topic, 'key': key, 'value': value})
+        if on_delivery is not None:
+            self._in_flight.append((on_delivery, int(time.time() * 1000)))
+            self.max_in_flight = max(self.max_in_flight, len(self._in_flight))
+
+    def poll(self, timeout: float) -> int:
+        self.num_polls += 1
+        return self._deliver(1)
+
+    def flush(self, timeout: float) -> int:
+        self._deliver(len(self._in_flight))
+        return 0
+
+    def _deliver(self, num_messages: int) -> int:
+        delivered = self._in_flight[:num_messages]
+        del self._in_flight[:num_messages]
+        for on_delivery, timestamp_ms in delivered:
+            error = self.errors.pop(0) if self.errors else None
+            on_delivery(error, FakeMessage(timestamp_ms))
+        return len(delivered)
+
+
+def make_trades(num_trades: int, pair: str = 'BTC/USD') -> TradeBatch:
+    return TradeBatch.from_columns(
+        pair=pair,
+        price=np.full(num_trades, 76395.0),
+        volume=np.full(num_trades, 0.01),
+        timestamp_ms=1_700_000_000_000 + np.arange(num_trades),
+    )
+
+
+def test_produce_waits_for_deliveries_at_the_in_flight_limit():
+    producer = FakeProducer()
+    trades_producer = TradesProducer(
+        producer=producer, topic='trades', max_in_flight_messages=3
+    )
+
+    trades_producer.produce_batch(make_trades(10))
+
+    assert len(producer.messages) == 10
+    assert producer.max_in_flight == 3
+    # one delivery per poll frees room for the next message
+    assert producer.num_polls == 7
+    assert trades_producer.in_flight == 3
+    assert trades_producer.produced == 10
+    assert trades_producer.delivered == 7
+
+
+def test_the_report_counts_the_deliveries_and_the_failures():
+    producer = FakeProducer()
+    producer.errors = [None, 'Broker: Message timed out', None, 'Local: Queue full']
+    trades_producer = TradesProducer(
+        producer=producer, topic='trades', max_in_flight_messages=100
+    )
+
+    trades_producer.produce_batch(make_trades(10))
+    trades_producer.close()
+
+    assert (trades_producer.produced, trades_producer.delivered) == (10, 8)
+    assert trades_producer.failed == 2
+    assert trades_producer.in_flight == 0
+    assert trades_producer.bytes_produced == sum(
+        len(message['value']) for message in producer.messages
+    )
+    assert len(trades_producer.latencies_ms) == 8
+    report = trades_producer.report()
+    assert 'produced=10 delivered=8 failed=2' in report
+    assert 'latency_ms p50=' in report
+
+
+@pytest.mark.parametrize('serialization', ['json', 'msgpack'])
+def test_heartbeats_are_pushed_per_pair_at_their_interval(serialization):
+    producer = FakeProducer()
+    trades_producer = TradesProducer(
+        producer=producer,
+        topic='trades',
+        serialization=serialization,
+        heartbeat_interval_seconds=0.05,
+    )
+    trades_producer.produce_batch(
+        TradeBatch.merge([make_trades(2, 'BTC/USD'), make_trades(1, 'ETH/USD')])
+    )
+    assert len(producer.messages) == 3
+
+    time.sleep(0.06)
+    # no trade, e.g a quiet market
+    trades_producer.produce_batch(TradeBatch.empty())
+    trades_producer.produce_batch(TradeBatch.empty())
+
+    heartbeats = producer.messages[3:]
+    assert sorted(message['key'] for message in heartbeats) == [
+        b'BTC/USD',
+        b'ETH/USD',
+    ]
+    deserialize = get_deserializer(serialization, 'trade')
+    ctx = SerializationContext(topic='trades', field='value')
+    for message in heartbeats:
+        value = deserialize(message['value'], ctx)
+        assert value['pair'] == message['key'].decode()
+        assert value['heartbeat'] is True
+        assert value['volume'] == 0.0
+        assert abs(value['timestamp_ms'] - time.time() * 1000) < 5000
+    # the heartbeats are not trades
+    assert trades_producer.produced == 3
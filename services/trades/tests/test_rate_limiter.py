@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+import pytest
+from kraken_api.rate_limiter import AdaptivePacer, HostRateLimiter, TokenBucket
+
+
+def test_token_bucket_allows_a_burst_then_paces_the_requests():
+    bucket = TokenBucket(rate=50, capacity=5)
+
+    async def acquire(n: int) -> float:
+        start = time.monotonic()
+        for _ in range(n):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    async def run():
+        return await acquire(5), await acquire(5)
+
+    burst, paced = asyncio.run(run())
+
+    assert burst < 0.05
+    # 5 tokens refilled at 50 per second
+    assert paced >= 0.09
+
+
+def test_token_bucket_drain_drops_the_burst():
+    bucket = TokenBucket(rate=50, capacity=5)
+    bucket.drain()
+
+    async def run():
+        start = time.monotonic()
+        await bucket.acquire()
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) >= 0.015
+
+
+def test_host_rate_limiter_has_one_bucket_per_host():
+    limiter = HostRateLimiter(rate=1, capacity=1)
+
+    async def run():
+        start = time.monotonic()
+        await limiter.acquire('https://api.kraken.com/0/public/Trades')
+        await limiter.acquire('https://example.com/0/public/Trades')
+        await limiter.acquire('https://api.kraken.com/0/public/Trades?pair=ETH')
+        return time.monotonic() - start
+
+    elapsed = asyncio.run(run())
+
+    # the second request to api.kraken.com waits for a token, the other host not
+    assert 0.9 <= elapsed < 1.5
+    assert sorted(limiter._buckets) == ['api.kraken.com', 'example.com']
+
+
+def test_pacer_increases_the_rate_additively_up_to_the_max():
+    pacer = AdaptivePacer(rate=1.0, max_rate=1.05, increase_per_success=0.02)
+
+    pacer.on_success()
+    assert pacer.rate == pytest.approx(1.02)
+    for _ in range(10):
+        pacer.on_success()
+    assert pacer.rate == 1.05
+
+
+def test_pacer_halves_the_rate_once_per_throttle_down_to_the_min():
+    pacer = AdaptivePacer(rate=1.0, min_rate=0.3, min_backoff_seconds=0.01)
+
+    pacer.on_throttled('HTTP 429')
+    # the requests in flight are throttled too, they don't slow down again
+    pacer.on_throttled('HTTP 429')
+    assert pacer.rate == 0.5
+    assert pacer.num_throttled == 2
+
+    time.sleep(0.02)
+    pacer.on_throttled('HTTP 429')
+    assert pacer.rate == 0.3
+
+
+def test_pacer_backs_off_exponentially_with_jitter():
+    pacer = AdaptivePacer(rate=1.0, min_backoff_seconds=1.0, max_backoff_seconds=3.0)
+
+    pauses = []
+    for _ in range(4):
+        pacer._paused_until = 0.0
+        pacer.on_throttled('HTTP 429')
+        pauses.append(pacer._paused_until - time.monotonic())
+
+    # at least half of 1, 2, 3 and 3 seconds
+    for pause, backoff in zip(pauses, [1, 2, 3, 3], strict=True):
+        assert backoff / 2 - 0.01 <= pause <= backoff
+
+    pacer.on_success()
+    pacer._paused_until = 0.0
+    pacer.on_throttled('HTTP 429')
+    assert pacer._paused_until - time.monotonic() <= 1.0
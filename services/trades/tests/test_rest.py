@@ -0,0 +1,102 @@
+import json
+
+from kraken_api.rate_limiter import AdaptivePacer
+from kraken_api.rest import KrakenRestAPISinglePair
+from kraken_api.rest_async import KrakenRestAPIAsync
+
+PAIR = 'BTC/USD'
+SINCE_NS = 1731155565000000000
+
+
+def single_pair() -> KrakenRestAPISinglePair:
+    return KrakenRestAPISinglePair(
+        pair=PAIR,
+        last_n_days=1,
+        since_timestamp_ns=SINCE_NS,
+        pacer=AdaptivePacer(rate=1.0, min_backoff_seconds=0.01),
+    )
+
+
+def body(data: dict) -> bytes:
+    return json.dumps(data).encode()
+
+
+def test_rate_limit_errors_slow_down_and_ask_for_the_page_again():
+    api = single_pair()
+
+    for status, content in [
+        (429, b''),
+        (503, b'Service Unavailable'),
+        (200, b'<html>'),
+        (200, body({'error': ['EAPI:Rate limit exceeded'], 'result': {}})),
+    ]:
+        api.pacer._paused_until = 0.0
+        trades = api.handle_response(status, content)
+
+        assert len(trades) == 0
+        assert api.since_timestamp_ns == SINCE_NS
+        assert not api.is_done()
+
+    assert api.pacer.num_throttled == 4
+    assert api.pacer.rate == api.pacer.min_rate
+
+
+def test_permanent_errors_stop_the_pair():
+    api = single_pair()
+
+    trades = api.handle_response(
+        200, body({'error': ['EQuery:Unknown asset pair'], 'result': {}})
+    )
+
+    assert len(trades) == 0
+    assert api.is_done()
+    assert api.pacer.num_throttled == 0
+
+
+def test_a_page_of_trades_moves_the_cursor_and_speeds_up():
+    api = single_pair()
+    last_ns = SINCE_NS + 2_000_000_000
+
+    trades = api.handle_response(
+        200,
+        body(
+            {
+                'error': [],
+                'result': {
+                    PAIR: [
+                        ['76395.0', '0.1', (SINCE_NS + 10**9) / 1e9, 's', 'm', '', 1],
+                        ['76396.0', '0.2', last_ns / 1e9, 'b', 'l', '', 2],
+                    ],
+                    'last': str(last_ns),
+                },
+            }
+        ),
+    )
+
+    assert trades.trade_id.tolist() == [1, 2]
+    assert api.since_timestamp_ns == last_ns
+    assert api.pacer.rate > 1.0
+
+
+def test_async_engine_recovers_from_rate_limits(kraken_stub):
+    kraken_stub.responses = [
+        (429, b''),
+        (200, body({'error': ['EAPI:Rate limit exceeded'], 'result': {}})),
+    ]
+    trades_api = KrakenRestAPIAsync(
+        pairs=[PAIR],
+        last_n_days=1,
+        rate_limit_per_second=1000,
+        max_rate_limit_per_second=1000,
+    )
+    trades_api.pacer.min_backoff_seconds = 0.01
+
+    trade_ids = []
+    while not trades_api.is_done():
+        trade_ids += trades_api.get_trade_batch().trade_id.tolist()
+
+    assert trades_api.pacer.num_throttled == 2
+    assert len(trade_ids) in (1439, 1440)
+    # the throttled requests are asked again from the same cursor
+    first_since = kraken_stub.requests[0][1]
+    assert [since for _, since in kraken_stub.requests[:3]] == [first_since] * 3
@@ -0,0 +1,71 @@
+import numpy as np
+from kraken_api.rate_limiter import AdaptivePacer
+from kraken_api.rest import KrakenRestAPI
+from kraken_api.rest_async import KrakenRestAPIAsync
+
+PAIRS = ['BTC/USD', 'ETH/USD', 'SOL/USD']
+
+
+def fetch_all(trades_api) -> list:
+    batches = []
+    while not trades_api.is_done():
+        batches.append(trades_api.get_trade_batch())
+    return batches
+
+
+def test_async_engine_merges_the_pages_of_all_pairs_by_timestamp(kraken_stub):
+    trades_api = KrakenRestAPIAsync(
+        pairs=PAIRS,
+        last_n_days=1,
+        max_concurrency=len(PAIRS),
+        rate_limit_per_second=1000,
+        min_rate_limit_per_second=1000,
+        max_rate_limit_per_second=1000,
+    )
+
+    batches = fetch_all(trades_api)
+
+    for batch in batches:
+        assert np.all(np.diff(batch.timestamp_ms) >= 0)
+    # one trade per minute of the last day, for every pair
+    for pair in PAIRS:
+        trade_ids = np.concatenate(
+            [
+                batch.trade_id[[batch.pairs[i] == pair for i in batch.pair_index]]
+                for batch in batches
+            ]
+        )
+        assert len(trade_ids) in (1439, 1440)
+        assert len(np.unique(trade_ids)) == len(trade_ids)
+    # every request after the first of a pair starts at the last trade seen
+    assert len(kraken_stub.requests) == 2 * len(PAIRS)
+
+
+def test_async_engine_returns_the_same_trades_as_the_sequential_one(kraken_stub):
+    async_batches = fetch_all(
+        KrakenRestAPIAsync(
+            pairs=PAIRS,
+            last_n_days=1,
+            rate_limit_per_second=1000,
+            min_rate_limit_per_second=1000,
+            max_rate_limit_per_second=1000,
+        )
+    )
+    sequential_batches = fetch_all(
+        KrakenRestAPI(
+            pairs=PAIRS,
+            last_n_days=1,
+            pacer=AdaptivePacer(rate=1000, max_rate=1000),
+        )
+    )
+
+    def trades(batches) -> set:
+        return {
+            (trade['pair'], trade['timestamp_ms'])
+            for batch in batches
+            for trade in batch.to_dicts()
+        }
+
+    # the cursors start `last_n_days` ago a few ms apart, so the first trade of
+    # a pair may be in one run only
+    assert len(trades(async_batches) ^ trades(sequential_batches)) <= len(PAIRS)
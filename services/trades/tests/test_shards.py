@@ -0,0 +1,188 @@
+from typing import List, Optional
+
+import numpy as np
+import pytest
+from kraken_api.base import TradesAPI
+from kraken_api.trade_batch import TradeBatch
+from shards import LastSeenTradesAPI, ShardCoordinator, run_shard
+
+PAIRS = ['BTC/USD', 'ETH/USD', 'SOL/USD', 'XRP/USD', 'ADA/USD', 'DOT/USD']
+
+
+class FakeProcess:
+    """
+    Stand-in of a shard process, alive until `die` or `terminate`
+    """
+
+    def __init__(self, target, args, name):
+        self.target = target
+        self.args = args
+        self.name = name
+        self.started = False
+        self.terminated = False
+        self.exitcode: Optional[int] = None
+
+    @property
+    def shard_id(self) -> int:
+        return self.args[0]
+
+    @property
+    def pairs(self) -> List[str]:
+        return self.args[1]
+
+    def start(self) -> None:
+        self.started = True
+
+    def is_alive(self) -> bool:
+        return self.started and self.exitcode is None
+
+    def die(self, exitcode: int = 1) -> None:
+        self.exitcode = exitcode
+
+    def terminate(self) -> None:
+        self.terminated = True
+        self.exitcode = -15
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        pass
+
+
+@pytest.fixture
+def coordinator():
+    """
+    A coordinator of 3 shards, started with fake processes
+    """
+    processes: List[FakeProcess] = []
+
+    def process_factory(target, args, name):
+        process = FakeProcess(target, args, name)
+        processes.append(process)
+        return process
+
+    coordinator = ShardCoordinator(
+        pairs=PAIRS, num_shards=3, max_restarts=1, process_factory=process_factory
+    )
+    coordinator.processes = processes
+    for shard_id in coordinator.assignment:
+        coordinator._start(shard_id)
+    yield coordinator
+    coordinator.stop()
+
+
+def alive(coordinator) -> dict:
+    """
+    The pairs of the processes alive, per shard
+    """
+    return {
+        process.shard_id: process.pairs
+        for process in coordinator.processes
+        if process.is_alive()
+    }
+
+
+def test_pairs_are_spread_round_robin(coordinator):
+    assert alive(coordinator) == {
+        0: ['BTC/USD', 'XRP/USD'],
+        1: ['ETH/USD', 'ADA/USD'],
+        2: ['SOL/USD', 'DOT/USD'],
+    }
+    for process in coordinator.processes:
+        assert process.target is run_shard
+        assert process.name == f'trades-shard-{process.shard_id}'
+        # the shards share the last trades seen, to resume after a restart
+        assert process.args[2] is coordinator.last_seen_ms
+
+
+def test_a_dead_shard_is_restarted_with_the_same_pairs(coordinator):
+    before = alive(coordinator)
+    coordinator.processes[1].die()
+
+    coordinator._check_shards()
+
+    assert alive(coordinator) == before
+    assert len(coordinator.processes) == 4
+    restarted = coordinator.processes[-1]
+    assert restarted.shard_id == 1 and restarted.started
+    # the other shards are left alone
+    assert not any(process.terminated for process in coordinator.processes)
+
+
+def test_a_shard_dying_too_often_has_its_pairs_rebalanced(coordinator):
+    coordinator.processes[1].die()
+    coordinator._check_shards()
+    coordinator.processes[-1].die()
+
+    coordinator._check_shards()
+
+    assert 1 not in coordinator.assignment
+    assignment = alive(coordinator)
+    assert sorted(assignment) == [0, 2]
+    # the pairs of shard 1 moved to the shards with the fewest pairs, one each
+    assert sorted(pair for pairs in assignment.values() for pair in pairs) == sorted(
+        PAIRS
+    )
+    assert [len(pairs) for pairs in assignment.values()] == [3, 3]
+    # the shards that got new pairs were restarted with them
+    assert coordinator.processes[0].terminated
+    assert coordinator.processes[2].terminated
+
+
+def test_the_coordinator_gives_up_when_all_the_shards_failed(coordinator):
+    coordinator.max_restarts = 0
+    for shard_id in [0, 1]:
+        coordinator._processes[shard_id].die()
+        coordinator._check_shards()
+    assert list(coordinator.assignment) == [2]
+    assert sorted(alive(coordinator)[2]) == sorted(PAIRS)
+
+    coordinator._processes[2].die()
+
+    with pytest.raises(RuntimeError, match='All the shards failed'):
+        coordinator._check_shards()
+
+
+class FakeTradesAPI(TradesAPI):
+    def __init__(self, batches: List[TradeBatch]):
+        self.batches = batches
+
+    def get_trade_data(self):
+        return self.get_trade_batch().to_trades()
+
+    def get_trade_batch(self) -> TradeBatch:
+        return self.batches.pop(0)
+
+    def is_done(self) -> bool:
+        return not self.batches
+
+
+def trades(pair: str, timestamps_ms: List[int]) -> TradeBatch:
+    return TradeBatch.from_columns(
+        pair=pair,
+        price=np.ones(len(timestamps_ms)),
+        volume=np.ones(len(timestamps_ms)),
+        timestamp_ms=timestamps_ms,
+    )
+
+
+def test_last_seen_trades_are_published_one_interval_late():
+    last_seen_ms = {}
+    trades_api = LastSeenTradesAPI(
+        FakeTradesAPI(
+            [
+                TradeBatch.merge([trades('BTC/USD', [1, 3]), trades('ETH/USD', [2])]),
+                trades('BTC/USD', [5]),
+                TradeBatch.empty(),
+            ]
+        ),
+        last_seen_ms,
+        publish_interval_seconds=0.0,
+    )
+
+    trades_api.get_trade_batch()
+    assert last_seen_ms == {}
+    trades_api.get_trade_batch()
+    # the trades of the first batch are delivered by now
+    assert last_seen_ms == {'BTC/USD': 3, 'ETH/USD': 2}
+    trades_api.get_trade_batch()
+    assert last_seen_ms == {'BTC/USD': 5, 'ETH/USD': 2}
+    assert trades_api.is_done()
@@ -0,0 +1,96 @@
+from typing import List
+
+import numpy as np
+import pytest
+from kraken_api.synthetic import SyntheticTradesAPI
+from kraken_api.trade_batch import TradeBatch
+
+PAIRS = ['BTC/USD', 'ETH/USD', 'SOL/USD', 'XRP/USD']
+START_MS = 1_700_000_000_000
+
+
+def generate(duration_seconds: float, **kwargs) -> List[TradeBatch]:
+    trades_api = SyntheticTradesAPI(
+        pairs=PAIRS,
+        duration_seconds=duration_seconds,
+        realtime=False,
+        start_timestamp_ms=START_MS,
+        **kwargs,
+    )
+    batches = []
+    while not trades_api.is_done():
+        batches.append(trades_api.get_trade_batch())
+    return batches
+
+
+def columns(batches: List[TradeBatch]) -> dict:
+    trades = TradeBatch.concat(batches)
+    return {
+        'pair_index': trades.pair_index,
+        'price': trades.price,
+        'volume': trades.volume,
+        'timestamp_ms': trades.timestamp_ms,
+        'trade_id': trades.trade_id,
+    }
+
+
+def test_the_same_seed_gives_the_same_trades():
+    first = columns(generate(60, trades_per_second=100, seed=7))
+    second = columns(generate(60, trades_per_second=100, seed=7))
+    other = columns(generate(60, trades_per_second=100, seed=8))
+
+    for name, values in first.items():
+        np.testing.assert_array_equal(values, second[name], err_msg=name)
+    assert not np.array_equal(first['price'], other['price'])
+
+
+@pytest.mark.parametrize(
+    'burst_probability, tolerance',
+    [
+        (0.0, 0.01),
+        # the bursts add noise around the same average
+        (0.01, 0.05),
+    ],
+)
+def test_the_average_rate_is_the_configured_rate(burst_probability, tolerance):
+    duration_seconds = 3600
+    batches = generate(
+        duration_seconds,
+        trades_per_second=100,
+        burst_probability=burst_probability,
+        batch_interval_ms=1000,
+    )
+
+    num_trades = sum(len(batch) for batch in batches)
+    assert num_trades / duration_seconds == pytest.approx(100, rel=tolerance)
+
+
+def test_the_busiest_pairs_come_first():
+    trades = TradeBatch.concat(generate(600, trades_per_second=100))
+
+    counts = dict(
+        zip(trades.pairs, np.bincount(trades.pair_index, minlength=len(PAIRS)))
+    )
+    assert sorted(PAIRS, key=counts.get, reverse=True) == PAIRS
+
+
+def test_prices_stay_positive_on_a_geometric_random_walk():
+    # a volatile day, where an arithmetic walk would go below zero
+    batches = generate(600, trades_per_second=200, daily_volatility=20.0)
+    trades = TradeBatch.concat(batches)
+
+    assert np.all(np.isfinite(trades.price))
+    assert np.all(trades.price > 0)
+    assert trades.price.min() < 10 or trades.price.max() > 1000
+
+
+def test_batches_are_sorted_and_cover_their_interval():
+    batches = generate(10, trades_per_second=1000, batch_interval_ms=100)
+
+    assert len(batches) == 100
+    for i, batch in enumerate(batches):
+        assert np.all(np.diff(batch.timestamp_ms) >= 0)
+        assert np.all(batch.timestamp_ms >= START_MS + 100 * i)
+        assert np.all(batch.timestamp_ms < START_MS + 100 * (i + 1))
+    trade_ids = TradeBatch.concat(batches).trade_id
+    np.testing.assert_array_equal(trade_ids, np.arange(len(trade_ids)))
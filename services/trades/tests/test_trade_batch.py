@@ -0,0 +1,97 @@
+import json
+
+import numpy as np
+from kraken_api.trade import Trade
+from kraken_api.trade_batch import TradeBatch
+from pipeline_shared.serializers import get_deserializer
+from quixstreams.models import SerializationContext
+
+REST_TRADES = [
+    ['76395.00000', '0.01305597', 1731155565.4159515, 's', 'm', '', 75468573],
+    ['76396.10000', '0.50000000', 1731155566.0010000, 'b', 'l', '', 75468574],
+    ['76390.00000', '1.25000000', 1731155569.9999999, 's', 'm', '', 75468575],
+]
+
+
+def test_rest_response_gives_the_same_trades_as_the_pydantic_path():
+    batch = TradeBatch.from_kraken_rest_api_response(pair='BTC/USD', trades=REST_TRADES)
+    trades = [
+        Trade.from_kraken_rest_api_response(
+            pair='BTC/USD',
+            price=float(price),
+            volume=float(volume),
+            timestamp_sec=timestamp_sec,
+            trade_id=trade_id,
+        )
+        for price, volume, timestamp_sec, _, _, _, trade_id in REST_TRADES
+    ]
+
+    assert batch.to_dicts() == [trade.to_dict() for trade in trades]
+    assert batch.trade_id.tolist() == [75468573, 75468574, 75468575]
+
+
+def test_serialize_writes_the_json_of_trade_to_dict():
+    batch = TradeBatch.from_kraken_rest_api_response(pair='BTC/USD', trades=REST_TRADES)
+
+    messages = list(batch.serialize())
+
+    assert [key for key, _ in messages] == [b'BTC/USD'] * len(REST_TRADES)
+    assert [json.loads(value) for _, value in messages] == batch.to_dicts()
+
+
+def test_websocket_response_keeps_the_pair_of_every_trade():
+    batch = TradeBatch.from_kraken_websocket_api_response(
+        [
+            {
+                'symbol': 'ETH/USD',
+                'price': 3000.5,
+                'qty': 0.1,
+                'trade_id': 7,
+                'timestamp': '2024-11-09T12:32:45.415951Z',
+            },
+            {
+                'symbol': 'BTC/USD',
+                'price': 76395.0,
+                'qty': 0.013,
+                'trade_id': 75468573,
+                'timestamp': '2024-11-09T12:32:46.000000Z',
+            },
+        ]
+    )
+
+    assert [trade['pair'] for trade in batch.to_dicts()] == ['ETH/USD', 'BTC/USD']
+    assert batch.timestamp_ms.tolist() == [1731155565415, 1731155566000]
+
+
+def test_merge_sorts_by_timestamp_and_keeps_the_order_of_equal_timestamps():
+    btc = TradeBatch.from_columns(
+        pair='BTC/USD', price=[1, 2, 3], volume=[1, 1, 1], timestamp_ms=[10, 20, 30]
+    )
+    eth = TradeBatch.from_columns(
+        pair='ETH/USD', price=[4, 5], volume=[1, 1], timestamp_ms=[5, 20]
+    )
+
+    merged = TradeBatch.merge([btc, TradeBatch.empty(), eth])
+
+    assert merged.timestamp_ms.tolist() == [5, 10, 20, 20, 30]
+    assert merged.price.tolist() == [4, 1, 2, 5, 3]
+    assert [trade['pair'] for trade in merged.to_dicts()] == [
+        'ETH/USD',
+        'BTC/USD',
+        'BTC/USD',
+        'ETH/USD',
+        'BTC/USD',
+    ]
+    assert np.array_equal(
+        TradeBatch.from_trades(merged.to_trades()).timestamp_ms, merged.timestamp_ms
+    )
+
+
+def test_msgpack_serialize_writes_the_shared_trade_schema():
+    batch = TradeBatch.from_kraken_rest_api_response(pair='BTC/USD', trades=REST_TRADES)
+    deserializer = get_deserializer('msgpack', 'trade')
+    ctx = SerializationContext(topic='trades', field='value')
+
+    trades = [deserializer(value, ctx) for _, value in batch.serialize('msgpack')]
+
+    assert trades == [{**trade, 'heartbeat': False} for trade in batch.to_dicts()]
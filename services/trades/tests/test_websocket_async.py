@@ -0,0 +1,264 @@
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from typing import List, Tuple
+
+import aiohttp
+import numpy as np
+import pytest
+from kraken_api.rate_limiter import HostRateLimiter
+from kraken_api.trade_batch import TradeBatch
+from kraken_api.websocket_async import KrakenWebsocketAPIAsync
+from websockets.asyncio.server import serve
+
+PAIR = 'BTC/USD'
+# the step between the trades of the REST stub
+STEP_MS = 60_000
+
+
+def trade_message(trades: List[Tuple[int, int]], pair: str = PAIR) -> str:
+    """
+    A websocket trade message with the (timestamp_ms, trade_id) trades
+    """
+    return json.dumps(
+        {
+            'channel': 'trade',
+            'type': 'update',
+            'data': [
+                {
+                    'symbol': pair,
+                    'side': 'buy',
+                    'price': 76395.0,
+                    'qty': 0.013,
+                    'ord_type': 'market',
+                    'trade_id': trade_id,
+                    'timestamp': datetime.fromtimestamp(
+                        timestamp_ms / 1000, tz=timezone.utc
+                    ).strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+                }
+                for timestamp_ms, trade_id in trades
+            ],
+        }
+    )
+
+
+class KrakenWebsocketStub:
+    """
+    Local stub of the Kraken websocket, served from a thread. The n-th
+    connection waits for the subscribe message and sends the n-th list of
+    `connections`, then closes, except the last one which stays open.
+    `subscriptions` records the subscribe messages.
+    """
+
+    def __init__(self, connections: List[List[str]]):
+        self.connections = connections
+        self.subscriptions: list = []
+        self._loop = asyncio.new_event_loop()
+        self._started = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._started.wait()
+
+    def stop(self) -> None:
+        self._loop.call_soon_threadsafe(self._stop.set)
+        self._thread.join()
+
+    def _run(self) -> None:
+        self._loop.run_until_complete(self._serve())
+
+    async def _serve(self) -> None:
+        self._stop = asyncio.Event()
+        async with serve(self._handler, '127.0.0.1', 0) as server:
+            self.port = server.sockets[0].getsockname()[1]
+            self._started.set()
+            await self._stop.wait()
+
+    async def _handler(self, ws) -> None:
+        index = len(self.subscriptions)
+        self.subscriptions.append(json.loads(await ws.recv()))
+        for message in self.connections[index]:
+            await ws.send(message)
+        if index == len(self.connections) - 1:
+            await ws.wait_closed()
+
+
+@pytest.fixture
+def client(monkeypatch) -> KrakenWebsocketAPIAsync:
+    """
+    A client without its connections, to call its methods directly
+    """
+    monkeypatch.setattr(KrakenWebsocketAPIAsync, '_run', lambda self: None)
+    return KrakenWebsocketAPIAsync(
+        pairs=[PAIR],
+        rate_limit_per_second=1000,
+        min_rate_limit_per_second=1000,
+        max_rate_limit_per_second=1000,
+    )
+
+
+def trade_ids(batches: List[TradeBatch]) -> List[int]:
+    return [int(trade_id) for batch in batches for trade_id in batch.trade_id]
+
+
+def drain(client: KrakenWebsocketAPIAsync) -> List[TradeBatch]:
+    batch = client.get_trade_batch(timeout_seconds=0.01)
+    return [batch] if len(batch) else []
+
+
+def test_push_drops_the_trades_already_pushed(client):
+    def batch(pair: str, ids: List[int]) -> TradeBatch:
+        return TradeBatch.from_columns(
+            pair=pair,
+            price=np.ones(len(ids)),
+            volume=np.ones(len(ids)),
+            timestamp_ms=np.array(ids) * 1000,
+            trade_id=ids,
+        )
+
+    assert client._push(batch(PAIR, [1, 2, 3])) == 3
+    # the REST API and the websocket both send trades 2 and 3
+    assert client._push(batch(PAIR, [2, 3, 4])) == 1
+    assert client._push(batch(PAIR, [3])) == 0
+    # the trade ids are per pair
+    assert (
+        client._push(TradeBatch.merge([batch(PAIR, [4]), batch('ETH/USD', [2])])) == 1
+    )
+
+    # merged by timestamp
+    assert trade_ids(drain(client)) == [1, 2, 2, 3, 4]
+    assert client.last_trade_id == {PAIR: 4, 'ETH/USD': 2}
+    assert client.last_timestamp_ms == {PAIR: 4000, 'ETH/USD': 2000}
+
+
+@pytest.mark.parametrize(
+    'message',
+    [
+        'not json',
+        '[1, 2]',
+        # a trade without a price
+        '{"channel": "trade", "data": [{"symbol": "BTC/USD", "qty": 1.0, '
+        '"timestamp": "2024-11-09T12:32:45.415951Z"}]}',
+        # a trade with a timestamp we can't parse
+        trade_message([(0, 1)]).replace('1970-01-01T00:00:00.000000Z', 'yesterday'),
+    ],
+)
+def test_malformed_messages_are_skipped(client, message):
+    client._process_message(message)
+    client._process_message(trade_message([(1000, 7)]))
+
+    assert trade_ids(drain(client)) == [7]
+
+
+def test_heartbeats_push_nothing(client):
+    client._process_message('{"channel": "heartbeat"}')
+
+    assert drain(client) == []
+
+
+def gap(kraken_stub) -> Tuple[int, int]:
+    """
+    The timestamp and id of a trade 10 steps of the REST stub ago
+    """
+    kraken_stub.step_ms = STEP_MS
+    timestamp_ms = (time.time_ns() // 1_000_000 // STEP_MS - 10) * STEP_MS
+    # the trade ids of the REST stub
+    return timestamp_ms, timestamp_ms // STEP_MS
+
+
+class FlakySession:
+    """
+    aiohttp session that fails its first `num_failures` requests
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, num_failures: int):
+        self.session = session
+        self.num_failures = num_failures
+
+    def get(self, url: str, **kwargs):
+        if self.num_failures > 0:
+            self.num_failures -= 1
+            raise aiohttp.ClientConnectionError('Connection reset by peer')
+        return self.session.get(url, **kwargs)
+
+
+def fill_gaps(client: KrakenWebsocketAPIAsync, num_failures: int = 0) -> None:
+    async def run():
+        client._rate_limiter = HostRateLimiter(
+            rate=1000, capacity=1000, pacer=client.pacer
+        )
+        async with aiohttp.ClientSession() as session:
+            await client._fill_gaps([PAIR], FlakySession(session, num_failures))
+
+    asyncio.run(run())
+
+
+def test_gap_fill_retries_the_network_errors(client, kraken_stub):
+    timestamp_ms, trade_id = gap(kraken_stub)
+    client.last_timestamp_ms[PAIR] = timestamp_ms
+    client.last_trade_id[PAIR] = trade_id
+    client.pacer.min_backoff_seconds = 0.01
+    client.pacer.max_backoff_seconds = 0.01
+
+    fill_gaps(client, num_failures=2)
+
+    assert trade_ids(drain(client)) == list(range(trade_id + 1, trade_id + 11))
+    assert client.pacer.num_throttled == 2
+
+
+def test_gap_fill_gives_up_on_a_permanent_error(client, kraken_stub):
+    timestamp_ms, trade_id = gap(kraken_stub)
+    client.last_timestamp_ms[PAIR] = timestamp_ms
+    client.last_trade_id[PAIR] = trade_id
+    kraken_stub.responses.append(
+        (200, b'{"error": ["EQuery:Unknown asset pair"], "result": {}}')
+    )
+
+    fill_gaps(client)
+
+    assert drain(client) == []
+    assert len(kraken_stub.requests) == 1
+
+
+def test_reconnect_fills_the_gap_with_the_rest_api(kraken_stub, monkeypatch):
+    timestamp_ms, trade_id = gap(kraken_stub)
+    now_ms = time.time_ns() // 1_000_000
+    websocket = KrakenWebsocketStub(
+        [
+            # a malformed frame doesn't stop the connection, then it drops
+            ['not json', trade_message([(timestamp_ms, trade_id)])],
+            # the trades buffered during the gap fill, the first one is in the
+            # gap already filled
+            [
+                trade_message(
+                    [
+                        (timestamp_ms + 10 * STEP_MS, trade_id + 10),
+                        (now_ms, trade_id + 11),
+                    ]
+                )
+            ],
+        ]
+    )
+    monkeypatch.setattr(
+        KrakenWebsocketAPIAsync, 'URL', f'ws://127.0.0.1:{websocket.port}'
+    )
+
+    client = KrakenWebsocketAPIAsync(
+        pairs=[PAIR],
+        reconnect_min_backoff_seconds=0.01,
+        reconnect_max_backoff_seconds=0.01,
+    )
+    try:
+        batches: List[TradeBatch] = []
+        deadline = time.monotonic() + 10
+        while len(trade_ids(batches)) < 12 and time.monotonic() < deadline:
+            batches.append(client.get_trade_batch(timeout_seconds=0.1))
+    finally:
+        client.close()
+        websocket.stop()
+
+    # every trade once, in order, the ones of the gap from the REST API
+    assert trade_ids(batches) == list(range(trade_id, trade_id + 12))
+    assert len(websocket.subscriptions) == 2
+    assert kraken_stub.requests[0] == (PAIR, timestamp_ms * 1_000_000)